@@ -1,51 +1,207 @@
 from fastapi import HTTPException, Security, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import httpx
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import time
 import jwt
 from app.config import get_settings
+from app.http_clients import http_clients
 
 settings = get_settings()
 security = HTTPBearer()
 
+# Clerk signs session tokens with RS256
+ALGORITHMS = ["RS256"]
 
-async def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> dict:
+
+class JWKSCache:
     """
-    Verify Clerk JWT token and return user information
+    Clerk's token signing keys, kept in memory
+
+    Loaded on first use and refreshed in the background. A token signed with
+    an unknown key ID (key rotation) triggers a refetch; concurrent requests
+    share that single fetch, and refetches are limited to one per
+    `min_refetch_seconds` so bogus key IDs cannot hammer Clerk.
     """
-    try:
-        token = credentials.credentials
+    def __init__(self):
+        self.refresh_seconds = settings.auth_jwks_refresh_seconds
+        self.min_refetch_seconds = settings.auth_jwks_min_refetch_seconds
+        self.keys: Dict[str, Any] = {}
+        self.fetched_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
 
-        # Decode JWT without verification to extract user_id
-        # For production, you should verify the JWT signature using Clerk's JWKS
-        decoded = jwt.decode(token, options={"verify_signature": False})
+    async def _load(self) -> Dict[str, Any]:
+        if settings.clerk_jwks_file:
+            with open(settings.clerk_jwks_file) as f:
+                jwks = json.load(f)
+        else:
+            response = await http_clients.clerk.get(
+                settings.clerk_jwks_url,
+                headers={"Authorization": f"Bearer {settings.clerk_secret_key}"}
+            )
+            response.raise_for_status()
+            jwks = response.json()
 
-        # Extract user_id from the JWT (Clerk uses 'sub' for user ID)
-        user_id = decoded.get("sub") or decoded.get("user_id")
+        keys = {}
+        for jwk in jwks.get("keys", []):
+            if jwk.get("kid") and jwk.get("use", "sig") == "sig":
+                keys[jwk["kid"]] = jwt.PyJWK(jwk).key
+        return keys
+
+    async def refresh(self, force: bool = False):
+        """Fetch the key set unless it was fetched within min_refetch_seconds"""
+        async with self._lock:
+            recently = self.fetched_at is not None and time.monotonic() - self.fetched_at < self.min_refetch_seconds
+            if recently and not force:
+                return
+            keys = await self._load()
+            self.keys = keys
+            self.fetched_at = time.monotonic()
+
+    async def get_key(self, kid: str):
+        key = self.keys.get(kid)
+        if key is None:
+            await self.refresh()
+            key = self.keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        return key
+
+    async def _refresh_forever(self):
+        while True:
+            try:
+                await self.refresh(force=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep serving the keys we have; unknown key IDs still refetch on demand
+                print(f"JWKS refresh failed: {str(e)}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self):
+        """Start background refresh (called from the application lifespan)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class VerifiedTokenCache:
+    """
+    Claims of already verified tokens, keyed by token hash, until they expire
+
+    Clients send the same session token on every request until it is
+    refreshed, so most requests skip signature verification entirely.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, claims = entry
+        if expires_at <= time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return claims
+
+    def put(self, key: str, claims: Dict[str, Any]):
+        self.entries[key] = (float(claims["exp"]), claims)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
 
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not extract user ID from token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
 
-        return {
-            "user_id": user_id,
-            "session_id": decoded.get("sid"),
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def decode_token(token: str) -> Dict[str, Any]:
+    """
+    Verify a Clerk session token against the cached JWKS
+
+    Checks signature, exp/nbf (with auth_leeway_seconds), and issuer and
+    authorized party when configured.
+    Returns: token claims
+    """
+    cache_key = token_cache.make_key(token)
+    claims = token_cache.get(cache_key)
+    if claims is not None:
+        return claims
+
+    header = jwt.get_unverified_header(token)
+    if header.get("alg") not in ALGORITHMS:
+        raise jwt.InvalidAlgorithmError("Unsupported token algorithm")
+    key = await jwks_cache.get_key(header.get("kid"))
+
+    claims = jwt.decode(
+        token,
+        key,
+        algorithms=ALGORITHMS,
+        issuer=settings.clerk_issuer,
+        leeway=settings.auth_leeway_seconds,
+        options={
+            "require": ["exp", "sub"],
+            "verify_iss": settings.clerk_issuer is not None,
+            "verify_aud": False
         }
+    )
+
+    authorized_parties = [p.strip() for p in settings.clerk_authorized_parties.split(",") if p.strip()]
+    if authorized_parties and claims.get("azp") not in authorized_parties:
+        raise jwt.InvalidTokenError("Token issued for an unauthorized party")
+
+    token_cache.put(cache_key, claims)
+    return claims
+
 
+async def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> dict:
+    """
+    Verify Clerk JWT token and return user information
+    """
+    try:
+        decoded = await decode_token(credentials.credentials)
+    except jwt.ExpiredSignatureError:
+        raise _unauthorized("Token expired")
     except jwt.DecodeError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token format",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _unauthorized("Invalid token format")
+    except jwt.InvalidTokenError as e:
+        raise _unauthorized(f"Invalid token: {str(e)}")
     except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Could not validate credentials: {str(e)}",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _unauthorized(f"Could not validate credentials: {str(e)}")
+
+    # Extract user_id from the JWT (Clerk uses 'sub' for user ID)
+    user_id = decoded.get("sub") or decoded.get("user_id")
+
+    if not user_id:
+        raise _unauthorized("Could not extract user ID from token")
+
+    return {
+        "user_id": user_id,
+        "session_id": decoded.get("sid"),
+    }
 
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
@@ -54,3 +210,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(
     """
     user_data = await verify_token(credentials)
     return user_data["user_id"]
+
+
+# Singleton instances
+jwks_cache = JWKSCache()
+token_cache = VerifiedTokenCache(settings.auth_token_cache_size)
@@ -1,6 +1,8 @@
 import httpx
 from typing import Dict, Any
 from app.config import get_settings
+from app.http_clients import http_clients
+from app.llm_cache import llm_cache
 from app.models import DocumentType
 import json
 
@@ -54,9 +56,17 @@ Example response:
 
             user_prompt = f"Classify this document:\n\n{text[:2000]}"  # Limit to first 2000 chars
 
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            cache_key = llm_cache.make_key(
+                self.model, system_prompt, user_prompt,
+                response_format="json_object", temperature=0.1, max_tokens=500
+            )
+            classification = await llm_cache.get("classifier", cache_key)
+
+            if classification is None:
+                client = http_clients.openai
                 response = await client.post(
                     self.base_url,
+                    timeout=self.timeout,
                     headers={
                         "Authorization": f"Bearer {self.api_key}",
                         "Content-Type": "application/json"
@@ -79,42 +89,43 @@ Example response:
                 # Extract the classification from OpenAI response
                 content = result["choices"][0]["message"]["content"]
                 classification = json.loads(content)
+                await llm_cache.set("classifier", cache_key, classification)
+
+            category = classification.get("category", "unknown")
+            confidence = classification.get("confidence", 0.0)
+            reasoning = classification.get("reasoning", "")
+
+            # Map category to document type
+            document_type = self.label_to_type.get(
+                category,
+                DocumentType.UNKNOWN
+            )
+
+            # Create confidence scores for all categories
+            confidence_scores = {
+                "invoice": 0.0,
+                "contract": 0.0,
+                "meeting_minutes": 0.0,
+                "email": 0.0
+            }
+            if category in confidence_scores:
+                confidence_scores[category] = confidence
+                # Distribute remaining confidence among other categories
+                remaining = (1.0 - confidence) / 3
+                for key in confidence_scores:
+                    if key != category:
+                        confidence_scores[key] = remaining
 
-                category = classification.get("category", "unknown")
-                confidence = classification.get("confidence", 0.0)
-                reasoning = classification.get("reasoning", "")
-
-                # Map category to document type
-                document_type = self.label_to_type.get(
-                    category,
-                    DocumentType.UNKNOWN
-                )
-
-                # Create confidence scores for all categories
-                confidence_scores = {
-                    "invoice": 0.0,
-                    "contract": 0.0,
-                    "meeting_minutes": 0.0,
-                    "email": 0.0
-                }
-                if category in confidence_scores:
-                    confidence_scores[category] = confidence
-                    # Distribute remaining confidence among other categories
-                    remaining = (1.0 - confidence) / 3
-                    for key in confidence_scores:
-                        if key != category:
-                            confidence_scores[key] = remaining
-
-                return {
-                    "success": True,
-                    "document_type": document_type,
-                    "confidence": confidence_scores,
-                    "reasoning": reasoning,
-                    "predicted_label": category
-                }
+            return {
+                "success": True,
+                "document_type": document_type,
+                "confidence": confidence_scores,
+                "reasoning": reasoning,
+                "predicted_label": category
+            }
 
         except httpx.TimeoutException:
-            return {~
+            return {
                 "success": False,
                 "error": "OpenAI API timeout",
                 "document_type": DocumentType.UNKNOWN,
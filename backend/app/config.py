@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -8,6 +9,14 @@ class Settings(BaseSettings):
 
     # Clerk Authentication
     clerk_secret_key: str
+    clerk_jwks_url: str = "https://api.clerk.com/v1/jwks"  # Fetched with the secret key
+    clerk_jwks_file: Optional[str] = None  # Local JWKS file used instead of the URL (offline/testing)
+    clerk_issuer: Optional[str] = None  # Expected "iss", e.g. https://<your-app>.clerk.accounts.dev
+    clerk_authorized_parties: str = ""  # Comma-separated allowed "azp" origins (empty: not checked)
+    auth_jwks_refresh_seconds: int = 3600  # Background refresh of the signing keys
+    auth_jwks_min_refetch_seconds: int = 30  # Unknown key IDs trigger at most one refetch per interval
+    auth_token_cache_size: int = 10000  # Verified tokens remembered until they expire
+    auth_leeway_seconds: int = 5  # Clock skew tolerated for exp/nbf
 
     # MinIO S3 Storage
     minio_endpoint: str
@@ -15,17 +24,75 @@ class Settings(BaseSettings):
     minio_secret_key: str
     minio_bucket: str
     minio_secure: bool = False
+    minio_region: Optional[str] = None  # Set to skip the bucket region lookup at startup
+    storage_part_size: int = 5 * 1024 * 1024  # Multipart chunk size (S3 minimum is 5 MiB)
+    storage_spool_max_memory: int = 5 * 1024 * 1024  # Downloads larger than this spill to disk
+    storage_parallel_parts: int = 4  # Multipart parts of one upload sent concurrently
+    storage_max_concurrency: int = 16  # Storage calls running at once from async code (thread pool size)
+    storage_max_connections: int = 64  # Pooled HTTP connections to MinIO
+    storage_url_cache_size: int = 100_000  # Presigned URLs kept per process
 
     # PaddleOCR-VL Service
     paddleocr_vl_url: str
 
     # OpenAI API
     openai_api_key: str
+    openai_base_url: str = "https://api.openai.com/v1"  # Any OpenAI-compatible endpoint (e.g. a local mock)
+
+    # LLM response cache
+    llm_cache_backend: str = "postgres"  # "postgres", "local" (on-disk) or "none"
+    llm_cache_ttl_seconds: int = 30 * 24 * 3600
+    llm_cache_max_bytes: int = 512 * 1024 * 1024  # Least recently used entries are evicted above this
+    llm_cache_dir: str = "/tmp/compass-llm-cache"  # Used by the local backend
+
+    # Shared HTTP clients (app.http_clients)
+    openai_http2: bool = True
+    openai_max_connections: int = 20
+    openai_max_keepalive_connections: int = 10
+    ocr_max_connections: int = 10
+    http_keepalive_expiry: float = 30.0  # Seconds an idle pooled connection is kept open
 
     # Application
     backend_host: str = "0.0.0.0"
     backend_port: int = 8000
 
+    # Bulk upload (app.uploads)
+    bulk_upload_max_files: int = 1000  # Files (including ZIP entries) per request
+    bulk_upload_max_file_bytes: int = 100 * 1024 * 1024  # Per file, including files decompressed from ZIP archives
+    bulk_upload_concurrency: int = 8  # Files streamed to storage at once
+
+    # Full-text search
+    search_text_config: str = "simple"  # Postgres text search configuration, e.g. "english" for stemming
+
+    # Invoice normalization
+    invoice_day_first: bool = True  # Read ambiguous dates like 03/04/2025 as 3 April (False: March 4)
+
+    # Processing traces (per-attempt stage timings, see app.traces)
+    processing_traces_enabled: bool = True
+    processing_trace_retention_days: int = 30  # Used by python -m app.traces --prune
+
+    # Bulk export
+    export_batch_size: int = 2000  # Rows fetched per server-side cursor round trip
+
+    # Document status event stream
+    events_keepalive_seconds: float = 15.0
+
+    # Deduplication of identical uploads
+    dedup_enabled: bool = True
+    dedup_scope: str = "user"  # "user": reuse results within a user's documents, "global": across all users
+
+    # Processing worker
+    worker_concurrency: int = 4
+    worker_poll_interval: float = 2.0  # Seconds between queue polls when idle
+    worker_lease_seconds: int = 300  # Claimed jobs are reclaimable after this without a heartbeat
+    worker_heartbeat_seconds: int = 60
+    worker_max_attempts: int = 3
+    worker_retry_backoff_seconds: int = 30  # Doubled on every failed attempt
+    worker_retry_backoff_max_seconds: int = 900
+    worker_ocr_batch_size: int = 8  # Documents claimed together share one OCR request (1 disables batching)
+    worker_metrics_port: int = 9101  # Prometheus metrics of each worker process (0 disables)
+    metrics_finished_counts_seconds: int = 300  # How often /metrics recounts completed/failed documents
+
     class Config:
         env_file = ".env"
         case_sensitive = False
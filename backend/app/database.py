@@ -1,4 +1,6 @@
+from sqlalchemy import inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.schema import AddConstraint, CreateColumn, CreateIndex
 from sqlalchemy.orm import declarative_base
 from app.config import get_settings
 
@@ -38,10 +40,57 @@ async def get_db():
             await session.close()
 
 
+# Serializes schema setup between the API and workers starting at the same time
+SCHEMA_LOCK_ID = 7254001
+
+# Indexes earlier versions created that nothing queries any more
+OBSOLETE_INDEXES = ("ix_documents_invoice_date",)
+
+
+def upgrade_schema(connection):
+    """
+    Bring tables created by an older version up to date
+
+    create_all() only creates missing tables (with their indexes). Columns an
+    existing table lacks are added (nullable, or NOT NULL with their server
+    default) together with their foreign keys, missing indexes are created
+    and obsolete ones dropped. Safe to run on every startup.
+    """
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        added = [column for column in table.columns if column.name not in existing]
+        for column in added:
+            connection.execute(text(
+                f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN IF NOT EXISTS "
+                f"{CreateColumn(column).compile(dialect=connection.dialect)}"
+            ))
+            for foreign_key in column.foreign_keys:
+                connection.execute(AddConstraint(foreign_key.constraint))
+        for index in table.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+        if added:
+            print(f"Added columns to {table.name}: {', '.join(column.name for column in added)}")
+        if table.name == "documents" and "locked_until" in {column.name for column in added}:
+            # Versions before the processing queue ran the pipeline in the API process;
+            # documents they left in PROCESSING would never be claimed, so queue them again
+            connection.execute(
+                table.update().where(table.c.status == "PROCESSING").values(status="UPLOADED")
+            )
+
+    for name in OBSOLETE_INDEXES:
+        connection.execute(text(f"DROP INDEX IF EXISTS {preparer.quote(name)}"))
+
+
 async def init_db():
-    """Initialize database tables"""
+    """Create missing tables and upgrade existing ones (see upgrade_schema)"""
     async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": SCHEMA_LOCK_ID})
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
 
 
 def get_db_engine():
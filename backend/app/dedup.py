@@ -0,0 +1,143 @@
+import asyncio
+from typing import Dict, Iterable, Optional, Set
+from sqlalchemy import select, func, literal, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.models import Document, DocumentStatus
+from app.storage import async_storage
+
+settings = get_settings()
+
+# Advisory lock namespace of storage object keys (see lock_objects)
+OBJECT_LOCK_NAMESPACE = 7254002
+
+
+async def find_processed_duplicate(db: AsyncSession, content_hash: str, user_id: str) -> Optional[Document]:
+    """
+    Find the most recent fully processed document with the same contents
+
+    Scoped to the uploading user unless dedup_scope is "global".
+    """
+    if not settings.dedup_enabled or not content_hash:
+        return None
+
+    query = (
+        select(Document)
+        .where(
+            Document.content_hash == content_hash,
+            Document.status == DocumentStatus.COMPLETED
+        )
+        .order_by(Document.created_at.desc())
+        .limit(1)
+    )
+    if settings.dedup_scope != "global":
+        query = query.where(Document.user_id == user_id)
+
+    result = await db.execute(query)
+    return result.scalar_one_or_none()
+
+
+async def find_processed_duplicates(db: AsyncSession, content_hashes: Iterable[str],
+                                    user_id: str) -> Dict[str, Document]:
+    """find_processed_duplicate for many files in one query; returns {content_hash: document}"""
+    content_hashes = {content_hash for content_hash in content_hashes if content_hash}
+    if not settings.dedup_enabled or not content_hashes:
+        return {}
+
+    query = (
+        select(Document)
+        .where(
+            Document.content_hash.in_(content_hashes),
+            Document.status == DocumentStatus.COMPLETED
+        )
+        .order_by(Document.content_hash, Document.created_at.desc())
+        .distinct(Document.content_hash)
+    )
+    if settings.dedup_scope != "global":
+        query = query.where(Document.user_id == user_id)
+
+    result = await db.execute(query)
+    return {document.content_hash: document for document in result.scalars()}
+
+
+def copy_processing_results(source: Document, target: Document):
+    """Reuse OCR and extraction results of an identical document, skipping the pipeline"""
+    target.ocr_text = source.ocr_text
+    target.ocr_metadata = source.ocr_metadata
+    target.ocr_completed_at = source.ocr_completed_at
+    target.invoice_data = source.invoice_data
+    target.invoice_extracted_at = source.invoice_extracted_at
+    # Deferred column: copied in SQL rather than loaded
+    target.search_vector = (
+        select(Document.search_vector).where(Document.id == source.id).scalar_subquery()
+    )
+    target.status = DocumentStatus.COMPLETED
+    target.error_message = None
+    target.duplicate_of = source.duplicate_of or source.id
+
+
+async def lock_objects(db: AsyncSession, object_keys: Iterable[str]):
+    """
+    Lock storage objects until the end of the current transaction
+
+    Identical uploads share one object, which is deleted with the last
+    document referencing it. Uploads take this lock before inserting their
+    rows and then check the object still exists (missing_objects), deletes
+    take it before counting references (release_object), so an upload that
+    skipped storing an existing object cannot have it deleted underneath it.
+    All keys are locked with one statement, in sorted order (unnest returns
+    the array in order) so concurrent batches cannot deadlock.
+    """
+    object_keys = sorted(set(object_keys))
+    if not object_keys:
+        return
+    keys = func.unnest(literal(object_keys, ARRAY(Text))).table_valued("object_key").render_derived()
+    await db.execute(
+        select(func.pg_advisory_xact_lock(OBJECT_LOCK_NAMESPACE, func.hashtext(keys.c.object_key)))
+        .select_from(keys)
+    )
+
+
+async def missing_objects(db: AsyncSession, object_keys: Iterable[str]) -> Set[str]:
+    """
+    Keys that are no longer stored (call with lock_objects held)
+
+    An object is only deleted with the last document referencing it, so
+    keys a document still references are stored; storage is only asked
+    about the others.
+    """
+    object_keys = set(object_keys)
+    if not object_keys:
+        return set()
+    referenced = set((await db.execute(
+        select(Document.s3_key).where(Document.s3_key.in_(object_keys)).distinct()
+    )).scalars())
+    unreferenced = list(object_keys - referenced)
+    exists = await asyncio.gather(*(async_storage.object_exists(object_key) for object_key in unreferenced))
+    return {object_key for object_key, found in zip(unreferenced, exists) if not found}
+
+
+async def release_object(db: AsyncSession, object_key: str) -> bool:
+    """
+    Delete a storage object once no document references it
+
+    Call after deleting the referencing document and before committing: the
+    object is removed while its lock is held, so a concurrent upload of the
+    same contents either commits its document first (and the object is kept)
+    or finds the object gone and stores it again. If removing the object
+    fails an exception is raised, so the delete rolls back.
+
+    Returns:
+        True if the object was deleted
+    """
+    await lock_objects(db, [object_key])
+    references = await db.scalar(
+        select(func.count()).select_from(Document).where(Document.s3_key == object_key)
+    )
+    if references:
+        return False
+    # delete_file reports storage errors as False; raise so the caller's delete rolls back
+    if not await async_storage.delete_file(object_key):
+        raise Exception(f"Failed to delete file from storage: {object_key}")
+    return True
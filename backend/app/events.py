@@ -0,0 +1,146 @@
+import asyncio
+import json
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+import asyncpg
+from sqlalchemy import select, func, literal, Text
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+
+settings = get_settings()
+
+# Postgres NOTIFY channel carrying document status changes
+CHANNEL = "document_events"
+
+
+async def notify_status(db: AsyncSession, changes: Iterable[Tuple[str, str, str]]):
+    """
+    Queue status change notifications in the current transaction
+
+    Postgres delivers them to every listening API replica when the
+    transaction commits (and drops them if it rolls back), so call this
+    before `commit()`.
+
+    Args:
+        changes: (document_id, user_id, status) per changed document; status
+            is a DocumentStatus value or "deleted"
+    """
+    payloads = [
+        json.dumps({
+            "id": document_id,
+            "user_id": user_id,
+            "status": getattr(status, "value", status)
+        })
+        for document_id, user_id, status in changes
+    ]
+    if not payloads:
+        return
+
+    # One statement however many documents changed
+    payload = func.unnest(literal(payloads, ARRAY(Text))).table_valued("payload").render_derived()
+    await db.execute(select(func.pg_notify(CHANNEL, payload.c.payload)).select_from(payload))
+
+
+class DocumentEventBroker:
+    """
+    Fans document status changes out to the event streams of connected users
+
+    Holds one dedicated LISTEN connection per API process (reconnecting with
+    backoff if it drops) and a bounded queue per open stream. A subscriber
+    that falls behind, or any subscriber after a reconnect, receives a
+    "resync" event telling the client to refetch instead of trusting the
+    incremental updates.
+    """
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._connected = False
+
+    def start(self):
+        """Start listening (called from the application lifespan)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def _deliver(self, queue: asyncio.Queue, event: Dict[str, Any]):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: replace its backlog with a single resync
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({"type": "resync"})
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        for queue in list(self.subscribers.get(event.pop("user_id", None), ())):
+            self._deliver(queue, {"type": "document", **event})
+
+    async def _listen_forever(self):
+        # asyncpg only takes plain postgresql:// DSNs, not SQLAlchemy's postgresql+asyncpg://
+        dsn = make_url(settings.database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        delay = 1.0
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(CHANNEL, self._on_notification)
+                self._connected = True
+                delay = 1.0
+
+                # Changes may have been missed while disconnected
+                for queues in list(self.subscribers.values()):
+                    for queue in list(queues):
+                        self._deliver(queue, {"type": "resync"})
+
+                await closed.wait()
+                print("Document event listener connection closed, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Document event listener failed: {str(e)}")
+            finally:
+                self._connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self._connected,
+            "users": len(self.subscribers),
+            "streams": sum(len(queues) for queues in self.subscribers.values())
+        }
+
+
+# Singleton instance
+event_broker = DocumentEventBroker()
@@ -0,0 +1,207 @@
+"""
+Streaming export of a user's documents and their normalized invoice fields
+
+Rows are read through a server-side cursor in batches of `EXPORT_BATCH_SIZE`
+and encoded batch by batch, so memory stays flat however many documents
+are exported.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+from sqlalchemy import select
+from app.config import get_settings
+from app.database import async_session
+from app.models import Document, DocumentStatus, Invoice
+
+settings = get_settings()
+
+EXPORT_COLUMNS = (
+    ("document_id", Document.id),
+    ("filename", Document.original_filename),
+    ("status", Document.status),
+    ("created_at", Document.created_at),
+    ("invoice_number", Invoice.invoice_number),
+    ("invoice_date", Invoice.invoice_date),
+    ("due_date", Invoice.due_date),
+    ("vendor_name", Invoice.vendor_name),
+    ("vendor_key", Invoice.vendor_key),
+    ("vendor_tax_id", Invoice.vendor_tax_id),
+    ("receiver_name", Invoice.receiver_name),
+    ("currency", Invoice.currency),
+    ("total_amount", Invoice.total_amount),
+    ("subtotal", Invoice.subtotal),
+    ("tax_amount", Invoice.tax_amount),
+)
+COLUMN_NAMES = [name for name, _ in EXPORT_COLUMNS]
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def build_export_query(user_id: str, status: Optional[DocumentStatus] = None,
+                       date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """
+    Export rows of a user's documents, oldest first
+
+    Documents without extracted invoice data are included with empty
+    invoice fields unless a date filter is given.
+
+    Args:
+        status: Only documents in this status
+        date_from, date_to: Inclusive invoice_date bounds
+    """
+    query = (
+        select(*(column for _, column in EXPORT_COLUMNS))
+        .outerjoin(Invoice, Invoice.document_id == Document.id)
+        .where(Document.user_id == user_id)
+        .order_by(Document.created_at, Document.id)
+    )
+    if status:
+        query = query.where(Document.status == status)
+    if date_from:
+        query = query.where(Invoice.invoice_date >= date_from)
+    if date_to:
+        query = query.where(Invoice.invoice_date <= date_to)
+    return query
+
+
+def _plain(value: Any) -> Any:
+    """JSON/CSV representation of a column value (Decimals stay exact as strings)"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return getattr(value, "value", value)
+
+
+async def iter_row_batches(query) -> AsyncIterator[List[Sequence[Any]]]:
+    """Rows of `query` in batches, fetched through a server-side cursor"""
+    async with async_session() as db:
+        result = await db.stream(query.execution_options(yield_per=settings.export_batch_size))
+        async for partition in result.partitions():
+            yield partition
+
+
+async def stream_csv(query) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMN_NAMES)
+    async for rows in iter_row_batches(query):
+        writer.writerows([_plain(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def stream_ndjson(query) -> AsyncIterator[bytes]:
+    async for rows in iter_row_batches(query):
+        yield "".join(
+            json.dumps({name: _plain(value) for name, value in zip(COLUMN_NAMES, row)}) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object handing out what has been written since the last drain"""
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_schema():
+    import pyarrow as pa
+
+    amount = pa.decimal128(38, 10)
+    return pa.schema([
+        ("document_id", pa.string()),
+        ("filename", pa.string()),
+        ("status", pa.string()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("invoice_number", pa.string()),
+        ("invoice_date", pa.date32()),
+        ("due_date", pa.date32()),
+        ("vendor_name", pa.string()),
+        ("vendor_key", pa.string()),
+        ("vendor_tax_id", pa.string()),
+        ("receiver_name", pa.string()),
+        ("currency", pa.string()),
+        ("total_amount", amount),
+        ("subtotal", amount),
+        ("tax_amount", amount),
+    ])
+
+
+async def stream_parquet(query) -> AsyncIterator[bytes]:
+    """One Parquet row group per fetched batch; only the open row group is held in memory"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema()
+    status_index = COLUMN_NAMES.index("status")
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        async for rows in iter_row_batches(query):
+            columns: List[List[Any]] = [[] for _ in COLUMN_NAMES]
+            for row in rows:
+                for index, value in enumerate(row):
+                    columns[index].append(_plain(value) if index == status_index else value)
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_stream(export_format: str, query) -> AsyncIterator[bytes]:
+    return {
+        "csv": stream_csv,
+        "ndjson": stream_ndjson,
+        "parquet": stream_parquet,
+    }[export_format](query)
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_headers(export_format: str) -> Dict[str, str]:
+    _, extension = EXPORT_FORMATS[export_format]
+    filename = f"invoices-{datetime.utcnow():%Y%m%d-%H%M%S}.{extension}"
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
@@ -0,0 +1,47 @@
+import hashlib
+from typing import Optional
+from fastapi import Response
+from app.storage import presign_window
+
+# Detail responses embed a presigned file URL valid for this long; their ETag
+# rolls over with the URL's signing window so a cached copy never holds an
+# expired URL
+FILE_URL_EXPIRES = 3600
+
+# Documents in these statuses only change again if they are deleted
+FINAL_STATUSES = {"completed", "failed"}
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the values that determine a response"""
+    digest = hashlib.sha256("|".join("" if p is None else str(p) for p in parts).encode("utf-8"))
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def file_url_epoch() -> int:
+    window, _ = presign_window(FILE_URL_EXPIRES)
+    return window
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 specifies for this header)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def cache_headers(etag: str, cache_control: str = "private, no-cache") -> dict:
+    """
+    Validator headers for a cacheable response
+
+    `no-cache` lets clients keep the body but revalidate on every use, which
+    turns repeated polling into cheap 304s.
+    """
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def not_modified(etag: str, cache_control: str = "private, no-cache") -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, cache_control))
@@ -0,0 +1,141 @@
+import httpx
+from typing import Dict, Any
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    """
+    Transport wrapper counting the requests of one client
+
+    httpx keeps its connection pool private, so usage is tracked here
+    instead of being read from the pool.
+    """
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+        self.requests = 0
+        self.in_flight = 0  # Sent and waiting for response headers
+        self.errors = 0  # Connect/read failures and timeouts
+        self.http2_responses = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        if response.extensions.get("http_version") == b"HTTP/2":
+            self.http2_responses += 1
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "errors": self.errors,
+            "http2_responses": self.http2_responses
+        }
+
+
+class HTTPClientRegistry:
+    """
+    Application-lifetime pooled HTTP clients, one per upstream
+
+    Clients are created on first use (so scripts work without a lifespan) and
+    closed by the FastAPI lifespan / worker shutdown. Reusing them keeps TCP
+    and TLS connections alive between documents instead of handshaking on
+    every call.
+    """
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._transports: Dict[str, CountingTransport] = {}
+        self._limits: Dict[str, httpx.Limits] = {}
+
+    @staticmethod
+    def _config(name: str) -> Dict[str, Any]:
+        """Transport settings (and client timeout) of an upstream"""
+        if name == "openai":
+            return {
+                "http2": settings.openai_http2,
+                "limits": httpx.Limits(
+                    max_connections=settings.openai_max_connections,
+                    max_keepalive_connections=settings.openai_max_keepalive_connections,
+                    keepalive_expiry=settings.http_keepalive_expiry
+                )
+            }
+        if name == "ocr":
+            return {
+                "limits": httpx.Limits(
+                    max_connections=settings.ocr_max_connections,
+                    max_keepalive_connections=settings.ocr_max_connections,
+                    keepalive_expiry=settings.http_keepalive_expiry
+                )
+            }
+        if name == "clerk":
+            # Only used to fetch signing keys
+            return {
+                "limits": httpx.Limits(max_connections=2, keepalive_expiry=settings.http_keepalive_expiry),
+                "timeout": 10.0
+            }
+        raise KeyError(f"Unknown upstream: {name}")
+
+    def _build(self, name: str) -> httpx.AsyncClient:
+        config = self._config(name)
+        client_options = {"timeout": config.pop("timeout")} if "timeout" in config else {}
+        transport = CountingTransport(httpx.AsyncHTTPTransport(**config))
+        self._transports[name] = transport
+        self._limits[name] = config["limits"]
+        return httpx.AsyncClient(transport=transport, **client_options)
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._build(name)
+            self._clients[name] = client
+        return client
+
+    @property
+    def openai(self) -> httpx.AsyncClient:
+        return self.get("openai")
+
+    @property
+    def ocr(self) -> httpx.AsyncClient:
+        return self.get("ocr")
+
+    @property
+    def clerk(self) -> httpx.AsyncClient:
+        return self.get("clerk")
+
+    def start(self):
+        """Create all clients up front (called from the application lifespan)"""
+        for name in ("openai", "ocr", "clerk"):
+            self.get(name)
+
+    async def aclose(self):
+        """Close all clients and their pooled connections"""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """Request counts and connection limits per upstream"""
+        return {
+            name: {
+                **self._transports[name].stats(),
+                "max_connections": self._limits[name].max_connections,
+                "closed": client.is_closed
+            }
+            for name, client in self._clients.items()
+        }
+
+
+# Singleton instance
+http_clients = HTTPClientRegistry()
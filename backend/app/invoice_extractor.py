@@ -2,6 +2,9 @@ import httpx
 from typing import Dict, Any, Optional
 from pydantic import BaseModel, Field
 from app.config import get_settings
+from app.http_clients import http_clients
+from app.llm_cache import llm_cache
+from app.metrics import LLM_CACHE_HITS, timed, record_upstream, record_llm_usage
 
 settings = get_settings()
 
@@ -41,7 +44,7 @@ class InvoiceExtractor:
     def __init__(self):
         self.api_key = settings.openai_api_key
         self.model = "gpt-4o-mini-2024-07-18"  # Supports structured outputs
-        self.base_url = "https://api.openai.com/v1/chat/completions"
+        self.base_url = f"{settings.openai_base_url.rstrip('/')}/chat/completions"
         self.timeout = 60.0
 
     def get_json_schema(self) -> Dict[str, Any]:
@@ -119,9 +122,25 @@ IMPORTANT:
 
             user_prompt = f"Extract invoice data from this OCR text:\n\n{ocr_text}"
 
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            # Temperature 0 with a fixed schema: identical input gives the same answer
+            cache_key = llm_cache.make_key(
+                self.model, system_prompt, user_prompt,
+                schema=self.get_json_schema(), temperature=0.0
+            )
+            cached = await llm_cache.get("invoice_extractor", cache_key)
+            if cached is not None:
+                LLM_CACHE_HITS.labels("invoice_extractor").inc()
+                return {
+                    "success": True,
+                    "invoice_data": cached,
+                    "cached": True
+                }
+
+            client = http_clients.openai
+            with timed("llm_call"):
                 response = await client.post(
                     self.base_url,
+                    timeout=self.timeout,
                     headers={
                         "Authorization": f"Bearer {self.api_key}",
                         "Content-Type": "application/json"
@@ -140,28 +159,35 @@ IMPORTANT:
                     }
                 )
 
-                response.raise_for_status()
-                result = response.json()
+            response.raise_for_status()
+            result = response.json()
+            record_upstream("openai", "success")
+            record_llm_usage(self.model, result.get("usage"))
 
-                # Extract structured data from response
-                invoice_data = result["choices"][0]["message"]["content"]
+            # Extract structured data from response
+            invoice_data = result["choices"][0]["message"]["content"]
 
-                # Parse JSON string to dict
-                import json
-                parsed_data = json.loads(invoice_data)
+            # Parse JSON string to dict
+            import json
+            parsed_data = json.loads(invoice_data)
+            await llm_cache.set("invoice_extractor", cache_key, parsed_data)
 
-                return {
-                    "success": True,
-                    "invoice_data": parsed_data
-                }
+            return {
+                "success": True,
+                "invoice_data": parsed_data,
+                "model": self.model,
+                "usage": result.get("usage")
+            }
 
         except httpx.TimeoutException:
+            record_upstream("openai", "timeout")
             return {
                 "success": False,
                 "error": "OpenAI API timeout",
                 "invoice_data": None
             }
         except httpx.HTTPStatusError as e:
+            record_upstream("openai", "error")
             error_msg = f"OpenAI API error: {e.response.status_code}"
             try:
                 error_detail = e.response.json()
@@ -173,6 +199,13 @@ IMPORTANT:
                 "error": error_msg,
                 "invoice_data": None
             }
+        except httpx.RequestError as e:
+            record_upstream("openai", "error")
+            return {
+                "success": False,
+                "error": f"Invoice extraction failed: {str(e)}",
+                "invoice_data": None
+            }
         except Exception as e:
             return {
                 "success": False,
@@ -0,0 +1,228 @@
+import re
+import unicodedata
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Optional, Tuple
+from app.config import get_settings
+
+settings = get_settings()
+
+# Symbols and words the extractor leaves in amounts or the currency field
+CURRENCY_ALIASES = {
+    "$": "USD", "US$": "USD", "DOLLAR": "USD", "DOLLARS": "USD",
+    "€": "EUR", "EURO": "EUR", "EUROS": "EUR",
+    "£": "GBP", "POUND": "GBP", "POUNDS": "GBP",
+    "¥": "JPY", "YEN": "JPY",
+    "₹": "INR", "RS": "INR",
+    "C$": "CAD", "CA$": "CAD", "A$": "AUD", "AU$": "AUD",
+    "FR": "CHF", "SFR": "CHF",
+    "ZŁ": "PLN", "KČ": "CZK",
+}
+
+# Active ISO 4217 codes (metals, funds and test codes left out)
+ISO_4217_CODES = frozenset("""
+    AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB BRL BSD BTN
+    BWP BYN BZD CAD CDF CHF CLP CNY COP CRC CUP CVE CZK DJF DKK DOP DZD EGP ERN ETB EUR FJD
+    FKP GBP GEL GHS GIP GMD GNF GTQ GYD HKD HNL HTG HUF IDR ILS INR IQD IRR ISK JMD JOD JPY
+    KES KGS KHR KMF KPW KRW KWD KYD KZT LAK LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP
+    MRU MUR MVR MWK MXN MYR MZN NAD NGN NIO NOK NPR NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR
+    RON RSD RUB RWF SAR SBD SCR SDG SEK SGD SHP SLE SLL SOS SRD SSP STN SVC SYP SZL THB TJS
+    TMT TND TOP TRY TTD TWD TZS UAH UGX USD UYU UZS VED VES VND VUV WST XAF XCD XCG XOF XPF
+    YER ZAR ZMW ZWG ZWL
+""".split())
+
+# Codes that are also everyday words: only trusted next to an amount or as the whole field
+AMBIGUOUS_CODES = frozenset({"ALL", "CUP", "MOP", "TOP"})
+
+CURRENCY_CODE = re.compile(r"\b([A-Z]{3})\b")
+# A symbol, alias or code; longest aliases first so "US$" wins over "$"
+CURRENCY_TOKEN = "|".join(
+    [re.escape(alias) for alias in sorted(CURRENCY_ALIASES, key=len, reverse=True)] + ["[A-Z]{3}"]
+)
+NUMBER = re.compile(r"\d[\d.,'   ]*")
+# Sign and currency right before an amount: "-", "(", "-$", "$-", "($", "EUR (", ...
+AMOUNT_PREFIX = re.compile(rf"(?:([-(−])\s*)?(?:(?<![A-Z])({CURRENCY_TOKEN})\s*)?([-(−])?\s*$")
+# Currency right after an amount: "1.234,56 €", "99 EUR"
+AMOUNT_SUFFIX = re.compile(rf"\s*({CURRENCY_TOKEN})(?![A-Z])")
+
+DATE_FORMATS = (
+    "%Y/%m/%d", "%Y.%m.%d",
+    "%d %B %Y", "%d %b %Y", "%d. %B %Y", "%B %d, %Y", "%b %d, %Y", "%B %d %Y", "%b %d %Y",
+)
+NUMERIC_DATE = re.compile(r"^(\d{1,2})[./-](\d{1,2})[./-](\d{2,4})$")
+
+# Legal form suffixes ignored when matching vendor names
+LEGAL_SUFFIXES = {
+    "inc", "incorporated", "llc", "ltd", "limited", "corp", "corporation", "co", "company",
+    "plc", "gmbh", "ag", "kg", "ug", "se", "sa", "sas", "sarl", "srl", "spa", "bv", "nv", "oy", "ab",
+}
+
+
+def parse_amount(value: Optional[str]) -> Tuple[Optional[Decimal], Optional[str]]:
+    """
+    Parse a free-form amount such as "$1,234.56", "1.234,56 €", "EUR 99" or "($5.00)"
+
+    The decimal separator is the last "." or "," followed by one or two
+    digits; other separators are treated as thousands separators. A minus
+    sign or opening parenthesis before the amount (and its currency) makes
+    it negative.
+
+    Returns:
+        (amount, currency code), either may be None; a symbol or code next
+        to the amount wins over one elsewhere in the text
+    """
+    if value is None:
+        return None, None
+    text = str(value).strip()
+
+    match = NUMBER.search(text)
+    if not match:
+        return None, parse_currency(text)
+
+    number = match.group(0).rstrip()
+    prefix = AMOUNT_PREFIX.search(text[:match.start()].upper())
+    suffix = AMOUNT_SUFFIX.match(text[match.start() + len(number):].upper())
+    negative = bool(prefix.group(1) or prefix.group(3))
+    currency = (
+        _currency_token(prefix.group(2))
+        or _currency_token(suffix.group(1) if suffix else None)
+        or parse_currency(text)
+    )
+
+    digits = re.sub(r"[^\d.,]", "", number)
+
+    separator = max(digits.rfind("."), digits.rfind(","))
+    if separator >= 0 and 1 <= len(digits) - separator - 1 <= 2:
+        whole, fraction = digits[:separator], digits[separator + 1:]
+    else:
+        whole, fraction = digits, ""
+    whole = re.sub(r"[.,]", "", whole) or "0"
+
+    try:
+        amount = Decimal(f"{whole}.{fraction}" if fraction else whole)
+    except InvalidOperation:
+        return None, currency
+    return (-amount if negative else amount), currency
+
+
+def _currency_token(token: Optional[str]) -> Optional[str]:
+    """ISO 4217 code for a single symbol, alias or code (None if it is neither)"""
+    if not token:
+        return None
+    if token in CURRENCY_ALIASES:
+        return CURRENCY_ALIASES[token]
+    return token if token in ISO_4217_CODES else None
+
+
+def parse_currency(value: Optional[str]) -> Optional[str]:
+    """ISO 4217 code from a currency field or an amount ("€", "usd", "CHF 10")"""
+    if not value:
+        return None
+    text = str(value).strip().upper()
+
+    if text in ISO_4217_CODES:
+        return text
+    for code in CURRENCY_CODE.findall(text):
+        if code in ISO_4217_CODES and code not in AMBIGUOUS_CODES:
+            return code
+
+    # Longest aliases first so "US$" wins over "$"
+    for alias in sorted(CURRENCY_ALIASES, key=len, reverse=True):
+        if alias.isalpha():
+            if re.search(rf"(?<![A-Z]){re.escape(alias)}(?![A-Z])", text):
+                return CURRENCY_ALIASES[alias]
+        elif alias in text:
+            return CURRENCY_ALIASES[alias]
+    return None
+
+
+def parse_date(value: Optional[str], day_first: Optional[bool] = None) -> Optional[date]:
+    """
+    Parse an invoice date; ISO dates first, then common written formats
+
+    Args:
+        day_first: How to read ambiguous numeric dates like 03/04/2025
+            (defaults to settings.invoice_day_first)
+    """
+    if not value:
+        return None
+    text = " ".join(str(value).strip().split())
+
+    try:
+        return date.fromisoformat(text[:10])
+    except ValueError:
+        pass
+
+    match = NUMERIC_DATE.match(text)
+    if match:
+        first, second, year = (int(part) for part in match.groups())
+        if year < 100:
+            year += 2000
+        if day_first is None:
+            day_first = settings.invoice_day_first
+        if first > 12 or (day_first and second <= 12):
+            day, month = first, second
+        else:
+            month, day = first, second
+        try:
+            return date(year, month, day)
+        except ValueError:
+            return None
+
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def vendor_key(name: Optional[str], tax_id: Optional[str] = None) -> Optional[str]:
+    """
+    Grouping key for a vendor: the name without case, accents, punctuation
+    or legal form ("ACME Corp." and "Acme Corporation" -> "acme"), or the
+    tax ID when no name was extracted
+    """
+    if name:
+        text = unicodedata.normalize("NFKD", name)
+        text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+        words = [word for word in re.split(r"[^\w]+", text) if word]
+        while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+            words.pop()
+        if words:
+            return " ".join(words)
+    if tax_id:
+        compact = re.sub(r"[^0-9A-Za-z]", "", tax_id).upper()
+        if compact:
+            return f"tax:{compact}"
+    return None
+
+
+def normalize_invoice(invoice_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Typed invoice fields from extracted invoice_data
+
+    Returns:
+        Column values for the invoices table (unparseable fields are None)
+    """
+    invoice_data = invoice_data or {}
+    sender = invoice_data.get("sender") or {}
+    receiver = invoice_data.get("receiver") or {}
+
+    total_amount, amount_currency = parse_amount(invoice_data.get("total_amount"))
+    subtotal, _ = parse_amount(invoice_data.get("subtotal"))
+    tax_amount, _ = parse_amount(invoice_data.get("tax_amount"))
+
+    return {
+        "invoice_number": invoice_data.get("invoice_number"),
+        "vendor_name": sender.get("name"),
+        "vendor_key": vendor_key(sender.get("name"), sender.get("tax_id")),
+        "vendor_tax_id": sender.get("tax_id"),
+        "receiver_name": receiver.get("name"),
+        "currency": parse_currency(invoice_data.get("currency")) or amount_currency,
+        "total_amount": total_amount,
+        "subtotal": subtotal,
+        "tax_amount": tax_amount,
+        "invoice_date": parse_date(invoice_data.get("invoice_date")),
+        "due_date": parse_date(invoice_data.get("due_date")),
+    }
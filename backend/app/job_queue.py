@@ -0,0 +1,215 @@
+from datetime import timedelta
+from typing import List
+from sqlalchemy import select, update, or_, and_, func
+from app.config import get_settings
+from app.database import async_session
+from app.models import Document, DocumentStatus
+from app.events import notify_status
+
+settings = get_settings()
+
+
+class DocumentQueue:
+    """
+    Persistent processing queue backed by the documents table
+
+    A document in UPLOADED status is a pending job. Workers claim jobs with
+    SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers on any number
+    of nodes can poll the same table without handing out a job twice. A claim
+    is a lease: it expires unless the worker keeps heartbeating, after which
+    the job can be claimed again by another worker. Every claim counts as an
+    attempt, so a document that keeps killing its worker (and never reaches
+    fail()) is marked FAILED once the lease of its last attempt expires.
+    """
+    def __init__(self):
+        self.lease_seconds = settings.worker_lease_seconds
+        self.max_attempts = settings.worker_max_attempts
+        self.backoff_seconds = settings.worker_retry_backoff_seconds
+        self.backoff_max_seconds = settings.worker_retry_backoff_max_seconds
+
+    def _lease_expiry(self):
+        return func.now() + timedelta(seconds=self.lease_seconds)
+
+    async def claim(self, worker_id: str, limit: int = 1) -> List[str]:
+        """
+        Claim up to `limit` runnable documents for a worker
+
+        Returns:
+            List of claimed document IDs
+        """
+        now = func.now()
+        async with async_session() as db:
+            await self._fail_exhausted(db)
+
+            result = await db.execute(
+                select(Document.id, Document.user_id)
+                .where(
+                    or_(
+                        and_(
+                            Document.status == DocumentStatus.UPLOADED,
+                            Document.locked_until.is_(None),
+                            or_(
+                                Document.next_attempt_at.is_(None),
+                                Document.next_attempt_at <= now
+                            )
+                        ),
+                        # Lease expired: the worker holding it died or stalled mid-pipeline (a
+                        # document it already finished keeps its status, only the lease is stale)
+                        and_(
+                            Document.status == DocumentStatus.PROCESSING,
+                            Document.locked_until < now,
+                            Document.attempts < self.max_attempts
+                        )
+                    )
+                )
+                .order_by(Document.created_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            claimed = result.all()
+            document_ids = [document_id for document_id, _ in claimed]
+
+            if document_ids:
+                await db.execute(
+                    update(Document)
+                    .where(Document.id.in_(document_ids))
+                    .values(
+                        status=DocumentStatus.PROCESSING,
+                        locked_by=worker_id,
+                        locked_until=self._lease_expiry(),
+                        attempts=Document.attempts + 1,
+                        error_message=None
+                    )
+                )
+                await notify_status(db, [
+                    (document_id, user_id, DocumentStatus.PROCESSING) for document_id, user_id in claimed
+                ])
+            await db.commit()
+
+        return document_ids
+
+    async def _fail_exhausted(self, db):
+        """Mark documents whose last attempt's lease expired as FAILED (in the caller's transaction)"""
+        exhausted = (
+            select(Document.id)
+            .where(
+                Document.status == DocumentStatus.PROCESSING,
+                Document.locked_until < func.now(),
+                Document.attempts >= self.max_attempts
+            )
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            update(Document)
+            .where(Document.id.in_(exhausted))
+            .values(
+                status=DocumentStatus.FAILED,
+                locked_by=None,
+                locked_until=None,
+                next_attempt_at=None,
+                error_message=f"Processing did not finish after {self.max_attempts} attempts (worker lease expired)"
+            )
+            .returning(Document.id, Document.user_id)
+            .execution_options(synchronize_session=False)
+        )
+        failed = result.all()
+        if failed:
+            print(f"Marked {len(failed)} document(s) FAILED after their last lease expired")
+            await notify_status(db, [
+                (document_id, user_id, DocumentStatus.FAILED) for document_id, user_id in failed
+            ])
+
+    async def heartbeat(self, document_ids: List[str], worker_id: str) -> List[str]:
+        """
+        Extend the lease on documents still held by this worker
+
+        Returns:
+            IDs whose lease was extended (a missing ID means the lease was lost)
+        """
+        if not document_ids:
+            return []
+
+        async with async_session() as db:
+            result = await db.execute(
+                update(Document)
+                .where(
+                    Document.id.in_(document_ids),
+                    Document.locked_by == worker_id
+                )
+                .values(locked_until=self._lease_expiry())
+                .returning(Document.id)
+            )
+            extended = list(result.scalars().all())
+            await db.commit()
+
+        return extended
+
+    async def complete(self, document_id: str, worker_id: str):
+        """Release the lease after the pipeline finished"""
+        async with async_session() as db:
+            await db.execute(
+                update(Document)
+                .where(
+                    Document.id == document_id,
+                    Document.locked_by == worker_id
+                )
+                .values(locked_by=None, locked_until=None, next_attempt_at=None)
+            )
+            await db.commit()
+
+    async def fail(self, document_id: str, worker_id: str, error: str) -> bool:
+        """
+        Record a failed attempt and schedule a retry with exponential backoff
+
+        Returns:
+            True if the job will be retried, False if it was marked FAILED
+        """
+        async with async_session() as db:
+            result = await db.execute(
+                select(Document).where(
+                    Document.id == document_id,
+                    Document.locked_by == worker_id
+                )
+            )
+            document = result.scalar_one_or_none()
+
+            if not document:
+                # Lease was lost and the job belongs to another worker now
+                return False
+
+            document.locked_by = None
+            document.locked_until = None
+            document.error_message = error
+
+            if document.attempts < self.max_attempts:
+                delay = min(
+                    self.backoff_seconds * (2 ** (document.attempts - 1)),
+                    self.backoff_max_seconds
+                )
+                document.status = DocumentStatus.UPLOADED
+                document.next_attempt_at = func.now() + timedelta(seconds=delay)
+                retry = True
+            else:
+                document.status = DocumentStatus.FAILED
+                document.next_attempt_at = None
+                retry = False
+
+            await notify_status(db, [(document.id, document.user_id, document.status)])
+            await db.commit()
+
+        return retry
+
+    async def depth(self) -> int:
+        """Number of documents waiting to be processed"""
+        async with async_session() as db:
+            result = await db.execute(
+                select(func.count())
+                .select_from(Document)
+                .where(Document.status == DocumentStatus.UPLOADED)
+            )
+            return result.scalar_one()
+
+
+# Singleton instance
+document_queue = DocumentQueue()
@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Optional
+from sqlalchemy import update, delete, select, func
+from sqlalchemy.dialects.postgresql import insert
+from app.config import get_settings
+from app.database import async_session
+from app.models import LLMCacheEntry
+
+settings = get_settings()
+
+
+def normalize_text(text: str) -> str:
+    """Normalize input text so whitespace-only differences share a cache entry"""
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(text.split())
+
+
+class CacheBackend(ABC):
+    """Storage interface for cached LLM responses"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """Cached value, or None if missing or expired"""
+
+    @abstractmethod
+    async def set(self, key: str, namespace: str, value: Any):
+        """Store a value (replacing any existing entry)"""
+
+
+class PostgresCacheBackend(CacheBackend):
+    """
+    Cache stored in the llm_cache table, shared by all API replicas and workers
+
+    Reads refresh last_accessed_at in the same statement. Eviction of expired
+    and least recently used entries runs every `evict_every` writes.
+    """
+    def __init__(self, ttl_seconds: int, max_bytes: int, evict_every: int = 100):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self._writes = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        async with async_session() as db:
+            result = await db.execute(
+                update(LLMCacheEntry)
+                .where(
+                    LLMCacheEntry.key == key,
+                    (LLMCacheEntry.expires_at.is_(None)) | (LLMCacheEntry.expires_at > func.now())
+                )
+                .values(last_accessed_at=func.now())
+                .returning(LLMCacheEntry.value)
+            )
+            value = result.scalar_one_or_none()
+            await db.commit()
+            return value
+
+    async def set(self, key: str, namespace: str, value: Any):
+        size_bytes = len(json.dumps(value))
+        expires_at = func.now() + timedelta(seconds=self.ttl_seconds) if self.ttl_seconds else None
+
+        async with async_session() as db:
+            stmt = insert(LLMCacheEntry).values(
+                key=key,
+                namespace=namespace,
+                value=value,
+                size_bytes=size_bytes,
+                expires_at=expires_at
+            )
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[LLMCacheEntry.key],
+                    set_={
+                        "value": stmt.excluded.value,
+                        "size_bytes": stmt.excluded.size_bytes,
+                        "expires_at": stmt.excluded.expires_at,
+                        "last_accessed_at": func.now()
+                    }
+                )
+            )
+            await db.commit()
+
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            await self.evict()
+
+    async def evict(self):
+        """Drop expired entries, then least recently used ones beyond max_bytes"""
+        async with async_session() as db:
+            await db.execute(
+                delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= func.now())
+            )
+
+            running_total = (
+                select(
+                    LLMCacheEntry.key,
+                    func.sum(LLMCacheEntry.size_bytes).over(
+                        order_by=LLMCacheEntry.last_accessed_at.desc()
+                    ).label("running_bytes")
+                )
+                .subquery()
+            )
+            await db.execute(
+                delete(LLMCacheEntry).where(
+                    LLMCacheEntry.key.in_(
+                        select(running_total.c.key).where(running_total.c.running_bytes > self.max_bytes)
+                    )
+                )
+            )
+            await db.commit()
+
+
+class LocalCacheBackend(CacheBackend):
+    """
+    On-disk cache for single-node setups: one JSON file per entry
+
+    An in-memory index (rebuilt from the directory on first use) keeps LRU
+    order and total size; file mtimes record last access across restarts.
+    """
+    def __init__(self, directory: str, ttl_seconds: int, max_bytes: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # key -> size in bytes
+        self._total_bytes = 0
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+        self._loaded = True
+
+    def _remove(self, key: str):
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _read(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if entry.get("expires_at") and entry["expires_at"] <= time.time():
+            self._remove(key)
+            return None
+
+        os.utime(path)
+        if key not in self._index:
+            # Written by another process sharing the directory
+            self._index[key] = os.path.getsize(path)
+            self._total_bytes += self._index[key]
+        self._index.move_to_end(key)
+        return entry["value"]
+
+    def _write(self, key: str, namespace: str, value: Any):
+        entry = {
+            "namespace": namespace,
+            "expires_at": time.time() + self.ttl_seconds if self.ttl_seconds else None,
+            "value": value
+        }
+        data = json.dumps(entry)
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+
+        if key in self._index:
+            self._total_bytes -= self._index[key]
+        self._index[key] = len(data)
+        self._index.move_to_end(key)
+        self._total_bytes += len(data)
+
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            oldest = next(iter(self._index))
+            self._remove(oldest)
+
+    async def get(self, key: str) -> Optional[Any]:
+        async with self._lock:
+            if not self._loaded:
+                await asyncio.to_thread(self._load_index)
+            return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, namespace: str, value: Any):
+        async with self._lock:
+            if not self._loaded:
+                await asyncio.to_thread(self._load_index)
+            await asyncio.to_thread(self._write, key, namespace, value)
+
+
+class LLMCache:
+    """
+    Response cache for deterministic LLM calls
+
+    Keys are a SHA-256 of the model, system prompt, response schema, request
+    parameters and normalized user input. Cache errors never fail the LLM call;
+    they are counted and treated as misses.
+    """
+    def __init__(self, backend: Optional[CacheBackend]):
+        self.backend = backend
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, user_prompt: str,
+                 schema: Optional[Dict[str, Any]] = None, **params) -> str:
+        payload = json.dumps({
+            "model": model,
+            "system": system_prompt,
+            "schema": schema,
+            "params": params,
+            "input": normalize_text(user_prompt)
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, namespace: str, counter: str):
+        counters = self.counters.setdefault(namespace, {"hits": 0, "misses": 0, "errors": 0})
+        counters[counter] += 1
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            print(f"LLM cache read failed: {str(e)}")
+            self._count(namespace, "errors")
+            return None
+        self._count(namespace, "hits" if value is not None else "misses")
+        return value
+
+    async def set(self, namespace: str, key: str, value: Any):
+        if not self.enabled:
+            return
+        try:
+            await self.backend.set(key, namespace, value)
+        except Exception as e:
+            print(f"LLM cache write failed: {str(e)}")
+            self._count(namespace, "errors")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": settings.llm_cache_backend,
+            "namespaces": self.counters
+        }
+
+
+def create_backend() -> Optional[CacheBackend]:
+    if settings.llm_cache_backend == "postgres":
+        return PostgresCacheBackend(settings.llm_cache_ttl_seconds, settings.llm_cache_max_bytes)
+    if settings.llm_cache_backend == "local":
+        return LocalCacheBackend(settings.llm_cache_dir, settings.llm_cache_ttl_seconds, settings.llm_cache_max_bytes)
+    return None
+
+
+# Singleton instance
+llm_cache = LLMCache(create_backend())
@@ -1,25 +1,60 @@
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.orm import load_only
+from contextlib import asynccontextmanager
+from datetime import date
+import asyncio
+import json
+import time
+from typing import List, Optional
 import uuid
-from datetime import datetime
 
 from app.database import get_db, init_db
-from app.models import Document, DocumentStatus
-from app.auth import get_current_user
-from app.storage import storage
-from app.ocr_service import ocr_service
-from app.invoice_extractor import invoice_extractor
+from app.models import Document, DocumentStatus, UploadBatch
+from app.auth import get_current_user, jwks_cache
+from app.storage import storage, async_storage, presign_window
+from app.dedup import find_processed_duplicate, copy_processing_results, lock_objects, missing_objects, release_object
+from app.pagination import encode_cursor, decode_cursor
+from app.ocr_store import copy_ocr_pages, load_ocr_pages
+from app.search import build_search_query
+from app.invoices import copy_invoice, spend_report, overdue_report
+from app.uploads import ALLOWED_CONTENT_TYPES, BulkUploader, create_batch, discard_stored, batch_progress
+from app.traces import document_traces, latency_report
+from app.export import EXPORT_FORMATS, build_export_query, export_stream, export_headers, parquet_available
+from app.events import event_broker, notify_status
+from app.http_cache import (
+    FILE_URL_EXPIRES, FINAL_STATUSES, make_etag, file_url_epoch, etag_matches, cache_headers, not_modified
+)
+from app.http_clients import http_clients
+from app.llm_cache import llm_cache
+from app.metrics import timed, update_queue_depth, render, CONTENT_TYPE_LATEST
 from app.config import get_settings
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize database, shared HTTP clients, the event listener and JWKS refresh on startup; close them (and the storage threads) on shutdown"""
+    await init_db()
+    http_clients.start()
+    event_broker.start()
+    jwks_cache.start()
+    yield
+    await jwks_cache.stop()
+    await event_broker.stop()
+    await http_clients.aclose()
+    async_storage.shutdown()
+
+
 app = FastAPI(
     title="Compass Document Processing API",
     description="Document processing with OCR and classification",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -29,15 +64,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database on startup"""
-    await init_db()
-
-
 @app.get("/")
 async def root():
     return {
@@ -52,75 +82,39 @@ async def health_check():
     return {"status": "healthy"}
 
 
-async def process_document_task(document_id: str, file_content: bytes, file_type: str, filename: str):
-    """Background task to process document with OCR and summarization"""
-    from app.database import async_session
+@app.get("/health/http-clients")
+async def http_client_stats():
+    """Connection pool usage of the shared upstream HTTP clients"""
+    return http_clients.stats()
 
-    async with async_session() as db:
-        try:
-            # Update status to processing
-            result = await db.execute(
-                select(Document).where(Document.id == document_id)
-            )
-            document = result.scalar_one_or_none()
 
-            if not document:
-                print(f"Error: Document {document_id} not found")
-                return
+@app.get("/health/storage")
+async def storage_stats():
+    """Presigned URL cache usage"""
+    return {"url_cache": storage.url_cache.stats()}
 
-            document.status = DocumentStatus.PROCESSING
-            await db.commit()
 
-            # Step 1: OCR Processing
-            ocr_result = await ocr_service.process_document(file_content, file_type, filename)
-
-            if not ocr_result.get("success"):
-                print(f"OCR failed for '{filename}': {ocr_result.get('error')}")
-                document.status = DocumentStatus.FAILED
-                document.error_message = ocr_result.get("error", "OCR processing failed")
-                await db.commit()
-                return
-
-            # Update with OCR results
-            total_elements = ocr_result.get("total_elements", 0)
-            document.ocr_text = ocr_result.get("text", "")
-            document.ocr_metadata = {
-                "pages": ocr_result.get("pages", []),
-                "total_pages": ocr_result.get("total_pages", 0),
-                "elements": ocr_result.get("elements", []),
-                "total_elements": total_elements
-            }
-            document.ocr_completed_at = datetime.utcnow()
-            document.status = DocumentStatus.OCR_COMPLETE
-            await db.commit()
+@app.get("/health/llm-cache")
+async def llm_cache_stats():
+    """LLM response cache hit/miss counters for this process"""
+    return llm_cache.stats()
 
-            # Step 2: Extract Invoice Data
-            if document.ocr_text:
-                extraction_result = await invoice_extractor.extract_invoice_data(document.ocr_text)
 
-                if extraction_result.get("success"):
-                    document.invoice_data = extraction_result.get("invoice_data", {})
-                    document.invoice_extracted_at = datetime.utcnow()
-                    document.status = DocumentStatus.COMPLETED
-                else:
-                    print(f"Invoice extraction failed for '{filename}': {extraction_result.get('error')}")
-                    document.error_message = extraction_result.get("error", "Invoice extraction failed")
-                    document.status = DocumentStatus.OCR_COMPLETE  # Keep OCR results even if extraction fails
+@app.get("/health/events")
+async def event_stream_stats():
+    """Document event listener connection and open streams in this process"""
+    return event_broker.stats()
 
-            await db.commit()
 
-        except Exception as e:
-            print(f"Error processing document {document_id}: {str(e)}")
-            if 'document' in locals() and document:
-                document.status = DocumentStatus.FAILED
-                document.error_message = str(e)
-                await db.commit()
-            raise
+@app.get("/metrics")
+async def metrics(db: AsyncSession = Depends(get_db)):
+    """Prometheus metrics of this API process (workers serve their own on WORKER_METRICS_PORT)"""
+    await update_queue_depth(db)
+    return Response(render(), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.post("/api/documents/upload")
 async def upload_document(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: str = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
@@ -128,80 +122,275 @@ async def upload_document(
     """
     Upload a document for processing
 
+    The stored document is picked up by a processing worker (app.worker).
     Accepts: PDF, PNG, JPG, JPEG, TIFF, BMP
     """
     # Validate file type
-    allowed_types = [
-        "application/pdf",
-        "image/png",
-        "image/jpeg",
-        "image/jpg",
-        "image/tiff",
-        "image/bmp"
-    ]
-
-    if file.content_type not in allowed_types:
+    if file.content_type not in ALLOWED_CONTENT_TYPES:
         raise HTTPException(
             status_code=400,
             detail=f"Unsupported file type: {file.content_type}. Allowed types: PDF, PNG, JPG, TIFF, BMP"
         )
 
+    with timed("upload"):
+        try:
+            # Stream the upload spool to MinIO (the worker reads the file back from there)
+            object_key, file_size, content_hash, reused = await async_storage.store_upload(
+                file=file.file,
+                filename=file.filename,
+                content_type=file.content_type
+            )
+
+            # Create database record
+            document_id = str(uuid.uuid4())
+            document = Document(
+                id=document_id,
+                user_id=current_user,
+                filename=object_key,
+                original_filename=file.filename,
+                file_type=file.content_type,
+                file_size=file_size,
+                content_hash=content_hash,
+                s3_key=object_key,
+                s3_bucket=settings.minio_bucket,
+                status=DocumentStatus.UPLOADED
+            )
+
+            # An identical upload's object may have been deleted with its last document
+            # since store_upload found it; keep it locked until this document is committed
+            await lock_objects(db, [object_key])
+            if reused and await missing_objects(db, [object_key]):
+                file.file.seek(0)
+                await async_storage.upload_file(file.file, file.filename, file.content_type, object_key=object_key)
+
+            # Identical file already processed: reuse its results instead of queueing it
+            duplicate = await find_processed_duplicate(db, content_hash, current_user)
+            db.add(document)
+            if duplicate:
+                copy_processing_results(duplicate, document)
+                await db.flush()
+                await copy_ocr_pages(db, duplicate.id, document.id)
+                await copy_invoice(db, duplicate.id, document.id, current_user)
+
+            await notify_status(db, [(document.id, current_user, document.status)])
+            await db.commit()
+            await db.refresh(document)
+
+            return {
+                "message": "Document uploaded successfully",
+                "document": document.to_dict()
+            }
+
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/documents/bulk-upload")
+async def bulk_upload_documents(
+    files: List[UploadFile] = File(...),
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Upload many documents at once, as separate files and/or ZIP archives
+
+    Files are streamed to storage concurrently and their documents created
+    with one batched insert. Unsupported, oversized or failed files are
+    listed in `rejected`; the others are queued for processing. Track
+    progress with GET /api/batches/{batch_id}.
+    """
+    uploader = BulkUploader()
     try:
-        # Read file content
-        file_content = await file.read()
-
-        # Upload to MinIO
-        object_key, file_size = storage.upload_file(
-            file=file.file,
-            filename=file.filename,
-            content_type=file.content_type
-        )
+        with timed("bulk_upload"):
+            stored = await uploader.store_all(files)
 
-        # Create database record
-        document_id = str(uuid.uuid4())
-        document = Document(
-            id=document_id,
-            user_id=current_user,
-            filename=object_key,
-            original_filename=file.filename,
-            file_type=file.content_type,
-            file_size=file_size,
-            s3_key=object_key,
-            s3_bucket=settings.minio_bucket,
-            status=DocumentStatus.UPLOADED
-        )
+        if not stored:
+            raise HTTPException(
+                status_code=400,
+                detail={"message": "No supported files in upload", "rejected": uploader.rejected}
+            )
 
-        db.add(document)
+        batch, documents = await create_batch(db, current_user, stored, uploader.rejected)
         await db.commit()
-        await db.refresh(document)
-
-        # Start background processing
-        await file.seek(0)
-        file_content = await file.read()
-        background_tasks.add_task(
-            process_document_task,
-            document_id,
-            file_content,
-            file.content_type,
-            file.filename
+    except Exception:
+        # Nothing references the files stored so far; remove them
+        await db.rollback()
+        await discard_stored(db, uploader.stored)
+        raise
+
+    return {
+        "message": f"{len(documents)} documents uploaded",
+        "batch_id": batch.id,
+        "accepted": len(documents),
+        "rejected": uploader.rejected,
+        "documents": documents
+    }
+
+
+@app.get("/api/batches/{batch_id}")
+async def get_batch(
+    batch_id: str,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Aggregate processing progress of a bulk upload"""
+    result = await db.execute(
+        select(UploadBatch).where(
+            UploadBatch.id == batch_id,
+            UploadBatch.user_id == current_user
         )
+    )
+    batch = result.scalar_one_or_none()
 
-        return {
-            "message": "Document uploaded successfully",
-            "document": document.to_dict()
-        }
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await batch_progress(db, batch)
+
+
+@app.get("/api/documents/events")
+async def document_events(current_user: str = Depends(get_current_user)):
+    """
+    Server-sent event stream of the current user's document status changes
+
+    Events:
+        document: {"id", "status"} when a document changes status ("deleted" when removed)
+        resync: updates may have been missed; refetch the document list
+
+    A comment line is sent every `events_keepalive_seconds` to keep proxies
+    from closing the connection.
+    """
+    queue = event_broker.subscribe(current_user)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.events_keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                event_type = event.pop("type")
+                yield f"event: {event_type}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            event_broker.unsubscribe(current_user, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/documents/search")
+async def search_documents(
+    q: Optional[str] = None,
+    status: Optional[DocumentStatus] = None,
+    invoice_number: Optional[str] = None,
+    sender: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Search the current user's documents
+
+    `q` is matched against OCR text and extracted invoice fields (web-search
+    syntax: "quoted phrase", or, -exclude); results are ranked with invoice
+    number and party names weighted highest. Filters: `status`, exact
+    `invoice_number` / `sender` name, and `date_from` / `date_to` on the
+    parsed invoice date.
+    """
+    query = (
+        build_search_query(
+            current_user,
+            q=q,
+            status=status,
+            invoice_number=invoice_number,
+            sender=sender,
+            date_from=date_from,
+            date_to=date_to
+        )
+        .options(load_only(*(getattr(Document, column) for column in Document.SUMMARY_COLUMNS)))
+        .limit(limit)
+        .offset(offset)
+    )
+    result = await db.execute(query)
+
+    return {
+        "results": [
+            {**document.to_summary_dict(), "rank": float(rank)}
+            for document, rank in result.all()
+        ],
+        "limit": limit,
+        "offset": offset
+    }
+
+
+@app.get("/api/documents/export")
+async def export_documents(
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson|parquet)$"),
+    status: Optional[DocumentStatus] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Stream the current user's documents with their invoice fields as CSV, NDJSON or Parquet
+
+    Rows are read with a server-side cursor, so the export never holds the
+    full result set. Filters: `status` and `date_from` / `date_to` on the
+    invoice date.
+    """
+    if export_format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    query = build_export_query(current_user, status, date_from, date_to)
+    media_type, _ = EXPORT_FORMATS[export_format]
+
+    return StreamingResponse(
+        export_stream(export_format, query),
+        media_type=media_type,
+        headers=export_headers(export_format)
+    )
 
 
 @app.get("/api/documents/{document_id}")
 async def get_document(
     document_id: str,
+    if_none_match: Optional[str] = Header(None),
     current_user: str = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get document by ID"""
+    """
+    Get document by ID
+
+    Supports conditional requests: the ETag changes with the document's status
+    and updated_at (and when the embedded file URL is renewed), and a matching
+    If-None-Match returns 304 without loading the OCR columns.
+    """
+    result = await db.execute(
+        select(Document.status, Document.updated_at, Document.created_at).where(
+            Document.id == document_id,
+            Document.user_id == current_user
+        )
+    )
+    version = result.one_or_none()
+
+    if not version:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    status, updated_at, created_at = version
+    etag = make_etag(document_id, status.value, updated_at or created_at, file_url_epoch())
+    cache_control = "private, max-age=60" if status.value in FINAL_STATUSES else "private, no-cache"
+
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, cache_control)
+
     result = await db.execute(
         select(Document).where(
             Document.id == document_id,
@@ -214,35 +403,87 @@ async def get_document(
         raise HTTPException(status_code=404, detail="Document not found")
 
     # Generate presigned URL for file access
-    file_url = storage.get_file_url(document.s3_key)
+    file_url = await async_storage.get_file_url(document.s3_key, expires=FILE_URL_EXPIRES)
 
     response = document.to_dict()
     response["file_url"] = file_url
 
-    return response
+    return JSONResponse(content=response, headers=cache_headers(etag, cache_control))
 
 
 @app.get("/api/documents")
 async def list_documents(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
     skip: int = 0,
-    limit: int = 50,
+    include_urls: bool = False,
+    if_none_match: Optional[str] = Header(None),
     current_user: str = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """List all documents for current user"""
-    result = await db.execute(
+    """
+    List documents for current user, newest first
+
+    Returns summaries without OCR text and elements (fetch a single document
+    for those). Pass `next_cursor` from a response as `cursor` to get the
+    next page; `skip` is only honoured without a cursor. With `include_urls`
+    every summary carries a presigned `file_url`.
+
+    The ETag is a version of the user's whole document set (count and latest
+    change) plus the page parameters; a matching If-None-Match returns 304
+    after a single aggregate query.
+    """
+    total, last_updated, last_created = (await db.execute(
+        select(func.count(), func.max(Document.updated_at), func.max(Document.created_at))
+        .where(Document.user_id == current_user)
+    )).one()
+    etag = make_etag(
+        current_user, total, last_updated, last_created, limit, cursor, skip,
+        file_url_epoch() if include_urls else None
+    )
+
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    query = (
         select(Document)
+        .options(load_only(*(getattr(Document, column) for column in Document.SUMMARY_COLUMNS)))
         .where(Document.user_id == current_user)
-        .order_by(Document.created_at.desc())
-        .offset(skip)
-        .limit(limit)
+        .order_by(Document.created_at.desc(), Document.id.desc())
+        .limit(limit + 1)
     )
+
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(tuple_(Document.created_at, Document.id) < tuple_(cursor_created_at, cursor_id))
+    elif skip:
+        query = query.offset(skip)
+
+    result = await db.execute(query)
     documents = result.scalars().all()
 
-    return {
-        "documents": [doc.to_dict() for doc in documents],
-        "total": len(documents)
-    }
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+    next_cursor = encode_cursor(documents[-1].created_at, documents[-1].id) if has_more else None
+
+    summaries = [doc.to_summary_dict() for doc in documents]
+    if include_urls:
+        urls = await async_storage.get_file_urls((doc.s3_key for doc in documents), expires=FILE_URL_EXPIRES)
+        for summary, doc in zip(summaries, documents):
+            summary["file_url"] = urls[doc.s3_key]
+
+    return JSONResponse(
+        content={
+            "documents": summaries,
+            "total": total,
+            "next_cursor": next_cursor,
+            "has_more": has_more
+        },
+        headers=cache_headers(etag)
+    )
 
 
 @app.delete("/api/documents/{document_id}")
@@ -263,16 +504,44 @@ async def delete_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    # Delete from storage
-    storage.delete_file(document.s3_key)
-
-    # Delete from database
+    # Delete from database, and from storage unless another (deduplicated) document shares the object
     await db.delete(document)
+    await db.flush()
+    await release_object(db, document.s3_key)
+    await notify_status(db, [(document.id, current_user, "deleted")])
     await db.commit()
 
     return {"message": "Document deleted successfully"}
 
 
+@app.get("/api/documents/{document_id}/ocr-elements")
+async def get_ocr_elements(
+    document_id: str,
+    page: Optional[int] = Query(None, ge=1),
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """OCR elements (text, bounding box, confidence) of a document, per page or for one `page`"""
+    result = await db.execute(
+        select(Document).where(
+            Document.id == document_id,
+            Document.user_id == current_user
+        )
+    )
+    document = result.scalar_one_or_none()
+
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    pages = await load_ocr_pages(db, document, page)
+
+    return {
+        "document_id": document.id,
+        "pages": pages,
+        "total_elements": sum(len(p["elements"]) for p in pages)
+    }
+
+
 @app.get("/api/documents/{document_id}/download")
 async def download_document(
     document_id: str,
@@ -291,16 +560,87 @@ async def download_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    # Generate presigned URL (valid for 1 hour)
-    download_url = storage.get_file_url(document.s3_key, expires=3600)
+    # Presigned URL valid for up to 1 hour (reused within its signing window)
+    download_url = await async_storage.get_file_url(document.s3_key, expires=FILE_URL_EXPIRES)
+    _, signed_at = presign_window(FILE_URL_EXPIRES)
 
     return {
         "download_url": download_url,
         "filename": document.original_filename,
-        "expires_in": 3600
+        "expires_in": signed_at + FILE_URL_EXPIRES - int(time.time())
+    }
+
+
+@app.get("/api/documents/{document_id}/traces")
+async def get_document_traces(
+    document_id: str,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stage timings of every processing attempt of a document, oldest first"""
+    result = await db.execute(
+        select(Document.id).where(
+            Document.id == document_id,
+            Document.user_id == current_user
+        )
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    return {
+        "document_id": document_id,
+        "traces": await document_traces(db, document_id, current_user)
+    }
+
+
+@app.get("/api/traces/latency")
+async def get_processing_latency(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    include_errors: bool = False,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """p50/p95 processing, OCR and LLM times per file type and page count"""
+    rows = await latency_report(db, current_user, date_from, date_to, include_errors)
+
+    return {
+        "date_from": date_from.isoformat() if date_from else None,
+        "date_to": date_to.isoformat() if date_to else None,
+        "rows": rows
+    }
+
+
+@app.get("/api/invoices/spend")
+async def get_invoice_spend(
+    group_by: str = Query("vendor_month", pattern="^(vendor|month|vendor_month)$"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    currency: Optional[str] = Query(None, min_length=3, max_length=3),
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Invoice spend per vendor and/or month (per currency) over an optional invoice date range"""
+    rows = await spend_report(db, current_user, group_by, date_from, date_to, currency)
+
+    return {
+        "group_by": group_by,
+        "date_from": date_from.isoformat() if date_from else None,
+        "date_to": date_to.isoformat() if date_to else None,
+        "rows": rows
     }
 
 
+@app.get("/api/invoices/overdue")
+async def get_overdue_invoices(
+    as_of: Optional[date] = None,
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Totals of invoices past their due date (as of today unless `as_of` is given), per currency"""
+    return await overdue_report(db, current_user, as_of)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,130 @@
+"""
+Prometheus metrics for the API and the processing workers
+
+The API serves them at /metrics; each worker process serves its own on
+WORKER_METRICS_PORT (scrape both).
+"""
+import time
+from contextlib import contextmanager
+from typing import Optional
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.models import Document, DocumentStatus
+
+settings = get_settings()
+
+# Pipeline stages run from well under a second (DB commits) to minutes (OCR of long PDFs)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "compass_stage_duration_seconds",
+    "Duration of pipeline stages",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+STAGE_IN_FLIGHT = Gauge(
+    "compass_stage_in_flight",
+    "Pipeline stage executions currently running",
+    ["stage"]
+)
+UPSTREAM_REQUESTS = Counter(
+    "compass_upstream_requests_total",
+    "Requests to upstream services by outcome (success, error, timeout)",
+    ["upstream", "outcome"]
+)
+LLM_TOKENS = Counter(
+    "compass_llm_tokens_total",
+    "OpenAI tokens used, from the usage field of responses",
+    ["model", "kind"]
+)
+LLM_CACHE_HITS = Counter(
+    "compass_llm_cache_hits_total",
+    "LLM calls answered from the response cache",
+    ["namespace"]
+)
+DOCUMENTS_PROCESSED = Counter(
+    "compass_documents_processed_total",
+    "Documents leaving the pipeline by final status (completed, ocr_complete, failed, duplicate)",
+    ["outcome"]
+)
+QUEUE_DEPTH = Gauge(
+    "compass_documents",
+    "Documents per status (uploaded = waiting in the queue)",
+    ["status"]
+)
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the duration of a stage and count it as in flight while it runs"""
+    in_flight = STAGE_IN_FLIGHT.labels(stage)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+        in_flight.dec()
+
+
+def record_upstream(upstream: str, outcome: str):
+    UPSTREAM_REQUESTS.labels(upstream, outcome).inc()
+
+
+def record_llm_usage(model: str, usage: Optional[dict]):
+    """Count prompt and completion tokens reported by an OpenAI response"""
+    if not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            LLM_TOKENS.labels(model, kind.removesuffix("_tokens")).inc(usage[kind])
+
+
+# Documents still in the pipeline: few rows, counted through ix_documents_queue
+ACTIVE_STATUSES = (DocumentStatus.UPLOADED, DocumentStatus.PROCESSING)
+
+
+class DocumentCounts:
+    """
+    Keeps the per-status document gauge current at scrape time
+
+    Active statuses are counted on every scrape, at a cost that follows the
+    backlog. Finished documents grow with the table, so they are recounted
+    at most every `metrics_finished_counts_seconds`.
+    """
+    def __init__(self):
+        self.finished_seconds = settings.metrics_finished_counts_seconds
+        self.finished_at: Optional[float] = None
+
+    async def _count(self, db: AsyncSession, statuses):
+        result = await db.execute(
+            select(Document.status, func.count())
+            .where(Document.status.in_(statuses))
+            .group_by(Document.status)
+        )
+        counts = {status: count for status, count in result.all()}
+        for status in statuses:
+            QUEUE_DEPTH.labels(status.value).set(counts.get(status, 0))
+
+    async def update(self, db: AsyncSession):
+        await self._count(db, ACTIVE_STATUSES)
+
+        now = time.monotonic()
+        if self.finished_at is None or now - self.finished_at >= self.finished_seconds:
+            await self._count(db, [status for status in DocumentStatus if status not in ACTIVE_STATUSES])
+            self.finished_at = now
+
+
+async def update_queue_depth(db: AsyncSession):
+    """Refresh the per-status document gauge (run at scrape time)"""
+    await document_counts.update(db)
+
+
+def render() -> bytes:
+    return generate_latest()
+
+
+# Singleton instance
+document_counts = DocumentCounts()
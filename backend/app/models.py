@@ -1,4 +1,6 @@
-from sqlalchemy import Column, String, DateTime, Integer, Text, JSON, Enum as SQLEnum
+from sqlalchemy import Column, String, DateTime, Date, Integer, Float, Numeric, Text, JSON, Index, ForeignKey, cast, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from datetime import datetime
 from enum import Enum
@@ -22,30 +24,68 @@ class Document(Base):
     original_filename = Column(String, nullable=False)
     file_type = Column(String, nullable=False)
     file_size = Column(Integer, nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of file contents
 
     # Storage
-    s3_key = Column(String, nullable=False)
+    s3_key = Column(String, nullable=False, index=True)
     s3_bucket = Column(String, nullable=False)
 
     # Processing status
     status = Column(SQLEnum(DocumentStatus), default=DocumentStatus.UPLOADED)
 
-    # OCR results
+    # OCR results (elements with bounding boxes live in document_ocr_pages)
     ocr_text = Column(Text, nullable=True)
-    ocr_metadata = Column(JSON, nullable=True)
+    ocr_metadata = Column(JSON, nullable=True)  # Summary: page/element counts
     ocr_completed_at = Column(DateTime(timezone=True), nullable=True)
 
     # Invoice data extracted by LLM (structured JSON)
     invoice_data = Column(JSON, nullable=True)
     invoice_extracted_at = Column(DateTime(timezone=True), nullable=True)
 
+    # Full-text search over OCR text and invoice fields (maintained by app.search)
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
+
+    # Document whose processing results were reused for this identical upload
+    duplicate_of = Column(String, nullable=True)
+
+    # Bulk upload this document arrived in (see app.uploads)
+    batch_id = Column(String, ForeignKey("upload_batches.id", ondelete="SET NULL"), nullable=True, index=True)
+
     # Error handling
     error_message = Column(Text, nullable=True)
 
+    # Processing queue (rows in UPLOADED status are pending jobs)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_documents_queue", "status", "next_attempt_at", "created_at"),
+        Index("ix_documents_locked_until", "locked_until"),
+        # Keyset pagination of a user's documents, newest first
+        Index("ix_documents_user_created", "user_id", "created_at", "id"),
+        Index("ix_documents_search_vector", "search_vector", postgresql_using="gin"),
+        # Containment filters (invoice number, sender) in app.search
+        Index(
+            "ix_documents_invoice_data",
+            cast(invoice_data, JSONB).label("invoice_data_jsonb"),
+            postgresql_using="gin",
+            postgresql_ops={"invoice_data_jsonb": "jsonb_path_ops"}
+        ),
+    )
+
+    # Columns needed by the list view (everything except the heavy OCR fields)
+    SUMMARY_COLUMNS = (
+        "id", "user_id", "filename", "original_filename", "file_type", "file_size",
+        "status", "invoice_data", "created_at", "updated_at", "ocr_completed_at",
+        "invoice_extracted_at", "error_message", "duplicate_of", "attempts", "batch_id", "s3_key"
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -54,6 +94,7 @@ class Document(Base):
             "original_filename": self.original_filename,
             "file_type": self.file_type,
             "file_size": self.file_size,
+            "content_hash": self.content_hash,
             "status": self.status.value,
             "ocr_text": self.ocr_text,
             "ocr_metadata": self.ocr_metadata,
@@ -62,5 +103,150 @@ class Document(Base):
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
             "ocr_completed_at": self.ocr_completed_at.isoformat() if self.ocr_completed_at else None,
             "invoice_extracted_at": self.invoice_extracted_at.isoformat() if self.invoice_extracted_at else None,
-            "error_message": self.error_message
+            "error_message": self.error_message,
+            "duplicate_of": self.duplicate_of,
+            "batch_id": self.batch_id,
+            "attempts": self.attempts
+        }
+
+    def to_summary_dict(self):
+        """List view representation; only reads SUMMARY_COLUMNS (OCR text and elements are left out)"""
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "filename": self.filename,
+            "original_filename": self.original_filename,
+            "file_type": self.file_type,
+            "file_size": self.file_size,
+            "status": self.status.value,
+            "has_ocr_text": self.ocr_completed_at is not None,
+            "invoice_data": self.invoice_data,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "ocr_completed_at": self.ocr_completed_at.isoformat() if self.ocr_completed_at else None,
+            "invoice_extracted_at": self.invoice_extracted_at.isoformat() if self.invoice_extracted_at else None,
+            "error_message": self.error_message,
+            "duplicate_of": self.duplicate_of,
+            "batch_id": self.batch_id,
+            "attempts": self.attempts
+        }
+
+
+class UploadBatch(Base):
+    """Files uploaded together with the bulk upload endpoint; progress is counted from their documents"""
+    __tablename__ = "upload_batches"
+
+    id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False, index=True)
+    document_count = Column(Integer, nullable=False)
+    rejected = Column(JSON, nullable=True)  # [{"filename", "error"}] for files that were not accepted
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class DocumentOCRPage(Base):
+    """OCR elements (text, bounding box, confidence) of one document page, loaded on demand"""
+    __tablename__ = "document_ocr_pages"
+
+    document_id = Column(String, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    page_number = Column(Integer, primary_key=True)  # 1-based
+    elements = Column(JSON, nullable=False)
+    element_count = Column(Integer, nullable=False)
+
+
+class Invoice(Base):
+    """Typed invoice fields parsed from a document's invoice_data (see app.invoices)"""
+    __tablename__ = "invoices"
+
+    document_id = Column(String, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(String, nullable=False)
+
+    invoice_number = Column(String, nullable=True)
+    vendor_name = Column(String, nullable=True)
+    vendor_key = Column(String, nullable=True)  # Normalized vendor name (or tax ID) used for grouping
+    vendor_tax_id = Column(String, nullable=True)
+    receiver_name = Column(String, nullable=True)
+
+    currency = Column(String(3), nullable=True)  # ISO 4217
+    total_amount = Column(Numeric, nullable=True)
+    subtotal = Column(Numeric, nullable=True)
+    tax_amount = Column(Numeric, nullable=True)
+
+    invoice_date = Column(Date, nullable=True)
+    due_date = Column(Date, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # Spend per month and per vendor over a date range
+        Index("ix_invoices_user_date", "user_id", "invoice_date"),
+        Index("ix_invoices_user_vendor_date", "user_id", "vendor_key", "invoice_date"),
+        Index("ix_invoices_user_due", "user_id", "due_date"),
+    )
+
+
+class LLMCacheEntry(Base):
+    """Cached LLM response (see app.llm_cache)"""
+    __tablename__ = "llm_cache"
+
+    key = Column(String(64), primary_key=True)  # SHA-256 of model, prompts, schema and params
+    namespace = Column(String, nullable=False)
+    value = Column(JSON, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    last_accessed_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class ProcessingTrace(Base):
+    """Stage timings of one processing attempt of a document (see app.traces)"""
+    __tablename__ = "processing_traces"
+
+    id = Column(String, primary_key=True)
+    document_id = Column(String, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(String, nullable=False)
+    attempt = Column(Integer, nullable=False)  # Document.attempts when the run started (1 = first try)
+    worker_id = Column(String, nullable=True)
+
+    file_type = Column(String, nullable=False)
+    file_size = Column(Integer, nullable=False)
+    page_count = Column(Integer, nullable=True)
+    outcome = Column(String, nullable=False)  # Final status, "duplicate" or "error"
+    error = Column(Text, nullable=True)
+
+    duration_seconds = Column(Float, nullable=False)
+    ocr_seconds = Column(Float, nullable=True)  # OCR request as seen by the worker
+    ocr_service_seconds = Column(Float, nullable=True)  # processing_time reported by the OCR service
+    llm_seconds = Column(Float, nullable=True)
+    llm_model = Column(String, nullable=True)
+    llm_prompt_tokens = Column(Integer, nullable=True)
+    llm_completion_tokens = Column(Integer, nullable=True)
+    stages = Column(JSON, nullable=False)  # [{"stage", "start", "duration", ...}], offsets in seconds
+
+    started_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_processing_traces_document", "document_id", "started_at"),
+        Index("ix_processing_traces_user_started", "user_id", "started_at"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "attempt": self.attempt,
+            "worker_id": self.worker_id,
+            "outcome": self.outcome,
+            "error": self.error,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "duration_seconds": self.duration_seconds,
+            "file_type": self.file_type,
+            "file_size": self.file_size,
+            "page_count": self.page_count,
+            "ocr_seconds": self.ocr_seconds,
+            "ocr_service_seconds": self.ocr_service_seconds,
+            "llm_seconds": self.llm_seconds,
+            "llm_model": self.llm_model,
+            "llm_prompt_tokens": self.llm_prompt_tokens,
+            "llm_completion_tokens": self.llm_completion_tokens,
+            "stages": self.stages
         }
@@ -1,7 +1,10 @@
+import json
+import time
 import httpx
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union, BinaryIO, List, Tuple, AsyncIterator
 from app.config import get_settings
-from io import BytesIO
+from app.http_clients import http_clients
+from app.metrics import STAGE_SECONDS, timed, record_upstream
 
 settings = get_settings()
 
@@ -14,12 +17,12 @@ class OCRService:
         self.base_url = settings.paddleocr_vl_url
         self.timeout = 300.0  # 5 minutes timeout for OCR processing
 
-    async def process_document(self, file_content: bytes, file_type: str, filename: str = "document") -> Dict[str, Any]:
+    async def process_document(self, file_content: Union[bytes, BinaryIO], file_type: str, filename: str = "document") -> Dict[str, Any]:
         """
         Process document using OCR microservice (RapidOCR or PaddleOCR-VL)
 
         Args:
-            file_content: Document content as bytes
+            file_content: Document content as bytes or a file object (streamed in chunks)
             file_type: File MIME type
             filename: Original filename
 
@@ -28,46 +31,26 @@ class OCRService:
         """
         try:
             # Send file to OCR microservice
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                files = {
-                    'file': (filename, file_content, file_type)
-                }
+            client = http_clients.ocr
+            files = {
+                'file': (filename, file_content, file_type)
+            }
 
+            with timed("ocr_request"):
                 response = await client.post(
                     f"{self.base_url}/ocr",
-                    files=files
+                    files=files,
+                    timeout=self.timeout
                 )
 
-                response.raise_for_status()
-                result = response.json()
-
-                # Handle both RapidOCR and PaddleOCR-VL response formats
-                # RapidOCR returns: elements, total_elements, processing_time
-                # PaddleOCR-VL returns: pages, total_pages, markdown
-
-                if "elements" in result:
-                    # RapidOCR format
-                    return {
-                        "success": result.get("success", True),
-                        "text": result.get("text", ""),
-                        "markdown": "",  # RapidOCR doesn't provide markdown
-                        "pages": [{"elements": result.get("elements", [])}],  # Wrap elements as single page
-                        "total_pages": 1,
-                        "elements": result.get("elements", []),
-                        "total_elements": result.get("total_elements", 0),
-                        "processing_time": result.get("processing_time", 0)
-                    }
-                else:
-                    # PaddleOCR-VL format (backward compatibility)
-                    return {
-                        "success": result.get("success", True),
-                        "text": result.get("text", ""),
-                        "markdown": result.get("markdown", ""),
-                        "pages": result.get("pages", []),
-                        "total_pages": result.get("total_pages", 0)
-                    }
+            response.raise_for_status()
+            result = response.json()
+
+            record_upstream("ocr", "success")
+            return self._format_result(result)
 
         except httpx.TimeoutException:
+            record_upstream("ocr", "timeout")
             return {
                 "success": False,
                 "error": "OCR service timeout",
@@ -75,6 +58,7 @@ class OCRService:
                 "pages": []
             }
         except httpx.HTTPStatusError as e:
+            record_upstream("ocr", "error")
             return {
                 "success": False,
                 "error": f"OCR service error: {e.response.status_code}",
@@ -82,6 +66,7 @@ class OCRService:
                 "pages": []
             }
         except Exception as e:
+            record_upstream("ocr", "error")
             return {
                 "success": False,
                 "error": str(e),
@@ -90,6 +75,114 @@ class OCRService:
             }
 
 
+    async def process_batch(
+        self,
+        documents: List[Tuple[str, Union[bytes, BinaryIO], str, str]]
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        OCR several documents in one request to the batch endpoint
+
+        Results are yielded as the OCR service finishes each file (not in
+        request order). Only files the service reports as failed are yielded
+        with an error; if the request itself fails (timeout, connection
+        error, 5xx) or ends early, documents without a result yet are not
+        yielded at all, so the caller can OCR them one by one instead.
+
+        Args:
+            documents: (key, content, MIME type, filename) per document; content
+                may be bytes or a file object (streamed in chunks)
+
+        Yields:
+            (key, OCR result in the same format as process_document)
+        """
+        keys = [key for key, _, _, _ in documents]
+        pending = set(range(len(documents)))
+        error = None
+        outcome = "success"
+        start = time.perf_counter()
+
+        try:
+            client = http_clients.ocr
+            files = [
+                ('files', (filename, file_content, file_type))
+                for _, file_content, file_type, filename in documents
+            ]
+
+            async with client.stream(
+                "POST",
+                f"{self.base_url}/ocr/batch",
+                files=files,
+                timeout=self.timeout
+            ) as response:
+                response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    result = json.loads(line)
+                    index = result.get("index")
+                    if index not in pending:
+                        continue
+                    pending.discard(index)
+
+                    if result.get("success", True):
+                        yield keys[index], self._format_result(result)
+                    else:
+                        yield keys[index], {
+                            "success": False,
+                            "error": result.get("error", "OCR processing failed"),
+                            "text": "",
+                            "pages": []
+                        }
+
+        except httpx.TimeoutException:
+            error = "OCR service timeout"
+            outcome = "timeout"
+        except httpx.HTTPStatusError as e:
+            error = f"OCR service error: {e.response.status_code}"
+            outcome = "error"
+        except Exception as e:
+            error = str(e)
+            outcome = "error"
+
+        # Until the last result arrived (the request streams for the whole batch)
+        STAGE_SECONDS.labels("ocr_batch_request").observe(time.perf_counter() - start)
+        record_upstream("ocr", outcome)
+
+        if pending:
+            print(f"OCR batch request left {len(pending)} document(s) without a result: "
+                  f"{error or 'OCR service returned no result'}")
+
+    @staticmethod
+    def _format_result(result: Dict[str, Any]) -> Dict[str, Any]:
+        # Handle both RapidOCR and PaddleOCR-VL response formats
+        # RapidOCR returns: elements, total_elements, processing_time
+        # PaddleOCR-VL returns: pages, total_pages, markdown
+
+        if "elements" in result:
+            # RapidOCR format
+            return {
+                "success": result.get("success", True),
+                "text": result.get("text", ""),
+                "markdown": "",  # RapidOCR doesn't provide markdown
+                "pages": [{"elements": result.get("elements", [])}],  # Wrap elements as single page
+                "total_pages": result.get("total_pages", 1),
+                "elements": result.get("elements", []),
+                "total_elements": result.get("total_elements", 0),
+                "text_layer_pages": result.get("text_layer_pages", 0),
+                "processing_time": result.get("processing_time", 0)
+            }
+        else:
+            # PaddleOCR-VL format (backward compatibility)
+            return {
+                "success": result.get("success", True),
+                "text": result.get("text", ""),
+                "markdown": result.get("markdown", ""),
+                "pages": result.get("pages", []),
+                "total_pages": result.get("total_pages", 0)
+            }
+
+
 # Singleton instance
 ocr_service = OCRService()
 
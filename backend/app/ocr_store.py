@@ -0,0 +1,107 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select, delete, insert, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Document, DocumentOCRPage
+
+PAGE_LABEL = re.compile(r"page_(\d+)$")
+
+
+def group_elements_by_page(ocr_result: Dict[str, Any]) -> List[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Split an OCR result into per-page element lists
+
+    RapidOCR returns a flat element list labelled "page_N"; PaddleOCR-VL
+    returns a list of pages with their own elements.
+
+    Returns:
+        [(page_number, elements), ...] ordered by page number
+    """
+    pages: Dict[int, List[Dict[str, Any]]] = {}
+
+    if ocr_result.get("elements"):
+        for element in ocr_result["elements"]:
+            match = PAGE_LABEL.match(str(element.get("page", "")))
+            page_number = int(match.group(1)) if match else 1
+            pages.setdefault(page_number, []).append(element)
+    else:
+        for index, page in enumerate(ocr_result.get("pages", [])):
+            elements = page.get("elements") if isinstance(page, dict) else None
+            if elements:
+                pages[index + 1] = elements
+
+    return sorted(pages.items())
+
+
+def ocr_summary(ocr_result: Dict[str, Any], pages: List[Tuple[int, List[Dict[str, Any]]]]) -> Dict[str, Any]:
+    """Small ocr_metadata kept on the documents row"""
+    return {
+        "total_pages": ocr_result.get("total_pages", 0),
+        "total_elements": ocr_result.get("total_elements", sum(len(elements) for _, elements in pages)),
+        "text_layer_pages": ocr_result.get("text_layer_pages", 0),
+        "pages_with_elements": [page_number for page_number, _ in pages]
+    }
+
+
+async def save_ocr_pages(db: AsyncSession, document_id: str, pages: List[Tuple[int, List[Dict[str, Any]]]]):
+    """Replace the stored OCR elements of a document (a retried job overwrites its earlier attempt)"""
+    await db.execute(delete(DocumentOCRPage).where(DocumentOCRPage.document_id == document_id))
+    if pages:
+        await db.execute(
+            insert(DocumentOCRPage),
+            [
+                {
+                    "document_id": document_id,
+                    "page_number": page_number,
+                    "elements": elements,
+                    "element_count": len(elements)
+                }
+                for page_number, elements in pages
+            ]
+        )
+
+
+async def copy_ocr_pages(db: AsyncSession, source_id: str, target_id: str):
+    """Copy OCR elements to a deduplicated document (the target row must be flushed first)"""
+    await db.execute(delete(DocumentOCRPage).where(DocumentOCRPage.document_id == target_id))
+    await db.execute(
+        insert(DocumentOCRPage).from_select(
+            ["document_id", "page_number", "elements", "element_count"],
+            select(
+                literal(target_id),
+                DocumentOCRPage.page_number,
+                DocumentOCRPage.elements,
+                DocumentOCRPage.element_count
+            ).where(DocumentOCRPage.document_id == source_id)
+        )
+    )
+
+
+async def load_ocr_pages(db: AsyncSession, document: Document,
+                         page_number: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    OCR elements of a document, optionally of a single page
+
+    Documents processed before elements had their own table still carry them
+    in ocr_metadata; those are served from there.
+    """
+    query = (
+        select(DocumentOCRPage.page_number, DocumentOCRPage.elements)
+        .where(DocumentOCRPage.document_id == document.id)
+        .order_by(DocumentOCRPage.page_number)
+    )
+    if page_number is not None:
+        query = query.where(DocumentOCRPage.page_number == page_number)
+
+    rows = (await db.execute(query)).all()
+    if rows:
+        return [{"page_number": number, "elements": elements} for number, elements in rows]
+
+    legacy = document.ocr_metadata or {}
+    if "elements" in legacy or "pages" in legacy:
+        return [
+            {"page_number": number, "elements": elements}
+            for number, elements in group_elements_by_page(legacy)
+            if page_number is None or number == page_number
+        ]
+    return []
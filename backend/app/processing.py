@@ -0,0 +1,175 @@
+import asyncio
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from sqlalchemy import select
+
+from app.database import async_session
+from app.models import Document, DocumentStatus
+from app.storage import async_storage
+from app.ocr_service import ocr_service
+from app.invoice_extractor import invoice_extractor
+from app.dedup import find_processed_duplicate, copy_processing_results
+from app.events import notify_status
+from app.ocr_store import group_elements_by_page, ocr_summary, save_ocr_pages, copy_ocr_pages
+from app.search import search_vector_for
+from app.invoices import save_invoice, copy_invoice
+from app.metrics import timed, DOCUMENTS_PROCESSED
+from app.traces import ProcessingTracer, save_trace
+
+
+class ProcessingError(Exception):
+    """Raised when a pipeline stage fails; the worker decides whether to retry"""
+
+
+async def ocr_documents_batch(document_ids: List[str]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    OCR several claimed documents with a single request to the OCR service
+
+    Documents that no longer exist or that an identical processed document
+    can stand in for are skipped (process_document_task handles them without
+    OCR). Files are streamed from storage spools into the request.
+
+    Yields:
+        (document_id, OCR result) as the OCR service finishes each document;
+        documents the request did not get to are not yielded
+    """
+    async with async_session() as db:
+        result = await db.execute(
+            select(Document).where(Document.id.in_(document_ids))
+        )
+        documents = []
+        for document in result.scalars():
+            duplicate = await find_processed_duplicate(db, document.content_hash, document.user_id)
+            if duplicate and duplicate.id != document.id:
+                continue
+            documents.append((document.id, document.s3_key, document.file_type, document.original_filename))
+
+    if not documents:
+        return
+
+    with ExitStack() as stack:
+        # Downloaded concurrently; every spool that did arrive is closed on exit
+        spools = await asyncio.gather(
+            *(async_storage.download_to_spool(s3_key) for _, s3_key, _, _ in documents),
+            return_exceptions=True
+        )
+        for spool in spools:
+            if not isinstance(spool, BaseException):
+                stack.enter_context(spool)
+        for spool in spools:
+            if isinstance(spool, BaseException):
+                raise spool
+
+        batch = [
+            (document_id, spool, file_type, filename)
+            for (document_id, _, file_type, filename), spool in zip(documents, spools)
+        ]
+        async for document_id, ocr_result in ocr_service.process_batch(batch):
+            yield document_id, ocr_result
+
+
+async def process_document_task(document_id: str, ocr_result: Optional[Dict[str, Any]] = None,
+                                worker_id: Optional[str] = None):
+    """
+    Process a claimed document with OCR and invoice extraction
+
+    The file is re-read from storage, so the task only needs the document ID
+    and can run in any worker process. Raises on failure so the caller can
+    retry the job. Every run, failed or not, is recorded as a processing trace.
+
+    Args:
+        document_id: Document to process
+        ocr_result: OCR result already obtained in a batch; OCR is skipped when given
+        worker_id: Worker running the job (stored with the trace)
+    """
+    tracer = ProcessingTracer(document_id, worker_id)
+    try:
+        outcome = await _process_document(document_id, ocr_result, tracer)
+    except Exception as e:
+        await save_trace(tracer, "error", str(e))
+        raise
+    await save_trace(tracer, outcome)
+
+
+async def _process_document(document_id: str, ocr_result: Optional[Dict[str, Any]],
+                            tracer: ProcessingTracer) -> Optional[str]:
+    """Run the pipeline for one document; returns the trace outcome"""
+    async with async_session() as db:
+        result = await db.execute(
+            select(Document).where(Document.id == document_id)
+        )
+        document = result.scalar_one_or_none()
+
+        if not document:
+            print(f"Error: Document {document_id} not found")
+            return None
+        tracer.set_document(document)
+
+        # An identical file may have finished processing since this one was queued
+        duplicate = await find_processed_duplicate(db, document.content_hash, document.user_id)
+        if duplicate and duplicate.id != document.id:
+            copy_processing_results(duplicate, document)
+            await copy_ocr_pages(db, duplicate.id, document.id)
+            await copy_invoice(db, duplicate.id, document.id, document.user_id)
+            await notify_status(db, [(document.id, document.user_id, document.status)])
+            with tracer.stage("db_commit"), timed("db_commit"):
+                await db.commit()
+            DOCUMENTS_PROCESSED.labels("duplicate").inc()
+            return "duplicate"
+
+        # Step 1: OCR Processing (file is streamed from storage, not held in memory)
+        if ocr_result is None:
+            with tracer.stage("storage_get", bytes=document.file_size):
+                file = await async_storage.download_to_spool(document.s3_key)
+            with file:
+                with tracer.stage("ocr_request") as stage:
+                    ocr_result = await ocr_service.process_document(
+                        file,
+                        document.file_type,
+                        document.original_filename
+                    )
+                    stage["pages"] = ocr_result.get("total_pages")
+                tracer.set_ocr(ocr_result, stage["duration"])
+        else:
+            tracer.set_ocr(ocr_result, None)
+
+        if not ocr_result.get("success"):
+            raise ProcessingError(ocr_result.get("error", "OCR processing failed"))
+
+        # Update with OCR results; elements go to their own table, the row keeps a summary
+        pages = group_elements_by_page(ocr_result)
+        await save_ocr_pages(db, document.id, pages)
+        document.ocr_text = ocr_result.get("text", "")
+        document.ocr_metadata = ocr_summary(ocr_result, pages)
+        document.search_vector = search_vector_for(document.ocr_text, None)
+        document.ocr_completed_at = datetime.utcnow()
+        document.status = DocumentStatus.OCR_COMPLETE
+        await notify_status(db, [(document.id, document.user_id, document.status)])
+        with tracer.stage("db_commit"), timed("db_commit"):
+            await db.commit()
+
+        # Step 2: Extract Invoice Data
+        if document.ocr_text:
+            with tracer.stage("llm_call", chars=len(document.ocr_text)) as stage:
+                extraction_result = await invoice_extractor.extract_invoice_data(document.ocr_text)
+                stage["cached"] = bool(extraction_result.get("cached"))
+            tracer.set_extraction(extraction_result, stage["duration"])
+
+            if extraction_result.get("success"):
+                document.invoice_data = extraction_result.get("invoice_data", {})
+                document.invoice_extracted_at = datetime.utcnow()
+                document.search_vector = search_vector_for(document.ocr_text, document.invoice_data)
+                await save_invoice(db, document.id, document.user_id, document.invoice_data)
+                document.status = DocumentStatus.COMPLETED
+            else:
+                print(f"Invoice extraction failed for '{document.original_filename}': {extraction_result.get('error')}")
+                document.error_message = extraction_result.get("error", "Invoice extraction failed")
+                document.status = DocumentStatus.OCR_COMPLETE  # Keep OCR results even if extraction fails
+
+            await notify_status(db, [(document.id, document.user_id, document.status)])
+
+        with tracer.stage("db_commit"), timed("db_commit"):
+            await db.commit()
+        DOCUMENTS_PROCESSED.labels(document.status.value).inc()
+        return document.status.value
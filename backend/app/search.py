@@ -0,0 +1,173 @@
+"""
+Full-text search over OCR text and extracted invoice fields
+
+`documents.search_vector` is written whenever the pipeline stores OCR text
+or invoice data. Invoice identifiers and party names rank highest, other
+invoice fields next, then the OCR text.
+
+Backfill documents processed before the column existed with:
+
+    python -m app.search --reindex
+"""
+import argparse
+import asyncio
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import select, update, func, cast, literal, literal_column
+from sqlalchemy.dialects.postgresql import JSONB, REGCONFIG
+from app.config import get_settings
+from app.database import async_session
+from app.models import Document, Invoice
+
+settings = get_settings()
+
+# tsvector weights, highest rank first
+SEARCH_WEIGHTS = ("A", "B", "C", "D")
+
+# Invoice fields by search weight ("A" ranks highest)
+WEIGHTED_FIELDS: Sequence[Tuple[str, Sequence[Tuple[str, ...]]]] = (
+    ("A", (("invoice_number",), ("sender", "name"), ("receiver", "name"))),
+    ("B", (
+        ("total_amount",), ("currency",), ("invoice_date",), ("due_date",),
+        ("sender", "email"), ("sender", "tax_id"), ("receiver", "email"), ("receiver", "tax_id"),
+    )),
+    ("C", (("sender", "address"), ("receiver", "address"), ("payment_terms",), ("notes",))),
+)
+
+
+def text_config():
+    """Text search configuration ("simple" does no language-specific stemming)"""
+    return cast(literal(settings.search_text_config), REGCONFIG)
+
+
+def _field_text(invoice_data: Optional[Dict[str, Any]], paths: Sequence[Tuple[str, ...]]) -> str:
+    values = []
+    for path in paths:
+        value: Any = invoice_data or {}
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is not None:
+            values.append(str(value))
+    return " ".join(values)
+
+
+def _weighted(text, weight: str):
+    # Inlined weight: setweight() takes a "char", which a varchar bind parameter does not cast to.
+    # Only the four tsvector weights are accepted, so nothing else can reach the SQL literal.
+    if weight not in SEARCH_WEIGHTS:
+        raise ValueError(f"Invalid search weight: {weight!r}")
+    return func.setweight(func.to_tsvector(text_config(), func.coalesce(text, "")), literal_column(f"'{weight}'"))
+
+
+def search_vector_for(ocr_text: Optional[str], invoice_data: Optional[Dict[str, Any]]):
+    """
+    SQL expression computing the search vector from new values
+
+    Built from Python values rather than the row's columns because an UPDATE
+    that also sets ocr_text/invoice_data would otherwise see the old ones.
+    """
+    vector = None
+    for weight, paths in WEIGHTED_FIELDS:
+        part = _weighted(literal(_field_text(invoice_data, paths)), weight)
+        vector = part if vector is None else vector.op("||")(part)
+    return vector.op("||")(_weighted(literal(ocr_text or ""), "D"))
+
+
+def search_vector_from_columns():
+    """SQL expression computing the search vector from the row's stored values (for reindexing)"""
+    vector = None
+    for weight, paths in WEIGHTED_FIELDS:
+        text = func.concat_ws(" ", *(Document.invoice_data[path].as_string() for path in paths))
+        part = _weighted(text, weight)
+        vector = part if vector is None else vector.op("||")(part)
+    return vector.op("||")(_weighted(Document.ocr_text, "D"))
+
+
+def build_search_query(user_id: str, q: Optional[str] = None, status: Optional[str] = None,
+                       invoice_number: Optional[str] = None, sender: Optional[str] = None,
+                       date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """
+    Ranked search over a user's documents
+
+    Args:
+        q: Web-search style query (quoted phrases, OR, -exclusion)
+        status: Document status
+        invoice_number: Exact invoice number
+        sender: Exact sender name
+        date_from, date_to: Inclusive bounds on the parsed invoice date (app.invoices)
+
+    Returns:
+        SELECT of (Document, rank) ordered by rank, newest first on ties
+    """
+    query = select(Document).where(Document.user_id == user_id)
+
+    if q:
+        tsquery = func.websearch_to_tsquery(text_config(), q)
+        rank = func.ts_rank_cd(Document.search_vector, tsquery)
+        query = query.where(Document.search_vector.op("@@")(tsquery))
+    else:
+        rank = literal(0.0)
+
+    if status:
+        query = query.where(Document.status == status)
+
+    # Containment filters use the GIN index on invoice_data
+    invoice_data = cast(Document.invoice_data, JSONB)
+    if invoice_number:
+        query = query.where(invoice_data.contains({"invoice_number": invoice_number}))
+    if sender:
+        query = query.where(invoice_data.contains({"sender": {"name": sender}}))
+
+    # Extracted dates are free-form text; compare the typed invoices.invoice_date instead
+    if date_from or date_to:
+        dated = select(Invoice.document_id).where(
+            Invoice.document_id == Document.id,
+            Invoice.user_id == user_id
+        )
+        if date_from:
+            dated = dated.where(Invoice.invoice_date >= date_from)
+        if date_to:
+            dated = dated.where(Invoice.invoice_date <= date_to)
+        query = query.where(dated.exists())
+
+    return (
+        query.add_columns(rank.label("rank"))
+        .order_by(rank.desc(), Document.created_at.desc(), Document.id.desc())
+    )
+
+
+async def reindex(batch_size: int = 500) -> int:
+    """Compute search vectors for processed documents that have none"""
+    total = 0
+    while True:
+        async with async_session() as db:
+            batch = (
+                select(Document.id)
+                .where(Document.search_vector.is_(None), Document.ocr_completed_at.is_not(None))
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                update(Document)
+                .where(Document.id.in_(batch))
+                .values(search_vector=search_vector_from_columns())
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+        if not result.rowcount:
+            return total
+        total += result.rowcount
+        print(f"Indexed {total} documents")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Document search index maintenance")
+    parser.add_argument("--reindex", action="store_true", help="Backfill missing search vectors")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.reindex:
+        asyncio.run(reindex(args.batch_size))
+    else:
+        parser.print_help()
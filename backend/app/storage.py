@@ -1,22 +1,140 @@
 from minio import Minio
 from minio.error import S3Error
-from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import asyncio
+import certifi
+import functools
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import urllib3
 import uuid
 from app.config import get_settings
-from typing import BinaryIO, Tuple
+from app.metrics import timed
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Tuple
 
 settings = get_settings()
 
+# Chunk size used when copying object data between streams
+CHUNK_SIZE = 1024 * 1024
+
+
+class HashingReader:
+    """
+    File-like wrapper that computes size and SHA-256 of the data as it is read,
+    so a stream can be uploaded and fingerprinted in a single pass
+    """
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        self.size += len(data)
+        self._sha256.update(data)
+        return data
+
+    @property
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+
+def presign_window(expires: int, now: Optional[float] = None) -> Tuple[int, int]:
+    """
+    Signing window of a presigned URL valid for `expires` seconds
+
+    URLs are signed as of the start of their window, which lasts half the
+    validity, so a URL handed out at any point of the window stays valid for
+    at least expires / 2 more seconds.
+    Returns: (window number, window start as a Unix timestamp)
+    """
+    length = max(1, expires // 2)
+    window = int(now if now is not None else time.time()) // length
+    return window, window * length
+
+
+class PresignedURLCache:
+    """
+    Presigned GET URLs per object key and validity
+
+    An entry is reused until its signing window ends, then reissued. Within
+    a window the signature is deterministic, so every replica hands out the
+    same URL. Least recently used entries are dropped above max_entries.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[str, int], Tuple[int, str]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, object_key: str, expires: int, window: int) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get((object_key, expires))
+            if entry is None or entry[0] != window:
+                self.misses += 1
+                return None
+            self.entries.move_to_end((object_key, expires))
+            self.hits += 1
+            return entry[1]
+
+    def put(self, object_key: str, expires: int, window: int, url: str):
+        with self.lock:
+            self.entries[(object_key, expires)] = (window, url)
+            self.entries.move_to_end((object_key, expires))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, object_key: str):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == object_key]:
+                del self.entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+def create_http_client() -> urllib3.PoolManager:
+    """
+    Connection pool for the MinIO client
+
+    Same settings as minio's default client, but sized for the async
+    storage threads each uploading several parts at once.
+    """
+    return urllib3.PoolManager(
+        timeout=urllib3.Timeout(connect=10.0, read=300.0),
+        maxsize=settings.storage_max_connections,
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+        retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+    )
+
 
 class MinIOStorage:
+    """
+    Blocking MinIO client wrapper (scripts, worker threads)
+
+    Request handlers use `async_storage`, which runs these methods on a
+    thread pool instead of blocking the event loop.
+    """
     def __init__(self):
         self.client = Minio(
             settings.minio_endpoint,
             access_key=settings.minio_access_key,
             secret_key=settings.minio_secret_key,
-            secure=settings.minio_secure
+            secure=settings.minio_secure,
+            region=settings.minio_region,
+            http_client=create_http_client()
         )
         self.bucket = settings.minio_bucket
+        self.url_cache = PresignedURLCache(settings.storage_url_cache_size)
+        # Also resolves (and caches) the bucket region unless MINIO_REGION is set,
+        # so presigning never makes a request
         self._ensure_bucket()
 
     def _ensure_bucket(self):
@@ -27,40 +145,99 @@ class MinIOStorage:
         except S3Error as e:
             print(f"Error creating bucket: {e}")
 
-    def upload_file(self, file: BinaryIO, filename: str, content_type: str) -> Tuple[str, int]:
+    @staticmethod
+    def hash_file(file: BinaryIO) -> Tuple[str, int]:
+        """
+        Compute SHA-256 and size of a file in chunks, then rewind it
+        Returns: (content_hash, file_size)
+        """
+        reader = HashingReader(file)
+        while reader.read(CHUNK_SIZE):
+            pass
+        file.seek(0)
+        return reader.hexdigest, reader.size
+
+    @staticmethod
+    def content_object_key(content_hash: str) -> str:
+        """Content-addressed object key: identical files share one object"""
+        return f"sha256/{content_hash}"
+
+    def object_exists(self, object_key: str) -> bool:
+        """Check whether an object is already stored"""
+        try:
+            self.client.stat_object(self.bucket, object_key)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return False
+            raise Exception(f"Failed to check file in storage: {str(e)}")
+
+    def upload_file(self, file: BinaryIO, filename: str, content_type: str,
+                    object_key: str = None) -> Tuple[str, int, str]:
         """
-        Upload file to MinIO
-        Returns: (object_key, file_size)
+        Stream file to MinIO using multipart upload with unknown length
+
+        Up to storage_parallel_parts parts (storage_part_size each) are sent
+        concurrently, so at most that many plus one are held in memory; size
+        and SHA-256 are computed while the data is being read.
+        Args:
+            object_key: Key to store under (default: random UUID with the file extension)
+        Returns: (object_key, file_size, content_hash)
         """
         try:
             # Generate unique object key
-            file_extension = filename.split('.')[-1] if '.' in filename else ''
-            object_key = f"{uuid.uuid4()}.{file_extension}" if file_extension else str(uuid.uuid4())
-
-            # Read file content
-            file_content = file.read()
-            file_size = len(file_content)
-            file.seek(0)  # Reset file pointer
+            if object_key is None:
+                file_extension = filename.split('.')[-1] if '.' in filename else ''
+                object_key = f"{uuid.uuid4()}.{file_extension}" if file_extension else str(uuid.uuid4())
 
-            # Upload to MinIO
-            self.client.put_object(
-                self.bucket,
-                object_key,
-                BytesIO(file_content),
-                length=file_size,
-                content_type=content_type
-            )
+            reader = HashingReader(file)
+            with timed("storage_put"):
+                self.client.put_object(
+                    self.bucket,
+                    object_key,
+                    reader,
+                    length=-1,
+                    part_size=settings.storage_part_size,
+                    num_parallel_uploads=settings.storage_parallel_parts,
+                    content_type=content_type
+                )
 
-            return object_key, file_size
+            return object_key, reader.size, reader.hexdigest
 
         except S3Error as e:
             raise Exception(f"Failed to upload file to storage: {str(e)}")
 
+    def store_upload(self, file: BinaryIO, filename: str, content_type: str) -> Tuple[str, int, str, bool]:
+        """
+        Store an uploaded file
+
+        With deduplication enabled the file is stored under its content hash,
+        so identical files share one object (and an existing one is not
+        uploaded again). Otherwise it is streamed under a random key.
+        Returns: (object_key, file_size, content_hash, reused) where reused
+        means an existing object was found and nothing was uploaded
+        """
+        if settings.dedup_enabled:
+            content_hash, file_size = self.hash_file(file)
+            object_key = self.content_object_key(content_hash)
+            if self.object_exists(object_key):
+                return object_key, file_size, content_hash, True
+            self.upload_file(
+                file=file,
+                filename=filename,
+                content_type=content_type,
+                object_key=object_key
+            )
+            return object_key, file_size, content_hash, False
+
+        return (*self.upload_file(file=file, filename=filename, content_type=content_type), False)
+
     def download_file(self, object_key: str) -> bytes:
         """
         Download file from MinIO
         Returns: file content as bytes
         """
+        response = None
         try:
             response = self.client.get_object(self.bucket, object_key)
             return response.read()
@@ -71,6 +248,34 @@ class MinIOStorage:
                 response.close()
                 response.release_conn()
 
+    def download_to_spool(self, object_key: str) -> BinaryIO:
+        """
+        Stream file from MinIO into a spooled temporary file
+
+        Small files stay in memory, larger ones spill to disk, so memory use is
+        bounded regardless of object size. The caller must close the returned file.
+        Returns: file object positioned at the start
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=settings.storage_spool_max_memory)
+        response = None
+        try:
+            with timed("storage_get"):
+                response = self.client.get_object(self.bucket, object_key)
+                for chunk in response.stream(CHUNK_SIZE):
+                    spool.write(chunk)
+            spool.seek(0)
+            return spool
+        except S3Error as e:
+            spool.close()
+            raise Exception(f"Failed to download file from storage: {str(e)}")
+        except Exception:
+            spool.close()
+            raise
+        finally:
+            if response:
+                response.close()
+                response.release_conn()
+
     def delete_file(self, object_key: str) -> bool:
         """Delete file from MinIO"""
         try:
@@ -79,22 +284,108 @@ class MinIOStorage:
         except S3Error:
             return False
 
+    def get_cached_file_url(self, object_key: str, expires: int = 3600) -> Optional[str]:
+        """Presigned URL from the cache, None if it has to be (re)issued"""
+        window, _ = presign_window(expires)
+        return self.url_cache.get(object_key, expires, window)
+
+    def sign_file_url(self, object_key: str, expires: int = 3600) -> str:
+        """Presign a URL for the current signing window and cache it"""
+        window, window_start = presign_window(expires)
+        try:
+            url = self.client.presigned_get_object(
+                self.bucket,
+                object_key,
+                expires=timedelta(seconds=expires),
+                request_date=datetime.fromtimestamp(window_start, timezone.utc)
+            )
+        except S3Error as e:
+            raise Exception(f"Failed to generate file URL: {str(e)}")
+
+        self.url_cache.put(object_key, expires, window, url)
+        return url
+
     def get_file_url(self, object_key: str, expires: int = 3600) -> str:
         """
         Generate presigned URL for file access
+
+        Cached per object key; see presign_window for the remaining validity.
         Args:
             object_key: Object key in bucket
             expires: URL expiration time in seconds (default 1 hour)
         """
-        try:
-            return self.client.presigned_get_object(
-                self.bucket,
-                object_key,
-                expires=expires
+        url = self.get_cached_file_url(object_key, expires)
+        return url if url is not None else self.sign_file_url(object_key, expires)
+
+    def get_file_urls(self, object_keys: Iterable[str], expires: int = 3600) -> Dict[str, str]:
+        """Presigned URLs for many objects (list views); returns {object_key: url}"""
+        return {object_key: self.get_file_url(object_key, expires) for object_key in set(object_keys)}
+
+
+class AsyncMinIOStorage:
+    """
+    Non-blocking interface to MinIOStorage
+
+    Calls run on a dedicated thread pool of storage_max_concurrency threads,
+    which bounds concurrent storage operations without tying up the default
+    executor. Each thread reuses connections from the shared pool.
+    """
+    def __init__(self, storage: MinIOStorage):
+        self.storage = storage
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.storage_max_concurrency,
+            thread_name_prefix="storage"
+        )
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def store_upload(self, file: BinaryIO, filename: str, content_type: str) -> Tuple[str, int, str, bool]:
+        return await self._run(self.storage.store_upload, file, filename, content_type)
+
+    async def upload_file(self, file: BinaryIO, filename: str, content_type: str,
+                          object_key: str = None) -> Tuple[str, int, str]:
+        return await self._run(self.storage.upload_file, file, filename, content_type, object_key)
+
+    async def object_exists(self, object_key: str) -> bool:
+        return await self._run(self.storage.object_exists, object_key)
+
+    async def download_to_spool(self, object_key: str) -> BinaryIO:
+        return await self._run(self.storage.download_to_spool, object_key)
+
+    async def delete_file(self, object_key: str) -> bool:
+        self.storage.url_cache.discard(object_key)
+        return await self._run(self.storage.delete_file, object_key)
+
+    async def get_file_url(self, object_key: str, expires: int = 3600) -> str:
+        # Cache hits are answered on the loop; only signing goes to a thread
+        url = self.storage.get_cached_file_url(object_key, expires)
+        if url is not None:
+            return url
+        return await self._run(self.storage.sign_file_url, object_key, expires)
+
+    async def get_file_urls(self, object_keys: Iterable[str], expires: int = 3600) -> Dict[str, str]:
+        """Presigned URLs for many objects with at most one thread hop for the uncached ones"""
+        urls = {}
+        missing = []
+        for object_key in set(object_keys):
+            url = self.storage.get_cached_file_url(object_key, expires)
+            if url is None:
+                missing.append(object_key)
+            else:
+                urls[object_key] = url
+        if missing:
+            signed = await self._run(
+                lambda: {object_key: self.storage.sign_file_url(object_key, expires) for object_key in missing}
             )
-        except S3Error as e:
-            raise Exception(f"Failed to generate file URL: {str(e)}")
+            urls.update(signed)
+        return urls
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
 
 
-# Singleton instance
+# Singleton instances
 storage = MinIOStorage()
+async_storage = AsyncMinIOStorage(storage)
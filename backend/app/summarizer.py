@@ -1,6 +1,8 @@
 import httpx
 from typing import Dict, Any
 from app.config import get_settings
+from app.http_clients import http_clients
+from app.llm_cache import llm_cache
 
 settings = get_settings()
 
@@ -36,34 +38,48 @@ Respond with ONLY the summary text, no additional formatting or explanation."""
 
             user_prompt = f"Summarize this document:\n\n{text}"
 
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    self.base_url,
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_prompt}
-                        ],
-                        "temperature": 0.3,
-                        "max_tokens": 500
-                    }
-                )
-
-                response.raise_for_status()
-                result = response.json()
-
-                # Extract the summary from OpenAI response
-                summary = result["choices"][0]["message"]["content"].strip()
-
+            cache_key = llm_cache.make_key(
+                self.model, system_prompt, user_prompt,
+                temperature=0.3, max_tokens=500
+            )
+            cached = await llm_cache.get("summarizer", cache_key)
+            if cached is not None:
                 return {
                     "success": True,
-                    "summary": summary
+                    "summary": cached,
+                    "cached": True
+                }
+
+            client = http_clients.openai
+            response = await client.post(
+                self.base_url,
+                timeout=self.timeout,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": self.model,
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    "temperature": 0.3,
+                    "max_tokens": 500
                 }
+            )
+
+            response.raise_for_status()
+            result = response.json()
+
+            # Extract the summary from OpenAI response
+            summary = result["choices"][0]["message"]["content"].strip()
+            await llm_cache.set("summarizer", cache_key, summary)
+
+            return {
+                "success": True,
+                "summary": summary
+            }
 
         except httpx.TimeoutException:
             return {
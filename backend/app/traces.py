@@ -0,0 +1,219 @@
+"""
+Per-document processing traces
+
+Every run of process_document_task records where its time went (download,
+OCR request, LLM call, commits) together with page count, bytes, the OCR
+service's own processing_time and token usage, as one processing_traces row
+per attempt. app.metrics has the aggregates; a trace explains one slow
+document.
+
+Drop traces older than PROCESSING_TRACE_RETENTION_DAYS with:
+
+    python -m app.traces --prune
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, delete, func, case, insert, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import get_settings
+from app.database import async_session
+from app.models import Document, ProcessingTrace
+
+settings = get_settings()
+
+# Page count buckets of the latency report (upper bounds)
+PAGE_BUCKETS = ((1, "1"), (2, "2"), (5, "3-5"), (10, "6-10"), (25, "11-25"))
+
+
+class ProcessingTracer:
+    """
+    Collects the trace of one processing attempt
+
+    Stages are timed relative to the start of the attempt; stage() yields
+    the stage entry so callers can attach details (bytes, pages, tokens).
+    """
+    def __init__(self, document_id: str, worker_id: Optional[str] = None):
+        self.document_id = document_id
+        self.worker_id = worker_id
+        self.started_at = datetime.now(timezone.utc)
+        self.fields: Dict[str, Any] = {}
+        self.stages: List[Dict[str, Any]] = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, **info):
+        start = time.perf_counter()
+        entry = {"stage": name, "start": round(start - self._start, 4), **info}
+        try:
+            yield entry
+        finally:
+            entry["duration"] = round(time.perf_counter() - start, 4)
+            self.stages.append(entry)
+
+    def set_document(self, document: Document):
+        self.fields.update(
+            user_id=document.user_id,
+            attempt=document.attempts or 1,
+            file_type=document.file_type,
+            file_size=document.file_size
+        )
+
+    def set_ocr(self, ocr_result: Dict[str, Any], seconds: Optional[float]):
+        """OCR timings; seconds is None when the result came from a batch request"""
+        self.fields.update(
+            page_count=ocr_result.get("total_pages"),
+            ocr_seconds=seconds,
+            ocr_service_seconds=ocr_result.get("processing_time")
+        )
+
+    def set_extraction(self, extraction_result: Dict[str, Any], seconds: float):
+        usage = extraction_result.get("usage") or {}
+        self.fields.update(
+            # Cache hits cost no LLM time or tokens
+            llm_seconds=None if extraction_result.get("cached") else seconds,
+            llm_model=extraction_result.get("model"),
+            llm_prompt_tokens=usage.get("prompt_tokens"),
+            llm_completion_tokens=usage.get("completion_tokens")
+        )
+
+    def row(self, outcome: str, error: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "id": str(uuid.uuid4()),
+            "document_id": self.document_id,
+            "worker_id": self.worker_id,
+            "outcome": outcome,
+            "error": error,
+            "duration_seconds": round(time.perf_counter() - self._start, 4),
+            "stages": self.stages,
+            "started_at": self.started_at,
+            **self.fields
+        }
+
+
+async def save_trace(tracer: ProcessingTracer, outcome: str, error: Optional[str] = None):
+    """
+    Store a trace in its own session, so failed runs are traced too
+
+    Tracing never fails the pipeline: errors are only logged.
+    """
+    if not settings.processing_traces_enabled or "user_id" not in tracer.fields:
+        return
+    try:
+        async with async_session() as db:
+            await db.execute(insert(ProcessingTrace).values(**tracer.row(outcome, error)))
+            await db.commit()
+    except Exception as e:
+        print(f"Failed to save processing trace of document {tracer.document_id}: {str(e)}")
+
+
+async def document_traces(db: AsyncSession, document_id: str, user_id: str) -> List[Dict[str, Any]]:
+    """All traced attempts of a document, oldest first"""
+    result = await db.execute(
+        select(ProcessingTrace)
+        .where(ProcessingTrace.document_id == document_id, ProcessingTrace.user_id == user_id)
+        .order_by(ProcessingTrace.started_at)
+    )
+    return [trace.to_dict() for trace in result.scalars()]
+
+
+def page_bucket():
+    """Page count bucket label of a trace ("unknown" when OCR never finished)"""
+    # Inlined constants: bound parameters would make the GROUP BY expression differ from the SELECT one
+    def constant(value):
+        return literal_column(f"'{value}'" if isinstance(value, str) else str(value))
+
+    last = PAGE_BUCKETS[-1][0]
+    return case(
+        *((ProcessingTrace.page_count <= constant(bound), constant(label)) for bound, label in PAGE_BUCKETS),
+        (ProcessingTrace.page_count > constant(last), constant(f"{last + 1}+")),
+        else_=constant("unknown")
+    ).label("pages")
+
+
+def _percentiles(column, name: str) -> list:
+    return [
+        func.percentile_cont(0.5).within_group(column).label(f"{name}_p50"),
+        func.percentile_cont(0.95).within_group(column).label(f"{name}_p95"),
+    ]
+
+
+async def latency_report(db: AsyncSession, user_id: str, date_from: Optional[date] = None,
+                         date_to: Optional[date] = None, include_errors: bool = False) -> List[Dict[str, Any]]:
+    """
+    p50/p95 of total, OCR and LLM time per file type and page count bucket
+
+    Deduplicated documents (no OCR or LLM work) are left out, and so are
+    failed attempts unless include_errors is set.
+
+    Args:
+        date_from, date_to: Inclusive bounds on the day the attempt started (UTC)
+
+    Returns:
+        Rows with file_type, pages, traces, retried (attempts after the first),
+        duration/ocr/llm p50 and p95 in seconds, and average tokens
+    """
+    pages = page_bucket()
+    query = (
+        select(
+            ProcessingTrace.file_type,
+            pages,
+            func.count().label("traces"),
+            func.count().filter(ProcessingTrace.attempt > 1).label("retried"),
+            *_percentiles(ProcessingTrace.duration_seconds, "duration"),
+            *_percentiles(ProcessingTrace.ocr_seconds, "ocr"),
+            *_percentiles(ProcessingTrace.ocr_service_seconds, "ocr_service"),
+            *_percentiles(ProcessingTrace.llm_seconds, "llm"),
+            func.avg(ProcessingTrace.llm_prompt_tokens + ProcessingTrace.llm_completion_tokens).label("avg_llm_tokens")
+        )
+        .where(ProcessingTrace.user_id == user_id, ProcessingTrace.outcome != "duplicate")
+        .group_by(ProcessingTrace.file_type, pages)
+        .order_by(ProcessingTrace.file_type, func.min(ProcessingTrace.page_count))
+    )
+    if not include_errors:
+        query = query.where(ProcessingTrace.outcome != "error")
+    if date_from:
+        query = query.where(ProcessingTrace.started_at >= date_from)
+    if date_to:
+        query = query.where(ProcessingTrace.started_at < date_to + timedelta(days=1))
+
+    rows = []
+    for row in (await db.execute(query)).mappings():
+        entry = dict(row)
+        for key, value in entry.items():
+            if isinstance(value, float):
+                entry[key] = round(value, 3)
+        if entry["avg_llm_tokens"] is not None:
+            entry["avg_llm_tokens"] = round(float(entry["avg_llm_tokens"]))
+        rows.append(entry)
+    return rows
+
+
+async def prune(retention_days: int = None) -> int:
+    """Delete traces older than the retention period"""
+    retention_days = retention_days or settings.processing_trace_retention_days
+    async with async_session() as db:
+        result = await db.execute(
+            delete(ProcessingTrace)
+            .where(ProcessingTrace.started_at < func.now() - timedelta(days=retention_days))
+        )
+        await db.commit()
+    print(f"Deleted {result.rowcount} processing traces")
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Processing trace maintenance")
+    parser.add_argument("--prune", action="store_true", help="Delete traces past the retention period")
+    parser.add_argument("--days", type=int, default=None,
+                        help="Retention in days (default: PROCESSING_TRACE_RETENTION_DAYS)")
+    args = parser.parse_args()
+
+    if args.prune:
+        asyncio.run(prune(args.days))
+    else:
+        parser.print_help()
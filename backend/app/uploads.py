@@ -0,0 +1,328 @@
+"""
+Bulk upload: many files and ZIP archives in one request
+
+Files are streamed to storage concurrently (through async_storage), all Document rows are written with one batched INSERT, and since
+the documents table is the processing queue that insert also enqueues them.
+"""
+import asyncio
+import mimetypes
+import os
+import posixpath
+import tempfile
+import uuid
+import zipfile
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from sqlalchemy import select, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import UploadFile
+from app.config import get_settings
+from app.models import Document, DocumentStatus, UploadBatch
+from app.storage import async_storage, CHUNK_SIZE
+from app.dedup import (
+    find_processed_duplicates, copy_processing_results, lock_objects, missing_objects, release_object
+)
+from app.ocr_store import copy_ocr_pages
+from app.invoices import copy_invoice
+from app.events import notify_status
+
+settings = get_settings()
+
+ALLOWED_CONTENT_TYPES = {
+    "application/pdf",
+    "image/png",
+    "image/jpeg",
+    "image/jpg",
+    "image/tiff",
+    "image/bmp"
+}
+
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed", "application/x-zip"}
+
+
+class UploadRejected(Exception):
+    """A file of a bulk upload that is skipped (the rest of the batch is still accepted)"""
+
+
+def is_zip(upload: UploadFile) -> bool:
+    return upload.content_type in ZIP_CONTENT_TYPES or (upload.filename or "").lower().endswith(".zip")
+
+
+def guess_content_type(filename: str) -> Optional[str]:
+    content_type, _ = mimetypes.guess_type(filename)
+    return content_type
+
+
+def _upload_size(upload: UploadFile) -> int:
+    """Size of a received upload (measured on its spool if the parser did not record it)"""
+    if upload.size is not None:
+        return upload.size
+    upload.file.seek(0, os.SEEK_END)
+    size = upload.file.tell()
+    upload.file.seek(0)
+    return size
+
+
+def _extract_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> BinaryIO:
+    """
+    Decompress an archive entry into a spooled temporary file
+
+    The declared size is checked first and the actual size while copying,
+    so a forged header cannot inflate an entry past the limit.
+    """
+    if info.file_size > settings.bulk_upload_max_file_bytes:
+        raise UploadRejected("File too large")
+
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.storage_spool_max_memory)
+    try:
+        with archive.open(info) as entry:
+            written = 0
+            while chunk := entry.read(CHUNK_SIZE):
+                written += len(chunk)
+                if written > settings.bulk_upload_max_file_bytes:
+                    raise UploadRejected("File too large")
+                spool.write(chunk)
+        spool.seek(0)
+        return spool
+    except zipfile.BadZipFile as e:
+        spool.close()
+        raise UploadRejected(f"Corrupt archive entry: {str(e)}")
+    except Exception:
+        spool.close()
+        raise
+
+
+class BulkUploader:
+    """
+    Stores the files of one bulk upload
+
+    At most `bulk_upload_concurrency` files are being extracted or uploaded
+    at a time, which also bounds the number of open spools.
+    """
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(settings.bulk_upload_concurrency)
+        self.tasks: List[asyncio.Task] = []
+        self.stored: List[Dict[str, Any]] = []
+        self.rejected: List[Dict[str, str]] = []
+        self.file_count = 0
+
+    def _count(self, filename: str) -> bool:
+        if self.file_count >= settings.bulk_upload_max_files:
+            self.rejected.append({"filename": filename, "error": "Too many files in batch"})
+            return False
+        self.file_count += 1
+        return True
+
+    async def _store(self, file: BinaryIO, filename: str, content_type: str, close: bool):
+        # Entered with the semaphore held; releases it
+        try:
+            object_key, file_size, content_hash, reused = await async_storage.store_upload(file, filename, content_type)
+            self.stored.append({
+                "original_filename": filename,
+                "file_type": content_type,
+                "object_key": object_key,
+                "file_size": file_size,
+                "content_hash": content_hash,
+                "reused": reused
+            })
+        except Exception as e:
+            print(f"Bulk upload failed to store '{filename}': {str(e)}")
+            self.rejected.append({"filename": filename, "error": str(e)})
+        finally:
+            if close:
+                file.close()
+            self.semaphore.release()
+
+    async def add_file(self, upload: UploadFile):
+        filename = upload.filename or "upload"
+        if upload.content_type not in ALLOWED_CONTENT_TYPES:
+            self.rejected.append({"filename": filename, "error": f"Unsupported file type: {upload.content_type}"})
+            return
+        if _upload_size(upload) > settings.bulk_upload_max_file_bytes:
+            self.rejected.append({"filename": filename, "error": "File too large"})
+            return
+        if not self._count(filename):
+            return
+
+        await self.semaphore.acquire()
+        self.tasks.append(asyncio.create_task(
+            self._store(upload.file, filename, upload.content_type, close=False)
+        ))
+
+    async def add_archive(self, upload: UploadFile):
+        """Queue every supported file of a ZIP archive (folders and hidden files are skipped)"""
+        try:
+            archive = zipfile.ZipFile(upload.file)
+        except zipfile.BadZipFile:
+            self.rejected.append({"filename": upload.filename, "error": "Not a valid ZIP archive"})
+            return
+
+        with archive:
+            for info in archive.infolist():
+                name = info.filename
+                basename = posixpath.basename(name)
+                if info.is_dir() or not basename or basename.startswith(".") or name.startswith("__MACOSX/"):
+                    continue
+
+                content_type = guess_content_type(basename)
+                if content_type not in ALLOWED_CONTENT_TYPES:
+                    self.rejected.append({"filename": name, "error": f"Unsupported file type: {content_type}"})
+                    continue
+                if not self._count(name):
+                    break
+
+                await self.semaphore.acquire()
+                try:
+                    spool = await asyncio.to_thread(_extract_entry, archive, info)
+                except UploadRejected as e:
+                    self.semaphore.release()
+                    self.rejected.append({"filename": name, "error": str(e)})
+                    continue
+                except BaseException:
+                    self.semaphore.release()
+                    raise
+                self.tasks.append(asyncio.create_task(
+                    self._store(spool, basename, content_type, close=True)
+                ))
+
+    async def wait(self):
+        tasks, self.tasks = self.tasks, []
+        await asyncio.gather(*tasks)
+
+    async def store_all(self, uploads: List[UploadFile]) -> List[Dict[str, Any]]:
+        """
+        Store all uploaded files and archive entries
+
+        Returns:
+            One dict per stored file (filename, type, object key, size, hash,
+            whether an existing object was reused);
+            files that were not stored are listed in `rejected`
+        """
+        try:
+            for upload in uploads:
+                if is_zip(upload):
+                    await self.add_archive(upload)
+                else:
+                    await self.add_file(upload)
+            await self.wait()
+        finally:
+            for task in self.tasks:
+                task.cancel()
+        return self.stored
+
+
+async def create_batch(db: AsyncSession, user_id: str, stored: List[Dict[str, Any]],
+                       rejected: List[Dict[str, str]]) -> Tuple[UploadBatch, List[Dict[str, Any]]]:
+    """
+    Create the batch and its documents
+
+    New files are inserted in one statement; files whose identical copy is
+    already processed reuse its results like single uploads do. Files whose
+    shared object was deleted (with the last other document using it) after
+    it was found stored are moved to `rejected`.
+
+    Returns:
+        (batch, [{"id", "original_filename", "status"}, ...])
+    """
+    # Objects stay locked until the documents are committed (see app.dedup.lock_objects)
+    await lock_objects(db, (item["object_key"] for item in stored))
+    # Only objects that were found rather than uploaded can have been deleted since
+    missing = await missing_objects(db, (item["object_key"] for item in stored if item["reused"]))
+    if missing:
+        rejected.extend(
+            {"filename": item["original_filename"], "error": "File was removed from storage during upload, retry"}
+            for item in stored if item["object_key"] in missing
+        )
+        stored = [item for item in stored if item["object_key"] not in missing]
+
+    batch = UploadBatch(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        document_count=len(stored),
+        rejected=rejected or None
+    )
+    db.add(batch)
+    await db.flush()
+
+    duplicates = await find_processed_duplicates(db, (item["content_hash"] for item in stored), user_id)
+
+    rows = []
+    reused = []
+    for item in stored:
+        values = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "filename": item["object_key"],
+            "original_filename": item["original_filename"],
+            "file_type": item["file_type"],
+            "file_size": item["file_size"],
+            "content_hash": item["content_hash"],
+            "s3_key": item["object_key"],
+            "s3_bucket": settings.minio_bucket,
+            "status": DocumentStatus.UPLOADED,
+            "batch_id": batch.id
+        }
+        duplicate = duplicates.get(item["content_hash"])
+        if duplicate:
+            document = Document(**values)
+            copy_processing_results(duplicate, document)
+            reused.append((duplicate.id, document))
+        else:
+            rows.append(values)
+
+    if rows:
+        await db.execute(insert(Document), rows)
+    if reused:
+        db.add_all([document for _, document in reused])
+        await db.flush()
+        for source_id, document in reused:
+            await copy_ocr_pages(db, source_id, document.id)
+            await copy_invoice(db, source_id, document.id, user_id)
+
+    documents = [
+        {"id": row["id"], "original_filename": row["original_filename"], "status": row["status"].value}
+        for row in rows
+    ] + [
+        {"id": document.id, "original_filename": document.original_filename, "status": document.status.value}
+        for _, document in reused
+    ]
+    await notify_status(db, [(document["id"], user_id, document["status"]) for document in documents])
+    return batch, documents
+
+
+async def discard_stored(db: AsyncSession, stored: List[Dict[str, Any]]):
+    """
+    Delete the objects of a bulk upload whose batch was not created
+
+    Call after rolling back. Objects other documents reference (identical
+    files stored before) are kept, see app.dedup.release_object.
+    """
+    for object_key in {item["object_key"] for item in stored}:
+        try:
+            await release_object(db, object_key)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            print(f"Failed to remove '{object_key}' of a failed bulk upload: {str(e)}")
+
+
+async def batch_progress(db: AsyncSession, batch: UploadBatch) -> Dict[str, Any]:
+    """Aggregate processing progress of a batch's documents"""
+    result = await db.execute(
+        select(Document.status, func.count())
+        .where(Document.batch_id == batch.id)
+        .group_by(Document.status)
+    )
+    counts = {status.value: count for status, count in result.all()}
+
+    finished = sum(counts.get(status, 0) for status in ("completed", "ocr_complete", "failed"))
+    total = sum(counts.values())
+    return {
+        "batch_id": batch.id,
+        "created_at": batch.created_at.isoformat() if batch.created_at else None,
+        "total": total,
+        "status_counts": counts,
+        "finished": finished,
+        "pending": total - finished,
+        "done": finished == total,
+        "rejected": batch.rejected or []
+    }
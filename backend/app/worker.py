@@ -0,0 +1,182 @@
+"""
+Document processing worker
+
+Run one or more of these next to the API, on any node that can reach
+Postgres, MinIO and the OCR service:
+
+    python -m app.worker --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import uuid
+from typing import Any, Dict, List, Optional
+from prometheus_client import start_http_server
+
+from app.config import get_settings
+from app.database import init_db
+from app.http_clients import http_clients
+from app.job_queue import document_queue
+from app.metrics import DOCUMENTS_PROCESSED
+from app.processing import process_document_task, ocr_documents_batch
+
+settings = get_settings()
+
+
+class Worker:
+    """
+    Polls the document queue and runs the processing pipeline with bounded
+    concurrency, heartbeating leases for all in-flight jobs
+
+    Documents claimed together are OCR'd in batches of up to
+    worker_ocr_batch_size per OCR request; each then continues through
+    extraction as its own job as soon as its OCR result arrives.
+    """
+    def __init__(self, concurrency: int = None, worker_id: str = None):
+        self.concurrency = concurrency or settings.worker_concurrency
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.poll_interval = settings.worker_poll_interval
+        self.heartbeat_interval = settings.worker_heartbeat_seconds
+        self.ocr_batch_size = max(1, settings.worker_ocr_batch_size)
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self._batches = set()  # Running OCR batch tasks (the loop only keeps weak references)
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        """Stop claiming new jobs; in-flight jobs are allowed to finish"""
+        self._stopping.set()
+
+    async def _run_job(self, document_id: str, ocr_result: Optional["asyncio.Future[Any]"] = None):
+        try:
+            # None (the batch request failed or ended before this document) falls back to a single OCR request
+            result = await ocr_result if ocr_result is not None else None
+            await process_document_task(document_id, ocr_result=result, worker_id=self.worker_id)
+        except asyncio.CancelledError:
+            # Lease lost: the job is not ours to fail or complete any more
+            pass
+        except Exception as e:
+            print(f"Error processing document {document_id}: {str(e)}")
+            retry = await document_queue.fail(document_id, self.worker_id, str(e))
+            if retry:
+                print(f"Document {document_id} scheduled for retry")
+            else:
+                DOCUMENTS_PROCESSED.labels("failed").inc()
+        else:
+            try:
+                await document_queue.complete(document_id, self.worker_id)
+            except Exception as e:
+                # The results are committed; claim() ignores the stale lease of a finished document
+                print(f"Failed to release lease on document {document_id}: {str(e)}")
+        finally:
+            self.in_flight.pop(document_id, None)
+
+    async def _run_ocr_batch(self, results: Dict[str, "asyncio.Future[Any]"]):
+        try:
+            async for document_id, ocr_result in ocr_documents_batch(list(results)):
+                future = results.get(document_id)
+                if future is not None and not future.done():
+                    future.set_result(ocr_result)
+        except Exception as e:
+            print(f"OCR batch failed: {str(e)}")
+        finally:
+            for future in results.values():
+                if not future.done():
+                    future.set_result(None)
+
+    def _start_jobs(self, document_ids: List[str]):
+        for start in range(0, len(document_ids), self.ocr_batch_size):
+            batch = document_ids[start:start + self.ocr_batch_size]
+            if len(batch) == 1:
+                self.in_flight[batch[0]] = asyncio.create_task(self._run_job(batch[0]))
+                continue
+
+            loop = asyncio.get_running_loop()
+            results = {document_id: loop.create_future() for document_id in batch}
+            for document_id in batch:
+                self.in_flight[document_id] = asyncio.create_task(self._run_job(document_id, results[document_id]))
+            batch_task = asyncio.create_task(self._run_ocr_batch(results))
+            self._batches.add(batch_task)
+            batch_task.add_done_callback(self._batches.discard)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            document_ids = list(self.in_flight)
+            try:
+                extended = await document_queue.heartbeat(document_ids, self.worker_id)
+            except Exception as e:
+                print(f"Heartbeat failed: {str(e)}")
+                continue
+            for document_id in set(document_ids) - set(extended):
+                task = self.in_flight.get(document_id)
+                if task is not None:
+                    # Another worker may own the job now: stop before we overwrite its results
+                    print(f"Lost lease on document {document_id}, abandoning it")
+                    task.cancel()
+
+    async def run(self):
+        print(f"Worker {self.worker_id} started (concurrency={self.concurrency})")
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+        try:
+            while not self._stopping.is_set():
+                free_slots = self.concurrency - len(self.in_flight)
+                claimed = []
+
+                if free_slots > 0:
+                    try:
+                        claimed = await document_queue.claim(self.worker_id, free_slots)
+                    except Exception as e:
+                        print(f"Failed to claim jobs: {str(e)}")
+
+                self._start_jobs(claimed)
+
+                stop_waiter = asyncio.ensure_future(self._stopping.wait())
+                if len(self.in_flight) >= self.concurrency:
+                    # At capacity: wake up as soon as a slot frees
+                    await asyncio.wait(
+                        [stop_waiter, *self.in_flight.values()],
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                elif len(claimed) < free_slots:
+                    # Queue drained: back off until the next poll
+                    await asyncio.wait([stop_waiter], timeout=self.poll_interval)
+                stop_waiter.cancel()
+
+            if self.in_flight:
+                print(f"Waiting for {len(self.in_flight)} in-flight job(s) to finish")
+                await asyncio.gather(*self.in_flight.values(), return_exceptions=True)
+        finally:
+            heartbeat.cancel()
+            print(f"Worker {self.worker_id} stopped")
+
+
+async def main(concurrency: int = None, metrics_port: int = None):
+    await init_db()
+    metrics_port = settings.worker_metrics_port if metrics_port is None else metrics_port
+    if metrics_port:
+        start_http_server(metrics_port)
+        print(f"Serving metrics on port {metrics_port}")
+    worker = Worker(concurrency=concurrency)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        await http_clients.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compass document processing worker")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Documents processed in parallel (default: WORKER_CONCURRENCY)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Port for Prometheus metrics, 0 to disable (default: WORKER_METRICS_PORT)")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.concurrency, args.metrics_port))
@@ -0,0 +1,304 @@
+"""
+Local stand-ins for the pipeline's external services
+
+- FakeS3: in-memory S3-compatible server covering the calls app.storage makes
+  (bucket check/create, single and multipart PUT, HEAD, GET, DELETE).
+  Requests are not authenticated.
+- MockOpenAI: chat completions endpoint answering every invoice extraction
+  request with a plausible structured invoice after a configurable delay.
+
+Both run on background threads. Run them standalone (e.g. next to a manually
+started backend) with:
+
+    python benchmarks/stand_ins.py --s3-port 9100 --openai-port 9200 --llm-latency 0.8
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+S3_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real services
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def respond(self, status: int, body: bytes = b"", headers: Optional[Dict[str, str]] = None,
+                content_type: str = "application/xml"):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body or self.command != "HEAD":
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class StandInServer:
+    """Runs a handler class on a local port in a daemon thread"""
+    def __init__(self, handler, port: int = 0, host: str = "127.0.0.1"):
+        self.server = _Server((host, port), handler)
+        self.server.stand_in = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _S3Handler(_Handler):
+    def _target(self) -> Tuple[str, str, Dict[str, list]]:
+        parts = urlsplit(self.path)
+        bucket, _, key = unquote(parts.path).lstrip("/").partition("/")
+        return bucket, key, parse_qs(parts.query, keep_blank_values=True)
+
+    def _error(self, status: int, code: str, bucket: str, key: str = ""):
+        if self.command == "HEAD":
+            return self.respond(status)
+        body = (
+            f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><Error><Code>{code}</Code><Message>{code}</Message>"
+            f"<BucketName>{bucket}</BucketName><Key>{key}</Key><Resource>{self.path}</Resource>"
+            f"<RequestId>{uuid.uuid4().hex}</RequestId><HostId></HostId></Error>"
+        ).encode()
+        self.respond(status, body)
+
+    @staticmethod
+    def _xml(root: str, **fields) -> bytes:
+        inner = "".join(f"<{name}>{value}</{name}>" for name, value in fields.items())
+        return f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><{root} xmlns=\"{S3_NAMESPACE}\">{inner}</{root}>".encode()
+
+    def do_HEAD(self):
+        store: FakeS3 = self.server.stand_in
+        bucket, key, _ = self._target()
+        if bucket not in store.buckets:
+            return self._error(404, "NoSuchBucket", bucket)
+        if not key:
+            return self.respond(200)
+        stored = store.buckets[bucket].get(key)
+        if stored is None:
+            return self._error(404, "NoSuchKey", bucket, key)
+        data, content_type, etag, modified = stored
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Type", content_type)
+        self.send_header("ETag", f'"{etag}"')
+        self.send_header("Last-Modified", formatdate(modified, usegmt=True))
+        self.end_headers()
+
+    def do_GET(self):
+        store: FakeS3 = self.server.stand_in
+        bucket, key, query = self._target()
+        if bucket not in store.buckets:
+            return self._error(404, "NoSuchBucket", bucket)
+        if not key:
+            if "location" in query:
+                body = f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><LocationConstraint xmlns=\"{S3_NAMESPACE}\">{store.region}</LocationConstraint>"
+                return self.respond(200, body.encode())
+            return self._error(501, "NotImplemented", bucket)
+        stored = store.buckets[bucket].get(key)
+        if stored is None:
+            return self._error(404, "NoSuchKey", bucket, key)
+        data, content_type, etag, modified = stored
+        self.respond(200, data, {"ETag": f'"{etag}"', "Last-Modified": formatdate(modified, usegmt=True)},
+                     content_type=content_type)
+
+    def do_PUT(self):
+        store: FakeS3 = self.server.stand_in
+        bucket, key, query = self._target()
+        body = self.read_body()
+        if not key:
+            store.buckets.setdefault(bucket, {})
+            return self.respond(200, headers={"Location": f"/{bucket}"})
+        if bucket not in store.buckets:
+            return self._error(404, "NoSuchBucket", bucket)
+
+        etag = hashlib.md5(body).hexdigest()
+        if "uploadId" in query:
+            upload = store.uploads.get(query["uploadId"][0])
+            if upload is None:
+                return self._error(404, "NoSuchUpload", bucket, key)
+            upload["parts"][int(query["partNumber"][0])] = body
+        else:
+            content_type = self.headers.get("Content-Type", "application/octet-stream")
+            store.buckets[bucket][key] = (body, content_type, etag, time.time())
+        self.respond(200, headers={"ETag": f'"{etag}"'})
+
+    def do_POST(self):
+        store: FakeS3 = self.server.stand_in
+        bucket, key, query = self._target()
+        self.read_body()
+        if bucket not in store.buckets:
+            return self._error(404, "NoSuchBucket", bucket)
+
+        if "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            store.uploads[upload_id] = {
+                "parts": {},
+                "content_type": self.headers.get("Content-Type", "application/octet-stream")
+            }
+            return self.respond(200, self._xml("InitiateMultipartUploadResult",
+                                               Bucket=bucket, Key=key, UploadId=upload_id))
+
+        if "uploadId" in query:
+            upload = store.uploads.pop(query["uploadId"][0], None)
+            if upload is None:
+                return self._error(404, "NoSuchUpload", bucket, key)
+            data = b"".join(upload["parts"][number] for number in sorted(upload["parts"]))
+            etag = f"{hashlib.md5(data).hexdigest()}-{len(upload['parts'])}"
+            store.buckets[bucket][key] = (data, upload["content_type"], etag, time.time())
+            return self.respond(200, self._xml("CompleteMultipartUploadResult",
+                                               Location=f"/{bucket}/{key}", Bucket=bucket, Key=key,
+                                               ETag=f'"{etag}"'))
+
+        self._error(501, "NotImplemented", bucket, key)
+
+    def do_DELETE(self):
+        store: FakeS3 = self.server.stand_in
+        bucket, key, query = self._target()
+        if "uploadId" in query:
+            store.uploads.pop(query["uploadId"][0], None)
+        elif bucket in store.buckets:
+            store.buckets[bucket].pop(key, None)
+        self.respond(204)
+
+
+class FakeS3(StandInServer):
+    """In-memory S3-compatible object store (path-style requests, no auth)"""
+    def __init__(self, port: int = 0, region: str = "us-east-1"):
+        super().__init__(_S3Handler, port)
+        self.region = region
+        self.buckets: Dict[str, Dict[str, tuple]] = {}
+        self.uploads: Dict[str, dict] = {}
+
+    def stored_bytes(self) -> int:
+        return sum(len(stored[0]) for objects in self.buckets.values() for stored in objects.values())
+
+
+VENDORS = ["Acme GmbH", "Globex Corporation", "Initech LLC", "Umbrella Ltd", "Stark Industries Inc"]
+
+
+class _OpenAIHandler(_Handler):
+    def do_POST(self):
+        mock: MockOpenAI = self.server.stand_in
+        try:
+            request = json.loads(self.read_body() or b"{}")
+        except ValueError:
+            return self.respond(400, b'{"error": {"message": "Invalid JSON"}}', content_type="application/json")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self.respond(404, b'{"error": {"message": "Not found"}}', content_type="application/json")
+
+        prompt = "\n".join(message.get("content", "") for message in request.get("messages", []))
+        time.sleep(mock.delay())
+        mock.count()
+
+        invoice_number = re.search(r"(?:invoice\s*(?:no\.?|number|#)?\s*[:#]?\s*)([A-Z0-9-]{3,})", prompt, re.I)
+        amount = re.search(r"total\D{0,20}(\d+[.,]\d{2})", prompt, re.I)
+        invoice = {
+            "invoice_number": invoice_number.group(1) if invoice_number else None,
+            "invoice_date": "2025-03-14",
+            "due_date": "2025-04-13",
+            "sender": {"name": random.choice(VENDORS), "address": None, "email": None, "phone": None, "tax_id": None},
+            "receiver": {"name": "Compass Benchmark", "address": None, "email": None, "phone": None, "tax_id": None},
+            "total_amount": amount.group(1) if amount else None,
+            "currency": "EUR",
+            "subtotal": None,
+            "tax_amount": None,
+            "payment_terms": "30 days",
+            "notes": None
+        }
+        prompt_tokens = len(prompt) // 4
+        content = json.dumps(invoice)
+        body = json.dumps({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": prompt_tokens + len(content) // 4
+            }
+        }).encode()
+        self.respond(200, body, content_type="application/json")
+
+
+class MockOpenAI(StandInServer):
+    """
+    OpenAI-compatible chat completions endpoint with simulated latency
+
+    Args:
+        latency: Mean response delay in seconds
+        jitter: Delays are drawn uniformly from latency ± jitter
+    """
+    def __init__(self, port: int = 0, latency: float = 0.8, jitter: float = 0.2, seed: Optional[int] = None):
+        super().__init__(_OpenAIHandler, port)
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.address}/v1"
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the S3 and OpenAI stand-ins")
+    parser.add_argument("--s3-port", type=int, default=9100)
+    parser.add_argument("--openai-port", type=int, default=9200)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Mean OpenAI response delay in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    args = parser.parse_args()
+
+    s3 = FakeS3(args.s3_port).start()
+    openai = MockOpenAI(args.openai_port, args.llm_latency, args.llm_jitter).start()
+    print(f"S3:     MINIO_ENDPOINT={s3.address} MINIO_REGION={s3.region}")
+    print(f"OpenAI: OPENAI_BASE_URL={openai.base_url} OPENAI_HTTP2=false")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,63 @@
+"""
+Test setup
+
+Settings are read when app modules are imported, so placeholders are set
+before any of them is. Nothing under test talks to MinIO, OpenAI or Clerk.
+
+Tests that need Postgres use TEST_DATABASE_URL and are skipped without it.
+Point it at a throwaway database: tables are created there and emptied
+before every test.
+
+    TEST_DATABASE_URL=postgresql://localhost/compass_test python -m pytest
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+# Never fall back to the DATABASE_URL of a real deployment
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL or "postgresql://localhost/compass_test"
+for name, value in {
+    "CLERK_SECRET_KEY": "test",
+    "MINIO_ENDPOINT": "localhost:9000",
+    "MINIO_ACCESS_KEY": "test",
+    "MINIO_SECRET_KEY": "test",
+    "MINIO_BUCKET": "test",
+    "MINIO_REGION": "us-east-1",
+    "PADDLEOCR_VL_URL": "http://localhost:8119",
+    "OPENAI_API_KEY": "test",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def run_db():
+    """
+    Runs a coroutine against the test database, starting from empty tables
+
+    The engine's pooled connections belong to the event loop they were opened
+    on, so each run disposes of them before its loop closes.
+    """
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    from sqlalchemy import text
+    import app.models  # noqa: F401 (registers the tables)
+    from app.database import engine, init_db
+
+    async def wrapped(coro):
+        try:
+            await init_db()
+            async with engine.begin() as conn:
+                await conn.execute(text("TRUNCATE documents, upload_batches CASCADE"))
+            return await coro
+        finally:
+            await engine.dispose()
+
+    return lambda coro: asyncio.run(wrapped(coro))
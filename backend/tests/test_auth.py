@@ -0,0 +1,147 @@
+import asyncio
+import json
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+KID = "key_1"
+
+
+def make_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def write_jwks(path, keys):
+    jwks = []
+    for kid, private_key in keys.items():
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+        jwks.append({**jwk, "kid": kid, "use": "sig", "alg": "RS256"})
+    path.write_text(json.dumps({"keys": jwks}))
+
+
+def claims(**overrides):
+    now = int(time.time())
+    return {"sub": "user_1", "sid": "sess_1", "iat": now, "exp": now + 60, **overrides}
+
+
+def sign(private_key, kid=KID, **overrides):
+    return jwt.encode(claims(**overrides), private_key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def auth(tmp_path, monkeypatch):
+    """app.auth with fresh caches and its JWKS served from a local file (CLERK_JWKS_FILE)"""
+    import app.auth as auth
+
+    # Test handles, removed from the module again after the test
+    monkeypatch.setattr(auth, "signing_key", make_key(), raising=False)
+    monkeypatch.setattr(auth, "jwks_path", tmp_path / "jwks.json", raising=False)
+    write_jwks(auth.jwks_path, {KID: auth.signing_key})
+    monkeypatch.setattr(auth.settings, "clerk_jwks_file", str(auth.jwks_path))
+
+    jwks_cache = auth.JWKSCache()
+    load = jwks_cache._load
+    jwks_cache.loads = 0
+
+    async def counting_load():
+        jwks_cache.loads += 1
+        return await load()
+
+    monkeypatch.setattr(jwks_cache, "_load", counting_load)
+    monkeypatch.setattr(auth, "jwks_cache", jwks_cache)
+    monkeypatch.setattr(auth, "token_cache", auth.VerifiedTokenCache(100))
+    return auth
+
+
+def current_user(auth, token: str) -> str:
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    return asyncio.run(auth.get_current_user(credentials))
+
+
+def rejection(auth, token: str) -> str:
+    with pytest.raises(HTTPException) as error:
+        current_user(auth, token)
+    assert error.value.status_code == 401
+    return error.value.detail
+
+
+def test_valid_token(auth):
+    assert current_user(auth, sign(auth.signing_key)) == "user_1"
+    assert auth.jwks_cache.loads == 1
+
+
+def test_expired_token(auth):
+    # Past exp by more than the allowed clock skew
+    token = sign(auth.signing_key, exp=int(time.time()) - auth.settings.auth_leeway_seconds - 10)
+    assert rejection(auth, token) == "Token expired"
+
+
+def test_token_signed_with_another_key(auth):
+    token = sign(make_key())
+    with pytest.raises(jwt.InvalidSignatureError):
+        asyncio.run(auth.decode_token(token))
+    rejection(auth, token)
+
+
+def test_unknown_key_id_refetches_once(auth):
+    async def scenario():
+        await auth.jwks_cache.refresh()
+        token = sign(make_key(), kid="key_unknown")
+        results = await asyncio.gather(*(auth.decode_token(token) for _ in range(5)), return_exceptions=True)
+        assert all(isinstance(result, jwt.InvalidTokenError) for result in results)
+
+    asyncio.run(scenario())
+    # The initial fetch only: an unknown key ID right after a fetch does not refetch
+    assert auth.jwks_cache.loads == 1
+
+
+def test_rotated_key_is_fetched(auth):
+    async def scenario():
+        await auth.jwks_cache.refresh()
+        rotated = make_key()
+        write_jwks(auth.jwks_path, {KID: auth.signing_key, "key_2": rotated})
+        auth.jwks_cache.fetched_at -= auth.jwks_cache.min_refetch_seconds
+
+        token = sign(rotated, kid="key_2")
+        results = await asyncio.gather(*(auth.decode_token(token) for _ in range(5)))
+        assert {result["sub"] for result in results} == {"user_1"}
+
+    asyncio.run(scenario())
+    # Concurrent requests with the new key ID share one refetch
+    assert auth.jwks_cache.loads == 2
+
+
+def test_unsigned_token_is_rejected(auth):
+    token = jwt.encode(claims(), None, algorithm="none", headers={"kid": KID})
+    assert "algorithm" in rejection(auth, token)
+    assert auth.jwks_cache.loads == 0
+
+
+def test_hs256_token_is_rejected(auth):
+    token = jwt.encode(claims(), "shared-secret", algorithm="HS256", headers={"kid": KID})
+    assert "algorithm" in rejection(auth, token)
+
+
+def test_token_without_subject_is_rejected(auth):
+    token = jwt.encode(
+        {key: value for key, value in claims().items() if key != "sub"},
+        auth.signing_key, algorithm="RS256", headers={"kid": KID}
+    )
+    assert '"sub"' in rejection(auth, token)
+
+
+def test_cached_token_is_not_served_past_exp(auth, monkeypatch):
+    token = sign(auth.signing_key)
+    assert current_user(auth, token) == "user_1"
+
+    # A changed issuer only fails tokens that are verified again
+    monkeypatch.setattr(auth.settings, "clerk_issuer", "https://other.example")
+    assert current_user(auth, token) == "user_1"
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert '"iss"' in rejection(auth, token)
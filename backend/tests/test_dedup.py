@@ -0,0 +1,219 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import delete, event, func, select
+
+from app.database import async_session, engine
+from app.models import Document, DocumentStatus
+
+OBJECT_KEY = "sha256/" + "ab" * 32
+
+
+class MemoryStorage:
+    """Object existence and deletion, in memory"""
+    def __init__(self):
+        self.objects = set()
+        self.checked = []
+
+    async def object_exists(self, object_key: str) -> bool:
+        self.checked.append(object_key)
+        return object_key in self.objects
+
+    async def delete_file(self, object_key: str) -> bool:
+        self.objects.discard(object_key)
+        return True
+
+
+class FailingDeleteStorage(MemoryStorage):
+    """Storage whose deletes fail the way MinIOStorage reports an S3Error"""
+    async def delete_file(self, object_key: str) -> bool:
+        return False
+
+
+@pytest.fixture
+def dedup(monkeypatch):
+    from minio import Minio
+    # The storage singleton checks its bucket on import; no MinIO in tests
+    monkeypatch.setattr(Minio, "bucket_exists", lambda self, bucket: True)
+    import app.dedup as dedup
+
+    monkeypatch.setattr(dedup, "async_storage", MemoryStorage())
+    dedup.async_storage.objects.add(OBJECT_KEY)
+    return dedup
+
+
+def make_document() -> Document:
+    document_id = str(uuid.uuid4())
+    return Document(
+        id=document_id,
+        user_id="user_1",
+        filename=OBJECT_KEY,
+        original_filename="invoice.pdf",
+        file_type="application/pdf",
+        file_size=100,
+        content_hash=OBJECT_KEY[7:],
+        s3_key=OBJECT_KEY,
+        s3_bucket="test",
+        status=DocumentStatus.UPLOADED
+    )
+
+
+async def add_document() -> str:
+    async with async_session() as db:
+        document = make_document()
+        db.add(document)
+        await db.commit()
+        return document.id
+
+
+async def delete_and_release(document_id: str, dedup) -> bool:
+    async with async_session() as db:
+        await db.execute(delete(Document).where(Document.id == document_id))
+        released = await dedup.release_object(db, OBJECT_KEY)
+        await db.commit()
+        return released
+
+
+def test_release_keeps_object_shared_by_another_document(run_db, dedup):
+    async def scenario():
+        first = await add_document()
+        await add_document()
+
+        assert await delete_and_release(first, dedup) is False
+        assert OBJECT_KEY in dedup.async_storage.objects
+
+    run_db(scenario())
+
+
+def test_release_deletes_object_with_last_document(run_db, dedup):
+    async def scenario():
+        document_id = await add_document()
+
+        assert await delete_and_release(document_id, dedup) is True
+        assert OBJECT_KEY not in dedup.async_storage.objects
+
+    run_db(scenario())
+
+
+def test_failed_object_delete_keeps_the_document(run_db, dedup, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(dedup, "async_storage", FailingDeleteStorage())
+        dedup.async_storage.objects.add(OBJECT_KEY)
+        document_id = await add_document()
+
+        with pytest.raises(Exception, match="Failed to delete file"):
+            await delete_and_release(document_id, dedup)
+
+        async with async_session() as db:
+            assert await db.scalar(select(Document.id).where(Document.id == document_id)) == document_id
+        assert OBJECT_KEY in dedup.async_storage.objects
+
+    run_db(scenario())
+
+
+def test_lock_objects_takes_all_locks_in_one_statement(run_db, dedup):
+    async def scenario():
+        object_keys = [f"sha256/{index:064x}" for index in range(50)]
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        async with async_session() as db:
+            event.listen(engine.sync_engine, "before_cursor_execute", count)
+            try:
+                await dedup.lock_objects(db, reversed(object_keys))
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", count)
+
+            async with async_session() as other:
+                for object_key in (object_keys[0], object_keys[-1]):
+                    assert await other.scalar(select(func.pg_try_advisory_xact_lock(
+                        dedup.OBJECT_LOCK_NAMESPACE, func.hashtext(object_key)
+                    ))) is False
+
+        assert len(statements) == 1
+
+    run_db(scenario())
+
+
+def test_missing_objects_only_checks_unreferenced_keys(run_db, dedup):
+    async def scenario():
+        await add_document()
+        orphan = "sha256/" + "cd" * 32
+
+        async with async_session() as db:
+            assert await dedup.missing_objects(db, [OBJECT_KEY, orphan]) == {orphan}
+
+        assert dedup.async_storage.checked == [orphan]
+
+    run_db(scenario())
+
+
+def test_delete_waits_for_upload_holding_the_object(run_db, dedup):
+    async def scenario():
+        existing = await add_document()
+        locked = asyncio.Event()
+
+        async def upload():
+            async with async_session() as db:
+                await dedup.lock_objects(db, [OBJECT_KEY])
+                locked.set()
+                assert not await dedup.missing_objects(db, [OBJECT_KEY])
+                await asyncio.sleep(0.2)  # The delete of the other document runs meanwhile
+                db.add(make_document())
+                await db.commit()
+
+        async def remove():
+            await locked.wait()
+            return await delete_and_release(existing, dedup)
+
+        _, released = await asyncio.gather(upload(), remove())
+
+        assert released is False
+        assert OBJECT_KEY in dedup.async_storage.objects
+
+    run_db(scenario())
+
+
+def test_upload_sees_object_deleted_before_it_locked(run_db, dedup):
+    async def scenario():
+        existing = await add_document()
+        released = asyncio.Event()
+
+        async def remove():
+            async with async_session() as db:
+                await db.execute(delete(Document).where(Document.id == existing))
+                assert await dedup.release_object(db, OBJECT_KEY) is True
+                released.set()
+                await asyncio.sleep(0.2)  # The upload waits for this commit
+                await db.commit()
+
+        async def upload():
+            await released.wait()
+            async with async_session() as db:
+                await dedup.lock_objects(db, [OBJECT_KEY])
+                return await dedup.missing_objects(db, [OBJECT_KEY])
+
+        _, missing = await asyncio.gather(remove(), upload())
+
+        assert missing == {OBJECT_KEY}
+
+    run_db(scenario())
+
+
+def test_discard_stored_keeps_objects_of_other_documents(run_db, dedup):
+    async def scenario():
+        from app.uploads import discard_stored
+
+        await add_document()
+        orphan = "sha256/" + "cd" * 32
+        dedup.async_storage.objects.add(orphan)
+
+        async with async_session() as db:
+            await discard_stored(db, [{"object_key": OBJECT_KEY}, {"object_key": orphan}])
+
+        assert dedup.async_storage.objects == {OBJECT_KEY}
+
+    run_db(scenario())
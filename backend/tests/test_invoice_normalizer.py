@@ -0,0 +1,103 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app.invoice_normalizer import normalize_invoice, parse_amount, parse_currency, parse_date, vendor_key
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("$1,234.56", (Decimal("1234.56"), "USD")),
+    ("1.234,56 €", (Decimal("1234.56"), "EUR")),
+    ("EUR 99", (Decimal("99"), "EUR")),
+    ("1 000,50 zł", (Decimal("1000.50"), "PLN")),
+    ("US$ 7", (Decimal("7"), "USD")),
+    ("CHF 1'250.00", (Decimal("1250.00"), "CHF")),
+    ("1,234", (Decimal("1234"), None)),
+    ("12", (Decimal("12"), None)),
+    ("EUR", (None, "EUR")),
+    ("", (None, None)),
+    (None, (None, None)),
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+
+@pytest.mark.parametrize("value", ["($5.00)", "-$5.00", "$-5.00", "(5.00 €)", "EUR (5.00)", "- 5.00", "−5.00"])
+def test_parse_amount_negative(value):
+    amount, _ = parse_amount(value)
+    assert amount == Decimal("-5.00")
+
+
+def test_parse_amount_prefers_currency_next_to_amount():
+    assert parse_amount("Total due 5 USD") == (Decimal("5"), "USD")
+    assert parse_amount("All amounts 10 EUR") == (Decimal("10"), "EUR")
+    assert parse_amount("USD 100 (approx. EUR 92)") == (Decimal("100"), "USD")
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("usd", "USD"),
+    ("€", "EUR"),
+    ("Euros", "EUR"),
+    ("C$", "CAD"),
+    ("Rs", "INR"),
+    ("All amounts in EUR", "EUR"),
+    ("ALL", "ALL"),
+    # Three capital letters that are not a currency
+    ("TAX", None),
+    ("N/A", None),
+    (None, None),
+])
+def test_parse_currency(value, expected):
+    assert parse_currency(value) == expected
+
+
+@pytest.mark.parametrize("value, day_first, expected", [
+    ("2025-03-04", None, date(2025, 3, 4)),
+    ("2025-03-04T10:00:00", None, date(2025, 3, 4)),
+    ("04/03/2025", True, date(2025, 3, 4)),
+    ("03/04/2025", False, date(2025, 3, 4)),
+    # A first part above 12 can only be the day
+    ("25.03.25", False, date(2025, 3, 25)),
+    ("4 March 2025", None, date(2025, 3, 4)),
+    ("March 4, 2025", None, date(2025, 3, 4)),
+    ("31/02/2025", True, None),
+    ("soon", None, None),
+    (None, None, None),
+])
+def test_parse_date(value, day_first, expected):
+    assert parse_date(value, day_first=day_first) == expected
+
+
+def test_vendor_key():
+    assert vendor_key("ACME Corp.") == vendor_key("Acme Corporation") == "acme"
+    assert vendor_key("Müller GmbH") == "muller"
+    assert vendor_key(None, "DE 123-456") == "tax:DE123456"
+    assert vendor_key(None) is None
+
+
+def test_normalize_invoice():
+    row = normalize_invoice({
+        "invoice_number": "INV-7",
+        "sender": {"name": "Acme Inc", "tax_id": "US1"},
+        "receiver": {"name": "Globex"},
+        "total_amount": "€1.190,00",
+        "subtotal": "1.000,00",
+        "tax_amount": "190,00",
+        "invoice_date": "2025-03-04",
+        "due_date": "not given",
+    })
+
+    assert row["vendor_key"] == "acme"
+    assert row["currency"] == "EUR"
+    assert (row["total_amount"], row["subtotal"], row["tax_amount"]) == (
+        Decimal("1190.00"), Decimal("1000.00"), Decimal("190.00")
+    )
+    assert row["invoice_date"] == date(2025, 3, 4)
+    assert row["due_date"] is None
+
+
+def test_normalize_invoice_currency_field_wins():
+    row = normalize_invoice({"total_amount": "$5", "currency": "CAD"})
+    assert row["currency"] == "CAD"
+    assert normalize_invoice(None)["total_amount"] is None
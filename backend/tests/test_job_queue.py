@@ -0,0 +1,204 @@
+import asyncio
+import uuid
+
+from sqlalchemy import select, update, func, text
+
+from app.database import async_session
+from app.job_queue import DocumentQueue
+from app.models import Document, DocumentStatus
+
+
+def make_queue(max_attempts: int = 3) -> DocumentQueue:
+    queue = DocumentQueue()
+    queue.max_attempts = max_attempts
+    queue.backoff_seconds = 60
+    return queue
+
+
+async def add_document(**values) -> str:
+    document_id = str(uuid.uuid4())
+    async with async_session() as db:
+        db.add(Document(
+            id=document_id,
+            user_id="user_1",
+            filename=f"sha256/{document_id}",
+            original_filename="invoice.pdf",
+            file_type="application/pdf",
+            file_size=100,
+            s3_key=f"sha256/{document_id}",
+            s3_bucket="test",
+            status=DocumentStatus.UPLOADED,
+            **values
+        ))
+        await db.commit()
+    return document_id
+
+
+async def get_document(document_id: str) -> Document:
+    async with async_session() as db:
+        return (await db.execute(select(Document).where(Document.id == document_id))).scalar_one()
+
+
+async def expire_lease(document_id: str):
+    async with async_session() as db:
+        await db.execute(
+            update(Document)
+            .where(Document.id == document_id)
+            .values(locked_until=func.now() - text("interval '1 second'"))
+        )
+        await db.commit()
+
+
+def test_claim_leases_document_once(run_db):
+    async def scenario():
+        queue = make_queue()
+        document_id = await add_document()
+
+        assert await queue.claim("worker_a") == [document_id]
+        assert await queue.claim("worker_b") == []
+
+        document = await get_document(document_id)
+        assert document.status == DocumentStatus.PROCESSING
+        assert document.locked_by == "worker_a"
+        assert document.locked_until is not None
+        assert document.attempts == 1
+
+    run_db(scenario())
+
+
+def test_concurrent_claims_do_not_share_documents(run_db):
+    async def scenario():
+        queue = make_queue()
+        document_ids = {await add_document() for _ in range(5)}
+
+        claims = await asyncio.gather(*(queue.claim(f"worker_{i}", 2) for i in range(4)))
+        claimed = [document_id for claim in claims for document_id in claim]
+
+        assert len(claimed) == len(set(claimed))
+        assert set(claimed) <= document_ids
+
+    run_db(scenario())
+
+
+def test_complete_releases_lease(run_db):
+    async def scenario():
+        queue = make_queue()
+        document_id = await add_document()
+        await queue.claim("worker_a")
+
+        await queue.complete(document_id, "worker_a")
+
+        document = await get_document(document_id)
+        assert document.locked_by is None
+        assert document.locked_until is None
+        assert await queue.claim("worker_b") == []
+
+    run_db(scenario())
+
+
+def test_fail_schedules_retry_with_backoff(run_db):
+    async def scenario():
+        queue = make_queue()
+        document_id = await add_document()
+        await queue.claim("worker_a")
+
+        assert await queue.fail(document_id, "worker_a", "OCR timeout") is True
+
+        document = await get_document(document_id)
+        assert document.status == DocumentStatus.UPLOADED
+        assert document.locked_by is None
+        assert document.error_message == "OCR timeout"
+        assert document.next_attempt_at is not None
+        # Not runnable again until the backoff has passed
+        assert await queue.claim("worker_b") == []
+
+        async with async_session() as db:
+            await db.execute(
+                update(Document)
+                .where(Document.id == document_id)
+                .values(next_attempt_at=func.now() - text("interval '1 second'"))
+            )
+            await db.commit()
+        assert await queue.claim("worker_b") == [document_id]
+        assert (await get_document(document_id)).attempts == 2
+
+    run_db(scenario())
+
+
+def test_fail_on_last_attempt_marks_failed(run_db):
+    async def scenario():
+        queue = make_queue(max_attempts=1)
+        document_id = await add_document()
+        await queue.claim("worker_a")
+
+        assert await queue.fail(document_id, "worker_a", "Extraction failed") is False
+
+        document = await get_document(document_id)
+        assert document.status == DocumentStatus.FAILED
+        assert document.next_attempt_at is None
+        assert await queue.claim("worker_b") == []
+
+    run_db(scenario())
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(run_db):
+    async def scenario():
+        queue = make_queue()
+        document_id = await add_document()
+        await queue.claim("worker_a")
+        await expire_lease(document_id)
+
+        assert await queue.claim("worker_b") == [document_id]
+        assert (await get_document(document_id)).attempts == 2
+
+        # The first worker lost the job: no heartbeat, and its failure is not recorded
+        assert await queue.heartbeat([document_id], "worker_a") == []
+        assert await queue.fail(document_id, "worker_a", "late error") is False
+        assert await queue.heartbeat([document_id], "worker_b") == [document_id]
+        assert (await get_document(document_id)).locked_by == "worker_b"
+
+    run_db(scenario())
+
+
+def test_expired_lease_after_last_attempt_marks_failed(run_db):
+    async def scenario():
+        queue = make_queue(max_attempts=2)
+        document_id = await add_document()
+
+        # Both attempts kill their worker before fail() is reached
+        for worker_id in ("worker_a", "worker_b"):
+            assert await queue.claim(worker_id) == [document_id]
+            await expire_lease(document_id)
+
+        assert await queue.claim("worker_c") == []
+
+        document = await get_document(document_id)
+        assert document.status == DocumentStatus.FAILED
+        assert document.attempts == 2
+        assert document.locked_by is None
+        assert document.locked_until is None
+        assert "2 attempts" in document.error_message
+
+    run_db(scenario())
+
+
+def test_expired_lease_of_finished_document_is_left_alone(run_db):
+    async def scenario():
+        queue = make_queue(max_attempts=1)
+        document_id = await add_document()
+        await queue.claim("worker_a")
+
+        # The pipeline committed its results, then the worker died before complete()
+        async with async_session() as db:
+            await db.execute(
+                update(Document).where(Document.id == document_id).values(status=DocumentStatus.COMPLETED)
+            )
+            await db.commit()
+        await expire_lease(document_id)
+
+        assert await queue.claim("worker_b") == []
+        document = await get_document(document_id)
+        assert document.status == DocumentStatus.COMPLETED
+        assert document.error_message is None
+
+    run_db(scenario())
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def app_modules(monkeypatch):
+    from minio import Minio
+    # The storage singleton checks its bucket on import; no MinIO in tests
+    monkeypatch.setattr(Minio, "bucket_exists", lambda self, bucket: True)
+    import app.ocr_service as ocr_service
+    import app.worker as worker
+    return ocr_service, worker
+
+
+def use_ocr_transport(monkeypatch, handler):
+    from app.http_clients import http_clients
+    monkeypatch.setitem(http_clients._clients, "ocr", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+async def collect(ocr_service, documents):
+    return {key: result async for key, result in ocr_service.ocr_service.process_batch(documents)}
+
+
+DOCUMENTS = [("doc_a", b"a", "application/pdf", "a.pdf"), ("doc_b", b"b", "application/pdf", "b.pdf")]
+
+
+def test_batch_request_failure_leaves_documents_unresolved(app_modules, monkeypatch):
+    ocr_service, _ = app_modules
+    use_ocr_transport(monkeypatch, lambda request: httpx.Response(503))
+
+    assert asyncio.run(collect(ocr_service, DOCUMENTS)) == {}
+
+
+def test_batch_reports_only_files_the_service_failed(app_modules, monkeypatch):
+    ocr_service, _ = app_modules
+    # The stream ends after one result: doc_a never gets one
+    body = json.dumps({"index": 1, "success": False, "error": "Unreadable PDF"}) + "\n"
+    use_ocr_transport(monkeypatch, lambda request: httpx.Response(200, content=body.encode()))
+
+    results = asyncio.run(collect(ocr_service, DOCUMENTS))
+
+    assert list(results) == ["doc_b"]
+    assert results["doc_b"]["success"] is False
+    assert results["doc_b"]["error"] == "Unreadable PDF"
+
+
+@pytest.mark.parametrize("fail_request", [False, True])
+def test_worker_falls_back_to_single_ocr_for_unresolved_documents(app_modules, monkeypatch, fail_request):
+    _, worker = app_modules
+    ocr_results = {}
+    completed = []
+
+    async def ocr_documents_batch(document_ids):
+        yield "doc_a", {"success": True, "text": "a", "pages": []}
+        if fail_request:
+            raise httpx.ConnectError("connection reset")
+
+    async def process_document_task(document_id, ocr_result=None, worker_id=None):
+        ocr_results[document_id] = ocr_result
+
+    async def complete(document_id, worker_id):
+        completed.append(document_id)
+
+    async def fail(document_id, worker_id, error):
+        raise AssertionError(f"{document_id} failed: {error}")
+
+    monkeypatch.setattr(worker, "ocr_documents_batch", ocr_documents_batch)
+    monkeypatch.setattr(worker, "process_document_task", process_document_task)
+    monkeypatch.setattr(worker.document_queue, "complete", complete)
+    monkeypatch.setattr(worker.document_queue, "fail", fail)
+
+    async def scenario():
+        job_worker = worker.Worker(concurrency=2, worker_id="worker_a")
+        job_worker.ocr_batch_size = 2
+        job_worker._start_jobs(["doc_a", "doc_b"])
+        await asyncio.gather(*job_worker.in_flight.values())
+
+    asyncio.run(scenario())
+
+    assert ocr_results["doc_a"]["text"] == "a"
+    # No batch result: process_document_task runs its own OCR request
+    assert ocr_results["doc_b"] is None
+    assert sorted(completed) == ["doc_a", "doc_b"]
@@ -1,34 +1,82 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { useAuth } from '@clerk/clerk-react';
 import FileUpload from './FileUpload';
 import DocumentList from './DocumentList';
 import './Dashboard.css';
 
+const POLL_INTERVAL = 5000;
+const STREAM_RETRY_INTERVAL = 30000;
+const FINAL_STATUSES = ['completed', 'ocr_complete', 'failed'];
+
 function Dashboard() {
   const { getToken } = useAuth();
   const [documents, setDocuments] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
+  const loadedMore = useRef(false);
+  const firstPageEtag = useRef(null);
+  const documentsRef = useRef(documents);
+  documentsRef.current = documents;
+
+  // Returns null when the list has not changed since `etag` (HTTP 304)
+  const requestPage = useCallback(async (cursor, etag = null) => {
+    const token = await getToken();
+    const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const headers = {
+      'Authorization': `Bearer ${token}`
+    };
+    if (etag) {
+      headers['If-None-Match'] = etag;
+    }
+
+    const response = await fetch(
+      `${process.env.REACT_APP_BACKEND_URL}/api/documents${params}`,
+      {
+        headers,
+        cache: 'no-store'
+      }
+    );
+
+    if (response.status === 304) {
+      return null;
+    }
+    if (!response.ok) {
+      throw new Error('Failed to fetch documents');
+    }
 
+    const data = await response.json();
+    data.etag = response.headers.get('ETag');
+    return data;
+  }, [getToken]);
+
+  // Refreshes the first page; older pages loaded with "Load more" are kept.
+  // Conditional: an unchanged list costs a 304 and no re-render
   const fetchDocuments = useCallback(async () => {
     try {
       setLoading(true);
-      const token = await getToken();
-      const response = await fetch(
-        `${process.env.REACT_APP_BACKEND_URL}/api/documents`,
-        {
-          headers: {
-            'Authorization': `Bearer ${token}`
-          }
-        }
-      );
-
-      if (!response.ok) {
-        throw new Error('Failed to fetch documents');
+      const data = await requestPage(null, firstPageEtag.current);
+      if (data === null) {
+        setError(null);
+        return;
       }
+      firstPageEtag.current = data.etag;
+      const firstPage = data.documents || [];
 
-      const data = await response.json();
-      setDocuments(data.documents || []);
+      setDocuments(prev => {
+        if (!loadedMore.current || firstPage.length === 0) {
+          return firstPage;
+        }
+        const ids = new Set(firstPage.map(doc => doc.id));
+        const oldest = firstPage[firstPage.length - 1].created_at;
+        return firstPage.concat(prev.filter(doc => !ids.has(doc.id) && doc.created_at < oldest));
+      });
+      if (!loadedMore.current) {
+        setNextCursor(data.next_cursor);
+      }
+      setTotal(data.total || 0);
       setError(null);
     } catch (err) {
       setError(err.message);
@@ -36,14 +84,145 @@ function Dashboard() {
     } finally {
       setLoading(false);
     }
-  }, [getToken]);
+  }, [requestPage]);
+
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const data = await requestPage(nextCursor);
+      loadedMore.current = true;
+      setDocuments(prev => {
+        const ids = new Set(prev.map(doc => doc.id));
+        return prev.concat((data.documents || []).filter(doc => !ids.has(doc.id)));
+      });
+      setNextCursor(data.next_cursor);
+      setTotal(data.total || 0);
+    } catch (err) {
+      setError(err.message);
+      console.error('Error fetching documents:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
+  // Status changes are pushed over a server-sent event stream; polling is
+  // only used while the stream is unavailable
   useEffect(() => {
+    let cancelled = false;
+    let controller = null;
+    let pollTimer = null;
+    let retryTimer = null;
+    let refreshTimer = null;
+
+    const startPolling = () => {
+      if (!pollTimer) pollTimer = setInterval(fetchDocuments, POLL_INTERVAL);
+    };
+    const stopPolling = () => {
+      clearInterval(pollTimer);
+      pollTimer = null;
+    };
+
+    // Several documents often finish together; refetch once for all of them
+    const scheduleRefresh = () => {
+      clearTimeout(refreshTimer);
+      refreshTimer = setTimeout(fetchDocuments, 500);
+    };
+
+    const handleEvent = (type, data) => {
+      if (type === 'resync') {
+        fetchDocuments();
+        return;
+      }
+      if (type !== 'document') return;
+
+      const known = documentsRef.current.some(doc => doc.id === data.id);
+
+      if (data.status === 'deleted') {
+        if (known) {
+          setDocuments(prev => prev.filter(doc => doc.id !== data.id));
+          setTotal(prev => Math.max(0, prev - 1));
+        }
+        return;
+      }
+
+      setDocuments(prev => prev.map(doc => (
+        doc.id === data.id ? { ...doc, status: data.status } : doc
+      )));
+
+      // New documents and finished ones need their full summary (invoice data, errors)
+      if (!known || FINAL_STATUSES.includes(data.status)) {
+        scheduleRefresh();
+      }
+    };
+
+    const connect = async () => {
+      controller = new AbortController();
+      try {
+        const token = await getToken();
+        const response = await fetch(
+          `${process.env.REACT_APP_BACKEND_URL}/api/documents/events`,
+          {
+            headers: {
+              'Authorization': `Bearer ${token}`
+            },
+            signal: controller.signal
+          }
+        );
+
+        if (!response.ok || !response.body) {
+          throw new Error('Event stream unavailable');
+        }
+
+        stopPolling();
+        // Catch up on anything that changed before the stream was open
+        fetchDocuments();
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (!cancelled) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+
+          let boundary;
+          while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+            const message = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let type = 'message';
+            let data = '';
+            for (const line of message.split('\n')) {
+              if (line.startsWith('event:')) type = line.slice(6).trim();
+              else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            if (data) handleEvent(type, JSON.parse(data));
+          }
+        }
+      } catch (err) {
+        if (cancelled) return;
+        console.warn('Document event stream failed, falling back to polling:', err);
+      }
+
+      if (!cancelled) {
+        startPolling();
+        retryTimer = setTimeout(connect, STREAM_RETRY_INTERVAL);
+      }
+    };
+
     fetchDocuments();
-    // Poll for updates every 5 seconds
-    const interval = setInterval(fetchDocuments, 5000);
-    return () => clearInterval(interval);
-  }, [fetchDocuments]);
+    connect();
+
+    return () => {
+      cancelled = true;
+      if (controller) controller.abort();
+      stopPolling();
+      clearTimeout(retryTimer);
+      clearTimeout(refreshTimer);
+    };
+  }, [getToken, fetchDocuments]);
 
   const handleUploadComplete = () => {
     fetchDocuments();
@@ -90,10 +269,19 @@ function Dashboard() {
 
       <DocumentList
         documents={documents}
+        total={total}
         loading={loading}
         onDelete={handleDelete}
         onRefresh={fetchDocuments}
       />
+
+      {nextCursor && (
+        <div className="load-more">
+          <button onClick={loadMore} disabled={loadingMore}>
+            {loadingMore ? 'Loading...' : `Load more (${documents.length} of ${total})`}
+          </button>
+        </div>
+      )}
     </div>
   );
 }
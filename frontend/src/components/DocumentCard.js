@@ -1,8 +1,12 @@
 import React, { useState } from 'react';
+import { useAuth } from '@clerk/clerk-react';
 import './DocumentCard.css';
 
 function DocumentCard({ document, onDelete }) {
+  const { getToken } = useAuth();
   const [showOCRText, setShowOCRText] = useState(false);
+  const [ocrText, setOcrText] = useState(null);
+  const [loadingOCRText, setLoadingOCRText] = useState(false);
 
   const getStatusBadge = (status) => {
     const badges = {
@@ -27,6 +31,37 @@ function DocumentCard({ document, onDelete }) {
     return (bytes / (1024 * 1024)).toFixed(1) + ' MB';
   };
 
+  // The list only returns summaries; OCR text is fetched on demand
+  const toggleOCRText = async () => {
+    if (!showOCRText && ocrText === null) {
+      try {
+        setLoadingOCRText(true);
+        const token = await getToken();
+        const response = await fetch(
+          `${process.env.REACT_APP_BACKEND_URL}/api/documents/${document.id}`,
+          {
+            headers: {
+              'Authorization': `Bearer ${token}`
+            }
+          }
+        );
+
+        if (!response.ok) {
+          throw new Error('Failed to fetch OCR text');
+        }
+
+        const data = await response.json();
+        setOcrText(data.ocr_text || '');
+      } catch (err) {
+        console.error('Error fetching OCR text:', err);
+        return;
+      } finally {
+        setLoadingOCRText(false);
+      }
+    }
+    setShowOCRText(!showOCRText);
+  };
+
   const handleDelete = () => {
     if (window.confirm(`Are you sure you want to delete "${document.original_filename}"?`)) {
       onDelete(document.id);
@@ -155,18 +190,19 @@ function DocumentCard({ document, onDelete }) {
         )}
 
         {/* OCR Text Toggle */}
-        {document.ocr_text && (
+        {document.has_ocr_text && (
           <div className="ocr-preview">
             <button
               className="toggle-details"
-              onClick={() => setShowOCRText(!showOCRText)}
+              onClick={toggleOCRText}
+              disabled={loadingOCRText}
             >
-              {showOCRText ? 'Hide' : 'Show'} OCR Text
+              {loadingOCRText ? 'Loading...' : `${showOCRText ? 'Hide' : 'Show'} OCR Text`}
             </button>
 
-            {showOCRText && (
+            {showOCRText && ocrText && (
               <div className="ocr-text">
-                <p>{document.ocr_text.substring(0, 1000)}...</p>
+                <p>{ocrText.substring(0, 1000)}...</p>
               </div>
             )}
           </div>
@@ -2,7 +2,7 @@ import React, { useState } from 'react';
 import DocumentCard from './DocumentCard';
 import './DocumentList.css';
 
-function DocumentList({ documents, loading, onDelete, onRefresh }) {
+function DocumentList({ documents, total, loading, onDelete, onRefresh }) {
   const [filter, setFilter] = useState('all');
 
   const filteredDocuments = documents.filter(doc => {
@@ -12,7 +12,7 @@ function DocumentList({ documents, loading, onDelete, onRefresh }) {
 
   const getStatusCounts = () => {
     const counts = {
-      all: documents.length,
+      all: total || documents.length,
       invoice: 0,
       contract: 0,
       meeting_minutes: 0,
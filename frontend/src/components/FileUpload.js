@@ -13,17 +13,24 @@ function FileUpload({ onUploadComplete }) {
     if (acceptedFiles.length === 0) return;
 
     const file = acceptedFiles[0];
+    // Several files or a ZIP archive go to the bulk endpoint in one request
+    const bulk = acceptedFiles.length > 1 || file.name.toLowerCase().endsWith('.zip');
+    const name = bulk ? `${acceptedFiles.length} file(s)` : file.name;
     setUploading(true);
     setError(null);
-    setUploadProgress({ name: file.name, status: 'Uploading...' });
+    setUploadProgress({ name, status: 'Uploading...' });
 
     try {
       const token = await getToken();
       const formData = new FormData();
-      formData.append('file', file);
+      if (bulk) {
+        acceptedFiles.forEach(f => formData.append('files', f));
+      } else {
+        formData.append('file', file);
+      }
 
       const response = await fetch(
-        `${process.env.REACT_APP_BACKEND_URL}/api/documents/upload`,
+        `${process.env.REACT_APP_BACKEND_URL}/api/documents/${bulk ? 'bulk-upload' : 'upload'}`,
         {
           method: 'POST',
           headers: {
@@ -35,12 +42,14 @@ function FileUpload({ onUploadComplete }) {
 
       if (!response.ok) {
         const errorData = await response.json();
-        throw new Error(errorData.detail || 'Upload failed');
+        const detail = errorData.detail;
+        throw new Error((detail && detail.message) || detail || 'Upload failed');
       }
 
       const data = await response.json();
+      const skipped = bulk && data.rejected.length > 0 ? ` (${data.rejected.length} skipped)` : '';
       setUploadProgress({
-        name: file.name,
+        name: bulk ? `${data.accepted} document(s)${skipped}` : file.name,
         status: 'Uploaded successfully! Processing...'
       });
 
@@ -68,9 +77,9 @@ function FileUpload({ onUploadComplete }) {
       'image/png': ['.png'],
       'image/jpeg': ['.jpg', '.jpeg'],
       'image/tiff': ['.tiff', '.tif'],
-      'image/bmp': ['.bmp']
+      'image/bmp': ['.bmp'],
+      'application/zip': ['.zip']
     },
-    maxFiles: 1,
     disabled: uploading
   });
 
@@ -92,15 +101,15 @@ function FileUpload({ onUploadComplete }) {
               <svg className="upload-icon" fill="none" stroke="currentColor" viewBox="0 0 24 24">
                 <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M7 16a4 4 0 01-.88-7.903A5 5 0 1115.9 6L16 6a5 5 0 011 9.9M15 13l-3-3m0 0l-3 3m3-3v12" />
               </svg>
-              <p className="upload-text">Drop file here</p>
+              <p className="upload-text">Drop files here</p>
             </>
           ) : (
             <>
               <svg className="upload-icon" fill="none" stroke="currentColor" viewBox="0 0 24 24">
                 <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M7 16a4 4 0 01-.88-7.903A5 5 0 1115.9 6L16 6a5 5 0 011 9.9M15 13l-3-3m0 0l-3 3m3-3v12" />
               </svg>
-              <p className="upload-text">Drag & drop a file here, or click to select</p>
-              <p className="upload-hint">Supported: PDF, PNG, JPG, TIFF, BMP</p>
+              <p className="upload-text">Drag & drop files here, or click to select</p>
+              <p className="upload-hint">Supported: PDF, PNG, JPG, TIFF, BMP, or a ZIP of them</p>
             </>
           )}
         </div>
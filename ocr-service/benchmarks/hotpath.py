@@ -0,0 +1,301 @@
+"""
+Per-phase timings of the OCR service hot path on a fixed corpus
+
+Runs each document through the same functions the service uses, in process
+and single-threaded, and times every phase separately:
+
+  - temp_file:      writing the upload to a temp file and opening it from disk
+                    (what a temp-file round trip would cost; the service opens
+                    uploads from memory)
+  - open_pdf:       opening the PDF from bytes
+  - text_layer:     text layer extraction (PDFs)
+  - rasterize_<N>:  rendering at a fixed N DPI, for every --dpi given (PDFs)
+  - rasterize:      rendering with the service defaults (adaptive DPI) (PDFs)
+  - decode:         decoding and downscaling an image (images)
+  - preprocess:     text height fitting, grayscale and margin crop
+  - detect, classify, recognize: RapidOCR's own timings of its three models
+  - ocr_overhead:   engine call time not spent in the three models
+  - boxes:          converting numpy-typed boxes and scores to output floats
+  - build_response: assembling text, elements and page info
+  - serialize:      rendering the response JSON
+
+Every page is OCR'd (the text layer is timed but not used). Each document is
+run --repeat times after a warm-up and the median per phase is reported.
+
+Usage (from ocr-service/):
+    python benchmarks/hotpath.py --corpus /path/to/samples --json before.json
+    python benchmarks/hotpath.py --corpus /path/to/samples --baseline before.json
+    python benchmarks/hotpath.py --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pypdfium2 as pdfium
+from fastapi.responses import JSONResponse
+from rapidocr_onnxruntime import RapidOCR
+
+import main
+from preprocess import load_image, prepare_page, render_pdf_page
+
+DOCUMENT_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp"}
+
+# Phases in pipeline order (report and comparison order)
+PHASES = [
+    "temp_file", "open_pdf", "text_layer", "rasterize", "decode", "preprocess",
+    "detect", "classify", "recognize", "ocr_overhead", "boxes", "build_response", "serialize"
+]
+
+# Differences below this are timer noise, not regressions (seconds)
+MIN_REGRESSION_SECONDS = 0.002
+
+
+class PhaseTimer:
+    """Accumulates time per phase for one run of one document"""
+    def __init__(self):
+        self.seconds: Dict[str, float] = defaultdict(float)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - started
+
+    def add(self, name: str, seconds: float):
+        self.seconds[name] += seconds
+
+
+def run_engine(engine: RapidOCR, image, transform, timer: PhaseTimer) -> list:
+    """OCR one prepared page, splitting the engine time into its models"""
+    started = time.perf_counter()
+    result, elapse = engine(image)
+    total = time.perf_counter() - started
+
+    # elapse is [detection, classification, recognition] (None if nothing was detected)
+    detect, classify, recognize = elapse if isinstance(elapse, list) else (total, 0.0, 0.0)
+    timer.add("detect", detect)
+    timer.add("classify", classify)
+    timer.add("recognize", recognize)
+    timer.add("ocr_overhead", max(0.0, total - detect - classify - recognize))
+
+    with timer.phase("boxes"):
+        return main.convert_items(result, transform)
+
+
+def run_document(path: Path, engine: RapidOCR, dpis: List[int]) -> Dict[str, Any]:
+    """One timed run of a document; returns phase seconds, page count and response size"""
+    timer = PhaseTimer()
+    options = main.PREPROCESS_DEFAULTS
+    content = path.read_bytes()
+    is_pdf = path.suffix.lower() == ".pdf"
+
+    with timer.phase("temp_file"):
+        with tempfile.NamedTemporaryFile(suffix=path.suffix) as spool:
+            spool.write(content)
+            spool.flush()
+            if is_pdf:
+                pdfium.PdfDocument(spool.name).close()
+            else:
+                load_image(spool.name, options)
+
+    page_results = []
+    if is_pdf:
+        with timer.phase("open_pdf"):
+            pdf = pdfium.PdfDocument(content)
+        try:
+            for page_num in range(len(pdf)):
+                page = pdf[page_num]
+                try:
+                    with timer.phase("text_layer"):
+                        main.extract_text_layer(page, main.BBOX_DPI / 72)
+                    for dpi in dpis:
+                        with timer.phase(f"rasterize_{dpi}"):
+                            render_pdf_page(page, options.override(dpi=dpi))
+                    with timer.phase("rasterize"):
+                        image, transform, info = render_pdf_page(page, options)
+                finally:
+                    page.close()
+
+                with timer.phase("preprocess"):
+                    fit_text = info.get("dpi_basis") not in ("fixed", "text_height")
+                    image, transform, page_info = prepare_page(image, transform, options, fit_text=fit_text)
+                items = run_engine(engine, image, transform, timer) if image is not None else []
+                page_results.append((items, 0.0, "ocr", {**info, **page_info}))
+        finally:
+            pdf.close()
+    else:
+        with timer.phase("decode"):
+            image, transform, info = load_image(content, options)
+        with timer.phase("preprocess"):
+            image, transform, page_info = prepare_page(image, transform, options)
+        items = run_engine(engine, image, transform, timer) if image is not None else []
+        page_results.append((items, 0.0, "ocr", {**info, **page_info}))
+
+    with timer.phase("build_response"):
+        response = main.build_response(path.name, page_results, options)
+    with timer.phase("serialize"):
+        body = JSONResponse(content=response).body
+
+    return {
+        "seconds": dict(timer.seconds),
+        "pages": len(page_results),
+        "elements": response["total_elements"],
+        "response_bytes": len(body)
+    }
+
+
+def phase_order(name: str) -> tuple:
+    base = "rasterize" if name.startswith("rasterize") else name
+    position = PHASES.index(base) if base in PHASES else len(PHASES)
+    # rasterize_<dpi> rows sort by DPI after the adaptive one
+    return position, int(name.rsplit("_", 1)[1]) if name.startswith("rasterize_") else 0
+
+
+def run(corpus: Path, dpis: List[int], repeat: int, threads: int) -> Dict[str, Any]:
+    documents = sorted(p for p in corpus.iterdir() if p.suffix.lower() in DOCUMENT_EXTENSIONS)
+    if not documents:
+        raise SystemExit(f"No documents found in {corpus}")
+
+    engine = RapidOCR(intra_op_num_threads=threads)
+    # Warm-up run so model initialisation is not billed to the first document
+    run_document(documents[0], engine, [])
+
+    report_documents = {}
+    for path in documents:
+        print(f"Running {path.name}...", file=sys.stderr)
+        runs = [run_document(path, engine, dpis) for _ in range(repeat)]
+        phases = sorted({name for result in runs for name in result["seconds"]}, key=phase_order)
+        report_documents[path.name] = {
+            "pages": runs[0]["pages"],
+            "elements": runs[0]["elements"],
+            "response_bytes": runs[0]["response_bytes"],
+            "phases": {
+                name: round(statistics.median(result["seconds"].get(name, 0.0) for result in runs), 5)
+                for name in phases
+            }
+        }
+
+    totals: Dict[str, float] = defaultdict(float)
+    for document in report_documents.values():
+        for name, seconds in document["phases"].items():
+            totals[name] += seconds
+    pages = sum(document["pages"] for document in report_documents.values())
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "threads": threads,
+            "preprocessing": main.PREPROCESS_DEFAULTS.to_dict()
+        },
+        "repeat": repeat,
+        "documents_count": len(report_documents),
+        "pages": pages,
+        "phases": {
+            name: {"total": round(totals[name], 5), "per_page": round(totals[name] / pages, 5) if pages else None}
+            for name in sorted(totals, key=phase_order)
+        },
+        "documents": report_documents
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Per-phase change against a baseline report (per page, so corpora of different size compare)
+
+    Returns:
+        Rows with phase, baseline and current seconds per page, ratio and
+        whether it is a regression beyond tolerance
+    """
+    rows = []
+    before_phases = baseline.get("phases", {})
+    for name in sorted(set(report["phases"]) | set(before_phases), key=phase_order):
+        current = report["phases"].get(name, {}).get("per_page")
+        before = before_phases.get(name, {}).get("per_page")
+        ratio = round(current / before, 3) if current is not None and before else None
+        rows.append({
+            "phase": name,
+            "baseline": before,
+            "current": current,
+            "ratio": ratio,
+            "regression": bool(
+                ratio is not None and ratio > 1 + tolerance and current - before > MIN_REGRESSION_SECONDS
+            )
+        })
+    return rows
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{report['documents_count']} documents, {report['pages']} pages, median of {report['repeat']} runs")
+    print(f"{'phase':<16}{'total s':>10}{'ms/page':>10}{'share':>8}")
+    # Fixed-DPI renders are extra work the service does not do; keep them out of the share
+    service_total = sum(stats["total"] for name, stats in report["phases"].items()
+                        if not name.startswith("rasterize_") and name != "temp_file") or 1
+    for name, stats in report["phases"].items():
+        share = "-" if name.startswith("rasterize_") or name == "temp_file" else f"{stats['total'] / service_total:.0%}"
+        per_page = f"{stats['per_page'] * 1000:.2f}" if stats["per_page"] is not None else "-"
+        print(f"{name:<16}{stats['total']:>10.3f}{per_page:>10}{share:>8}")
+
+
+def print_comparison(rows: List[Dict[str, Any]]):
+    print(f"{'phase':<16}{'base ms/page':>14}{'ms/page':>10}{'ratio':>8}")
+    for row in rows:
+        before = f"{row['baseline'] * 1000:.2f}" if row["baseline"] is not None else "-"
+        current = f"{row['current'] * 1000:.2f}" if row["current"] is not None else "-"
+        ratio = f"{row['ratio']:.2f}x" if row["ratio"] is not None else "-"
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['phase']:<16}{before:>14}{current:>10}{ratio:>8}{flag}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, help="Directory of sample PDFs/images")
+    parser.add_argument("--dpi", type=int, nargs="+", default=[150, 200, 300],
+                        help="Fixed DPIs to time PDF rasterization at")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per document (median time is reported)")
+    parser.add_argument("--threads", type=int, default=main.OCR_THREADS_PER_WORKER,
+                        help="ONNX Runtime threads (default: what one service worker gets)")
+    parser.add_argument("--json", type=Path, help="Also write the full report to this file")
+    parser.add_argument("--baseline", type=Path, help="Report to compare this run against")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two saved reports without running")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Allowed per-page slowdown per phase before failing (fraction)")
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, report = (json.loads(path.read_text()) for path in args.compare)
+    elif args.corpus:
+        report = run(args.corpus, args.dpi, args.repeat, args.threads)
+        print_report(report)
+        if args.json:
+            args.json.write_text(json.dumps(report, indent=2))
+        if not args.baseline:
+            return
+        baseline = json.loads(args.baseline.read_text())
+        print()
+    else:
+        parser.error("--corpus or --compare is required")
+
+    rows = compare(report, baseline, args.tolerance)
+    print_comparison(rows)
+    if any(row["regression"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
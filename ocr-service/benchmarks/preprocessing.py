@@ -0,0 +1,184 @@
+"""
+Time vs accuracy of OCR preprocessing settings on a sample corpus
+
+Runs every document in a corpus directory through the OCR pipeline (in
+process, with the same worker pool the service uses) under several
+preprocessing configurations and reports wall time and word-level accuracy.
+
+The reference text for a document is, in order of preference:
+  - <name>.txt next to it (ground truth)
+  - the PDF text layer (born-digital PDFs are OCR'd as if scanned)
+  - the output of the "baseline" configuration (fixed 200 DPI, color, no crop)
+
+Usage (from ocr-service/):
+    python benchmarks/preprocessing.py --corpus /path/to/samples
+    python benchmarks/preprocessing.py --corpus samples --repeat 3 --json results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pypdfium2 as pdfium
+
+import main
+from preprocess import PreprocessOptions
+
+DOCUMENT_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp"}
+
+# The service before preprocessing: fixed 200 DPI, native image size, color, no crop
+BASELINE = PreprocessOptions(dpi=200, max_side=1_000_000, grayscale=False, crop_margins=False)
+
+CONFIGS: Dict[str, PreprocessOptions] = {
+    "baseline": BASELINE,
+    "dpi_150": BASELINE.override(dpi=150),
+    "dpi_300": BASELINE.override(dpi=300),
+    "max_side": BASELINE.override(max_side=2000),
+    "adaptive_color": PreprocessOptions(grayscale=False, crop_margins=False),
+    "adaptive_gray": PreprocessOptions(crop_margins=False),
+    "adaptive": PreprocessOptions(),
+}
+
+
+def words(text: str) -> Counter:
+    return Counter(re.findall(r"\w+", text.lower()))
+
+
+def word_f1(text: str, reference: str) -> float:
+    """Order-independent word overlap (OCR line order differs from text layer order)"""
+    found, expected = words(text), words(reference)
+    if not found or not expected:
+        return float(found == expected)
+    overlap = sum((found & expected).values())
+    precision = overlap / sum(found.values())
+    recall = overlap / sum(expected.values())
+    return 2 * precision * recall / (precision + recall) if overlap else 0.0
+
+
+def reference_text(path: Path) -> Optional[str]:
+    truth = path.with_suffix(".txt")
+    if truth.exists():
+        return truth.read_text()
+
+    if path.suffix.lower() == ".pdf":
+        pdf = pdfium.PdfDocument(str(path))
+        try:
+            parts = []
+            for page in pdf:
+                textpage = page.get_textpage()
+                parts.append(textpage.get_text_range())
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+        text = "\n".join(parts)
+        if len(text.strip()) >= main.TEXT_LAYER_MIN_CHARS:
+            return text
+    return None
+
+
+async def run_config(documents: List[Path], options: PreprocessOptions, repeat: int) -> Dict[str, dict]:
+    results = {}
+    for path in documents:
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = await main.ocr_document(str(path), path.name, options, use_text_layer=False)
+            times.append(time.perf_counter() - started)
+        results[path.name] = {
+            "seconds": statistics.median(times),
+            "text": response["text"],
+            "elements": response["total_elements"],
+            "pages": response["pages"]
+        }
+    return results
+
+
+async def run(corpus: Path, config_names: List[str], repeat: int) -> Dict[str, dict]:
+    documents = sorted(p for p in corpus.iterdir() if p.suffix.lower() in DOCUMENT_EXTENSIONS)
+    if not documents:
+        raise SystemExit(f"No documents found in {corpus}")
+
+    loop = asyncio.get_running_loop()
+    main.ocr_pool = await loop.run_in_executor(None, main.create_pool)
+    try:
+        # Warm-up pass so model initialisation is not billed to the first config
+        await main.ocr_document(str(documents[0]), documents[0].name, BASELINE, use_text_layer=False)
+
+        runs = {}
+        for name in config_names:
+            print(f"Running {name}...", file=sys.stderr)
+            runs[name] = await run_config(documents, CONFIGS[name], repeat)
+    finally:
+        main.ocr_pool.shutdown()
+
+    references = {}
+    for path in documents:
+        reference = reference_text(path)
+        if reference is None and "baseline" in runs:
+            reference = runs["baseline"][path.name]["text"]
+        references[path.name] = reference
+
+    report = {}
+    for name, results in runs.items():
+        documents_report = {}
+        for filename, result in results.items():
+            reference = references[filename]
+            documents_report[filename] = {
+                "seconds": round(result["seconds"], 3),
+                "accuracy": round(word_f1(result["text"], reference), 4) if reference is not None else None,
+                "elements": result["elements"],
+                "pages": result["pages"]
+            }
+        scored = [d["accuracy"] for d in documents_report.values() if d["accuracy"] is not None]
+        report[name] = {
+            "options": CONFIGS[name].to_dict(),
+            "total_seconds": round(sum(d["seconds"] for d in documents_report.values()), 3),
+            "mean_accuracy": round(statistics.mean(scored), 4) if scored else None,
+            "documents": documents_report
+        }
+    return report
+
+
+def print_report(report: Dict[str, dict]):
+    baseline_seconds = report.get("baseline", {}).get("total_seconds")
+    print(f"{'config':<16}{'seconds':>10}{'speedup':>10}{'accuracy':>10}")
+    for name, result in report.items():
+        speedup = f"{baseline_seconds / result['total_seconds']:.2f}x" if baseline_seconds and result["total_seconds"] else "-"
+        accuracy = f"{result['mean_accuracy']:.3f}" if result["mean_accuracy"] is not None else "-"
+        print(f"{name:<16}{result['total_seconds']:>10.2f}{speedup:>10}{accuracy:>10}")
+
+    print()
+    for name, result in report.items():
+        for filename, document in result["documents"].items():
+            accuracy = f"{document['accuracy']:.3f}" if document["accuracy"] is not None else "-"
+            print(f"{name:<16}{filename:<32}{document['seconds']:>8.2f}s  accuracy {accuracy}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True, type=Path, help="Directory of sample PDFs/images")
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per document (median time is reported)")
+    parser.add_argument("--json", type=Path, help="Also write the full report to this file")
+    args = parser.parse_args()
+
+    configs = args.configs if "baseline" in args.configs else ["baseline"] + args.configs
+    report = asyncio.run(run(args.corpus, configs, args.repeat))
+    print_report(report)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,64 +1,358 @@
+import io
 import os
-import tempfile
-from typing import Dict, Any, Optional, List
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional, List, Tuple, Union, Iterator, BinaryIO
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
 from rapidocr_onnxruntime import RapidOCR
 import uvicorn
 from pathlib import Path
 import json
 from PIL import Image
+import numpy as np
 import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+from preprocess import PreprocessOptions, PageTransform, BBOX_DPI, load_image, render_pdf_page, prepare_page
 
 app = FastAPI(title="RapidOCR Microservice", version="1.0.0")
 
-# Initialize RapidOCR engine
-engine = None
+# Log through uvicorn's error logger so messages share its handler and level
+logger = logging.getLogger("uvicorn.error")
+
+# Number of OCR worker processes, each holding its own RapidOCR engine
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+# ONNX Runtime threads per worker (default: split the cores between workers)
+OCR_THREADS_PER_WORKER = int(os.getenv("OCR_THREADS_PER_WORKER", max(1, (os.cpu_count() or 1) // OCR_WORKERS)))
+# Rendered PDF pages waiting for or in OCR per request (bounds peak memory)
+OCR_MAX_PAGES_IN_FLIGHT = int(os.getenv("OCR_MAX_PAGES_IN_FLIGHT", OCR_WORKERS * 2))
+
+# Batch endpoint: files per request, and files processed concurrently (each has its own page window)
+OCR_BATCH_MAX_FILES = int(os.getenv("OCR_BATCH_MAX_FILES", 50))
+OCR_BATCH_FILES_IN_FLIGHT = int(os.getenv("OCR_BATCH_FILES_IN_FLIGHT", OCR_WORKERS))
+
+# Text layer fast path for born-digital PDFs
+TEXT_LAYER_MIN_CHARS = int(os.getenv("TEXT_LAYER_MIN_CHARS", 20))
+TEXT_LAYER_MIN_VALID_RATIO = float(os.getenv("TEXT_LAYER_MIN_VALID_RATIO", 0.9))
+TEXT_LAYER_MAX_IMAGE_COVERAGE = float(os.getenv("TEXT_LAYER_MAX_IMAGE_COVERAGE", 0.5))
+
+# Default page preprocessing (render DPI, downscaling, grayscale, margin crop); overridable per request
+PREPROCESS_DEFAULTS = PreprocessOptions.from_env()
+
+# Prometheus metrics (served at /metrics)
+OCR_PAGE_SECONDS = Histogram(
+    "ocr_page_duration_seconds",
+    "Time per page: RapidOCR inference for scanned pages, text extraction for text layer pages",
+    ["source"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+)
+OCR_DOCUMENT_SECONDS = Histogram(
+    "ocr_document_duration_seconds",
+    "Wall time to OCR one document",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+OCR_PAGES_IN_FLIGHT = Gauge("ocr_pages_in_flight", "Pages submitted to the worker pool and not yet finished")
+OCR_DOCUMENTS_IN_FLIGHT = Gauge("ocr_documents_in_flight", "Documents being OCR'd")
+OCR_DOCUMENTS = Counter("ocr_documents_total", "OCR'd documents by outcome (success, error)", ["outcome"])
+
+# Process pool of RapidOCR engines
+ocr_pool: Optional[ProcessPoolExecutor] = None
+
+# Held while a broken pool is replaced (see restart_pool)
+pool_restart_lock = asyncio.Lock()
+
+# pdfium is not thread-safe, so all rendering goes through a single thread
+render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-render")
+
+# RapidOCR engine of the current worker process
+_worker_engine = None
+
+
+def _init_worker(threads: int):
+    """Load the ONNX models once per worker process"""
+    global _worker_engine
+    _worker_engine = RapidOCR(intra_op_num_threads=threads)
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def ocr_page(img_source: Union[str, bytes, np.ndarray], options: PreprocessOptions,
+             transform: Optional[PageTransform] = None,
+             fit_text: bool = True) -> Tuple[List[Tuple[list, str, float]], float, Dict[str, Any]]:
+    """
+    Preprocess and run RapidOCR on one page inside a worker process
+
+    Args:
+        img_source: Image file path or bytes, or an already rendered page
+        options: Preprocessing settings
+        transform: Mapping of a rendered page back to output coordinates
+        fit_text: Downscale the page from its estimated text height
+
+    Returns:
+        ([(box, text, confidence), ...], OCR time in seconds, page info)
+    """
+    started = time.perf_counter()
+    info: Dict[str, Any] = {}
+    if isinstance(img_source, np.ndarray):
+        image = img_source
+        transform = transform or PageTransform()
+    else:
+        image, transform, info = load_image(img_source, options)
+
+    image, transform, prepare_info = prepare_page(image, transform, options, fit_text=fit_text)
+    info.update(prepare_info)
+    info["preprocess_time"] = time.perf_counter() - started
+
+    if image is None:
+        info["blank"] = True
+        return [], 0.0, info
+
+    result, elapse = _worker_engine(image)
+
+    page_time = sum(elapse) if isinstance(elapse, list) else (elapse or 0)
+
+    return convert_items(result, transform), page_time, info
+
+
+def convert_items(result: Optional[list], transform: PageTransform) -> List[Tuple[list, str, float]]:
+    """RapidOCR results (numpy-typed boxes and scores) as plain floats in output coordinates"""
+    items = []
+    if result:
+        for box, text, confidence in result:
+            items.append((transform.apply([[float(x), float(y)] for x, y in box]), text, float(confidence)))
+    return items
+
+
+def create_pool() -> ProcessPoolExecutor:
+    """Start the worker processes and load an engine in each"""
+    pool = ProcessPoolExecutor(
+        max_workers=OCR_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(OCR_THREADS_PER_WORKER,)
+    )
+    # Submitting one task per worker spawns all of them up front
+    for future in [pool.submit(_warm_up) for _ in range(OCR_WORKERS)]:
+        future.result()
+    return pool
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize RapidOCR engine on startup"""
-    global engine
+    """Start the RapidOCR worker pool on startup"""
+    global ocr_pool
 
     try:
-        # Initialize RapidOCR - works on both CPU and GPU
-        engine = RapidOCR()
-    except Exception as e:
-        print(f"Error initializing RapidOCR engine: {e}")
-        import traceback
-        traceback.print_exc()
+        loop = asyncio.get_running_loop()
+        ocr_pool = await loop.run_in_executor(None, create_pool)
+    except Exception:
+        logger.exception("Error initializing RapidOCR engine")
         raise
 
 
-def pdf_to_images(pdf_path: str, dpi: int = 200) -> List[Image.Image]:
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the worker pool"""
+    if ocr_pool is not None:
+        ocr_pool.shutdown(wait=False, cancel_futures=True)
+    render_executor.shutdown(wait=False)
+
+
+async def run_ocr_page(img_source: Union[str, bytes, np.ndarray], options: PreprocessOptions,
+                       transform: Optional[PageTransform] = None,
+                       fit_text: bool = True) -> Tuple[List[Tuple[list, str, float]], float, Dict[str, Any]]:
+    """Dispatch one page to the worker pool, restarting the pool if a worker died"""
+    pool = ocr_pool
+    loop = asyncio.get_running_loop()
+    try:
+        with OCR_PAGES_IN_FLIGHT.track_inprogress():
+            return await loop.run_in_executor(pool, ocr_page, img_source, options, transform, fit_text)
+    except BrokenProcessPool:
+        await restart_pool(pool)
+        raise
+
+
+async def restart_pool(broken: ProcessPoolExecutor):
     """
-    Convert PDF pages to PIL Images using pypdfium2
+    Replace a broken worker pool
 
-    Args:
-        pdf_path: Path to PDF file
-        dpi: Resolution for rendering (default 200)
+    Every page in flight fails when a worker dies; only the first request to
+    get here restarts the pool, the others find it already replaced.
+    """
+    global ocr_pool
+
+    async with pool_restart_lock:
+        if ocr_pool is not broken:
+            return
+        logger.warning("OCR worker pool broken, restarting")
+        broken.shutdown(wait=False, cancel_futures=True)
+        loop = asyncio.get_running_loop()
+        ocr_pool = await loop.run_in_executor(None, create_pool)
+
+
+def extract_text_layer(page: pdfium.PdfPage, scale: float) -> Optional[List[Tuple[list, str, float]]]:
+    """
+    Read text and line boxes straight from a born-digital PDF page
+
+    The text layer is used only when it is good enough to stand in for OCR:
+    enough characters, mostly printable (no broken font encodings), the page
+    is not dominated by images (scans, including searchable scans), and the
+    page is not rotated.
 
     Returns:
-        List of PIL Image objects, one per page
+        [(box, text, confidence), ...] in rendered pixel coordinates, or None
+        if the page should be OCR'd
+    """
+    if page.get_rotation() != 0:
+        return None
+
+    page_width, page_height = page.get_size()
+    page_area = page_width * page_height or 1
+    image_area = 0.0
+    for obj in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE]):
+        left, bottom, right, top = obj.get_pos()
+        image_area += max(0.0, right - left) * max(0.0, top - bottom)
+    if image_area / page_area > TEXT_LAYER_MAX_IMAGE_COVERAGE:
+        return None
+
+    textpage = page.get_textpage()
+    try:
+        if textpage.count_chars() < TEXT_LAYER_MIN_CHARS:
+            return None
+
+        text = "".join(textpage.get_text_range().split())
+        valid = sum(1 for c in text if c.isprintable() and c != "\ufffd")
+        if valid / max(1, len(text)) < TEXT_LAYER_MIN_VALID_RATIO:
+            return None
+
+        items = []
+        for index in range(textpage.count_rects()):
+            left, bottom, right, top = textpage.get_rect(index)
+            line = textpage.get_text_bounded(left, bottom, right, top).strip()
+            if not line:
+                continue
+
+            # PDF origin is bottom-left; OCR boxes are top-left pixel quads
+            x1, x2 = left * scale, right * scale
+            y1, y2 = (page_height - top) * scale, (page_height - bottom) * scale
+            items.append(([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], line, 1.0))
+
+        return items
+    finally:
+        textpage.close()
+
+
+def iter_pdf_pages(pdf_source: Union[str, bytes], options: PreprocessOptions,
+                   use_text_layer: bool = True) -> Iterator[Tuple[str, Any, float, Dict[str, Any]]]:
+    """
+    Lazily rasterize PDF pages one at a time using pypdfium2
+
+    Pages with a usable text layer are not rendered at all. Each page handle
+    and bitmap is released before the next page is processed, so only the
+    page being yielded is held in memory. Must be consumed from a single
+    thread (pdfium is not thread-safe).
+
+    Args:
+        pdf_source: Path to PDF file or its bytes
+        options: Preprocessing settings (render DPI, grayscale)
+        use_text_layer: Take text from the PDF text layer when possible
+
+    Yields:
+        ("text", [(box, text, confidence), ...], extraction time, info) for pages read from the text layer
+        ("image", (array, transform), render time, info) for pages that need OCR
     """
-    images = []
     try:
-        pdf = pdfium.PdfDocument(pdf_path)
+        pdf = pdfium.PdfDocument(pdf_source)
+    except Exception as e:
+        raise Exception(f"Failed to open PDF: {str(e)}")
+
+    try:
+        # Text layer boxes are reported at BBOX_DPI, like OCR'd pages (72 is base DPI)
+        text_scale = BBOX_DPI / 72
 
         for page_num in range(len(pdf)):
+            started = time.perf_counter()
             page = pdf[page_num]
+            try:
+                items = extract_text_layer(page, text_scale) if use_text_layer else None
+                if items is not None:
+                    result = ("text", items, time.perf_counter() - started, {})
+                else:
+                    image, transform, info = render_pdf_page(page, options)
+                    result = ("image", (image, transform), time.perf_counter() - started, info)
+                    del image
+            except Exception as e:
+                raise Exception(f"Failed to render PDF page {page_num + 1}: {str(e)}")
+            finally:
+                page.close()
+
+            yield result
+            del result
+    finally:
+        pdf.close()
 
-            # Render page to PIL Image
-            # Scale factor for DPI (72 is base DPI)
-            scale = dpi / 72
-            pil_image = page.render(scale=scale).to_pil()
 
-            images.append(pil_image)
+async def ocr_pdf_pages(pdf_source: Union[str, bytes], options: PreprocessOptions,
+                        use_text_layer: bool = True) -> List[Tuple[List[Tuple[list, str, float]], float, str, Dict[str, Any]]]:
+    """
+    Render and OCR PDF pages incrementally
 
-        return images
-    except Exception as e:
-        raise Exception(f"Failed to convert PDF to images: {str(e)}")
+    At most OCR_MAX_PAGES_IN_FLIGHT pages are rendered but not yet OCR'd at any
+    time, which caps peak memory regardless of document length.
+
+    Returns:
+        Per-page (items, processing time, source, info) in page order, where
+        source is "text_layer" or "ocr"
+    """
+    loop = asyncio.get_running_loop()
+    window = asyncio.Semaphore(OCR_MAX_PAGES_IN_FLIGHT)
+    pages = iter_pdf_pages(pdf_source, options, use_text_layer=use_text_layer)
+    page_tasks = []
+
+    async def run_page(image: np.ndarray, transform: PageTransform, info: Dict[str, Any]):
+        try:
+            # Pages sized from their text layer already have the right text height
+            fit_text = info.get("dpi_basis") not in ("fixed", "text_height")
+            items, page_time, page_info = await run_ocr_page(image, options, transform, fit_text)
+            return items, page_time, "ocr", {**info, **page_info}
+        finally:
+            window.release()
+
+    async def text_page(items: List[Tuple[list, str, float]], page_time: float):
+        return items, page_time, "text_layer", {}
+
+    try:
+        while True:
+            await window.acquire()
+            page = await loop.run_in_executor(render_executor, next, pages, None)
+            if page is None:
+                window.release()
+                break
+
+            kind, payload, page_time, info = page
+            if kind == "text":
+                window.release()
+                page_tasks.append(asyncio.ensure_future(text_page(payload, page_time)))
+            else:
+                image, transform = payload
+                page_tasks.append(asyncio.ensure_future(run_page(image, transform, info)))
+                del image
+            del page, payload
+
+        return await asyncio.gather(*page_tasks)
+    except BaseException:
+        for task in page_tasks:
+            task.cancel()
+        raise
+    finally:
+        await loop.run_in_executor(render_executor, pages.close)
 
 
 @app.get("/health")
@@ -67,115 +361,248 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "RapidOCR",
-        "engine_ready": engine is not None
+        "engine_ready": ocr_pool is not None,
+        "workers": OCR_WORKERS
+    }
+
+
+async def ocr_document(source: Union[str, bytes], filename: str, options: PreprocessOptions,
+                       use_text_layer: bool = True) -> Dict[str, Any]:
+    """OCR one document (see _ocr_document), recording its duration and outcome"""
+    started = time.perf_counter()
+    try:
+        with OCR_DOCUMENTS_IN_FLIGHT.track_inprogress():
+            response = await _ocr_document(source, filename, options, use_text_layer)
+    except Exception:
+        OCR_DOCUMENTS.labels("error").inc()
+        raise
+    OCR_DOCUMENT_SECONDS.observe(time.perf_counter() - started)
+    OCR_DOCUMENTS.labels("success").inc()
+    return response
+
+
+async def _ocr_document(source: Union[str, bytes], filename: str, options: PreprocessOptions,
+                        use_text_layer: bool = True) -> Dict[str, Any]:
+    """
+    OCR one document (image or PDF) and build the service response
+
+    Args:
+        source: Path to the document or its bytes
+        filename: Original filename (its extension decides PDF vs image)
+        options: Preprocessing settings
+        use_text_layer: Use the PDF text layer when available
+
+    Returns:
+        OCR results including text, bounding boxes, confidence scores and per-page info
+    """
+    # Check if file is a PDF
+    is_pdf = Path(filename).suffix.lower() == ".pdf"
+
+    # Pages are rendered lazily and dispatched to the worker pool as they come
+    if is_pdf:
+        page_results = await ocr_pdf_pages(source, options, use_text_layer=use_text_layer)
+    else:
+        # For images, decoding and preprocessing happen in the worker
+        items, page_time, info = await run_ocr_page(source, options)
+        page_results = [(items, page_time, "ocr", info)]
+
+    for _, page_time, source_kind, _ in page_results:
+        OCR_PAGE_SECONDS.labels(source_kind).observe(page_time)
+
+    return build_response(filename, page_results, options)
+
+
+def build_response(filename: str, page_results: List[Tuple[List[Tuple[list, str, float]], float, str, Dict[str, Any]]],
+                   options: PreprocessOptions) -> Dict[str, Any]:
+    """
+    Assemble the service response from per-page results
+
+    Args:
+        page_results: Per-page (items, processing time, source, info) in page order
+
+    Returns:
+        OCR results including text, bounding boxes, confidence scores and per-page info
+    """
+    text_parts = []
+    elements = []
+    pages = []
+    total_time = 0
+    text_layer_pages = 0
+
+    for page_index, (items, page_time, source_kind, info) in enumerate(page_results):
+        page_label = f"page_{page_index + 1}"
+        total_time += page_time
+        if source_kind == "text_layer":
+            text_layer_pages += 1
+
+        pages.append({"page": page_label, "source": source_kind, "processing_time": page_time, **info})
+
+        for box, text, confidence in items:
+            text_parts.append(text)
+
+            elements.append({
+                "id": len(elements),
+                "page": page_label,
+                "text": text,
+                "confidence": confidence,
+                "bbox": box
+            })
+
+    # Combine all text
+    combined_text = "\n".join(text_parts)
+
+    return {
+        "success": True,
+        "filename": filename,
+        "text": combined_text,
+        "elements": elements,
+        "total_elements": len(elements),
+        "total_pages": len(page_results),
+        "text_layer_pages": text_layer_pages,
+        "pages": pages,
+        "preprocessing": options.to_dict(),
+        "processing_time": total_time
     }
 
 
+def request_options(dpi: Optional[int], target_text_height: Optional[int], max_side: Optional[int],
+                    grayscale: Optional[bool], crop_margins: Optional[bool]) -> PreprocessOptions:
+    """Service preprocessing defaults with the settings given in the request applied"""
+    return PREPROCESS_DEFAULTS.override(
+        dpi=dpi,
+        target_text_height=target_text_height,
+        max_side=max_side,
+        grayscale=grayscale,
+        crop_margins=crop_margins
+    )
+
+
 @app.post("/ocr")
-async def process_ocr(file: UploadFile = File(...)):
+async def process_ocr(
+    file: UploadFile = File(...),
+    use_text_layer: bool = Form(True),
+    dpi: Optional[int] = Form(None),
+    target_text_height: Optional[int] = Form(None),
+    max_side: Optional[int] = Form(None),
+    grayscale: Optional[bool] = Form(None),
+    crop_margins: Optional[bool] = Form(None)
+):
     """
     Process document with RapidOCR
 
+    PDF pages with an extractable text layer are read directly from the PDF
+    and only scanned pages are OCR'd. Preprocessing settings that are not
+    given fall back to the service defaults (PREPROCESS_* environment).
+
     Args:
         file: Uploaded document file (image or PDF)
+        use_text_layer: Use the PDF text layer when available (default true)
+        dpi: Fixed PDF render DPI; 0 picks it per page from text height / scan resolution
+        target_text_height: Text line height in pixels pages are scaled to
+        max_side: Longest page side in pixels after scaling
+        grayscale: Convert pages to grayscale before OCR
+        crop_margins: Crop empty page margins before OCR
 
     Returns:
         OCR results including text, bounding boxes, and confidence scores
     """
-    if engine is None:
+    if ocr_pool is None:
         raise HTTPException(status_code=503, detail="OCR engine not initialized")
 
-    # Create temporary file to store uploaded document
-    temp_file = None
-    temp_dir = None
+    options = request_options(dpi, target_text_height, max_side, grayscale, crop_margins)
 
     try:
-        # Read file content
+        # PDFs are opened and images decoded straight from memory, no temp files
         file_content = await file.read()
-
-        # Create temporary directory for processing
-        temp_dir = tempfile.mkdtemp()
-
-        # Save uploaded file temporarily
-        file_extension = Path(file.filename).suffix or ".png"
-        temp_file = os.path.join(temp_dir, f"document{file_extension}")
-
-        with open(temp_file, "wb") as f:
-            f.write(file_content)
-
-        # Check if file is a PDF
-        is_pdf = file_extension.lower() == ".pdf"
-
-        # For PDFs, convert to images first
-        images_to_process = []
-        if is_pdf:
-            pdf_images = pdf_to_images(temp_file)
-            images_to_process = [(img, f"page_{i+1}") for i, img in enumerate(pdf_images)]
-        else:
-            # For images, process directly
-            images_to_process = [(temp_file, "page_1")]
-
-        # Process all images/pages
-        text_parts = []
-        elements = []
-        total_time = 0
-
-        for img_source, page_label in images_to_process:
-            # Process with RapidOCR
-            result, elapse = engine(img_source)
-
-            # Calculate processing time
-            page_time = sum(elapse) if isinstance(elapse, list) else elapse
-            total_time += page_time
-
-            # Parse results
-            if result:
-                for idx, item in enumerate(result):
-                    # RapidOCR returns: [box, text, confidence]
-                    box, text, confidence = item
-
-                    text_parts.append(text)
-
-                    elements.append({
-                        "id": len(elements),
-                        "page": page_label,
-                        "text": text,
-                        "confidence": float(confidence),
-                        "bbox": box
-                    })
-
-        # Combine all text
-        combined_text = "\n".join(text_parts)
-
-        response = {
-            "success": True,
-            "filename": file.filename,
-            "text": combined_text,
-            "elements": elements,
-            "total_elements": len(elements),
-            "processing_time": total_time
-        }
+        response = await ocr_document(file_content, file.filename or "document.png", options,
+                                      use_text_layer=use_text_layer)
 
         return JSONResponse(content=response)
 
     except Exception as e:
-        print(f"Error processing OCR: {e}")
+        logger.error(f"Error processing OCR: {e}")
         raise HTTPException(status_code=500, detail=f"OCR processing failed: {str(e)}")
 
-    finally:
-        # Clean up temporary files
-        if temp_file and os.path.exists(temp_file):
-            try:
-                os.remove(temp_file)
-            except:
-                pass
 
-        if temp_dir and os.path.exists(temp_dir):
+def take_spool(upload: UploadFile) -> BinaryIO:
+    """Detach an upload's spooled file so it stays open after the form is closed"""
+    spool = upload.file
+    upload.file = io.BytesIO()
+    return spool
+
+
+@app.post("/ocr/batch")
+async def process_ocr_batch(
+    files: List[UploadFile] = File(...),
+    use_text_layer: bool = Form(True),
+    dpi: Optional[int] = Form(None),
+    target_text_height: Optional[int] = Form(None),
+    max_side: Optional[int] = Form(None),
+    grayscale: Optional[bool] = Form(None),
+    crop_margins: Optional[bool] = Form(None)
+):
+    """
+    Process many documents (or page images) in one request
+
+    Files share the worker pool: up to OCR_BATCH_FILES_IN_FLIGHT are OCR'd
+    at once and their pages are interleaved on the workers. Results are
+    streamed back as NDJSON, one line per file in completion order, each with
+    the file's `index` in the request and the same fields as `/ocr` (or
+    `success: false` and `error` if that file failed).
+
+    Args:
+        files: Uploaded document files (images or PDFs)
+        use_text_layer, dpi, target_text_height, max_side, grayscale, crop_margins:
+            As for `/ocr`, applied to every file
+
+    Returns:
+        application/x-ndjson stream of per-file OCR results
+    """
+    if ocr_pool is None:
+        raise HTTPException(status_code=503, detail="OCR engine not initialized")
+    if len(files) > OCR_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"Too many files (max {OCR_BATCH_MAX_FILES})")
+
+    options = request_options(dpi, target_text_height, max_side, grayscale, crop_margins)
+
+    # The uploads are closed once the handler returns, before the response streams;
+    # keep their spools (on disk past 1 MB) and read each file only when its turn comes
+    documents = [(index, file.filename or f"document_{index}.png", take_spool(file))
+                 for index, file in enumerate(files)]
+    slots = asyncio.Semaphore(OCR_BATCH_FILES_IN_FLIGHT)
+
+    async def process_file(index: int, filename: str, spool: BinaryIO) -> Dict[str, Any]:
+        async with slots:
             try:
-                import shutil
-                shutil.rmtree(temp_dir)
-            except:
-                pass
+                content = await asyncio.to_thread(spool.read)
+                result = await ocr_document(content, filename, options, use_text_layer=use_text_layer)
+            except Exception as e:
+                logger.error(f"Error processing OCR for '{filename}': {e}")
+                result = {"success": False, "filename": filename, "error": f"OCR processing failed: {str(e)}"}
+            finally:
+                spool.close()
+        return {"index": index, **result}
+
+    async def stream_results():
+        tasks = [asyncio.ensure_future(process_file(*document)) for document in documents]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                yield json.dumps(result) + "\n"
+        finally:
+            # Client went away: stop OCR'ing the rest of the batch
+            for task in tasks:
+                task.cancel()
+            for _, _, spool in documents:
+                spool.close()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.get("/")
@@ -187,7 +614,9 @@ async def root():
         "status": "running",
         "endpoints": {
             "health": "/health",
-            "ocr": "/ocr (POST)"
+            "metrics": "/metrics",
+            "ocr": "/ocr (POST)",
+            "ocr_batch": "/ocr/batch (POST, NDJSON response)"
         }
     }
 
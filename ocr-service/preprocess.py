@@ -0,0 +1,343 @@
+"""
+Page preprocessing for the OCR service
+
+Pages are sized so that text ends up at roughly the height the recognition
+model works best with, instead of a fixed 200 DPI / native photo resolution:
+
+- PDF pages are rendered at a DPI picked from the text line height of their
+  text layer (searchable scans), the native resolution of embedded scans, or
+  a default, clamped to a range and to the maximum side RapidOCR would
+  downscale to anyway.
+- Images are decoded at reduced size where the format allows it (JPEG draft
+  mode) and downscaled from an estimate of their text line height.
+- Pages are converted to grayscale and empty margins are cropped.
+
+Every transform is recorded so boxes can be mapped back to the page
+coordinates clients already expect (200 DPI pixels for PDFs, original pixels
+for images).
+"""
+import io
+import os
+from dataclasses import dataclass, replace, asdict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+from PIL import Image, ImageOps
+
+# PDF boxes are reported in pixels at this resolution, whatever DPI the page was rendered at
+BBOX_DPI = 200
+
+# Gray level below which a pixel counts as ink when cropping margins
+INK_THRESHOLD = int(os.getenv("PREPROCESS_INK_THRESHOLD", 200))
+# Blank border kept around the cropped content (pixels)
+CROP_PADDING = 16
+# Crops are not made smaller than the detector's input side (RapidOCR Det.limit_side_len);
+# below it the detector upscales the page, which costs time and hurts detection
+MIN_CROP_SIDE = 736
+
+
+@dataclass
+class PreprocessOptions:
+    """Per-request preprocessing settings (defaults from the environment)"""
+    dpi: int = 0  # Fixed PDF render DPI; 0 picks it per page
+    default_dpi: int = BBOX_DPI  # Used when a page gives nothing to estimate from
+    min_dpi: int = 100
+    max_dpi: int = 300
+    target_text_height: int = 28  # Text line height in pixels to scale pages to
+    max_side: int = 2000  # Longest side after scaling (RapidOCR downscales above this)
+    min_side: int = 1000  # Text height estimates never shrink a page below this
+    grayscale: bool = True
+    crop_margins: bool = True
+
+    @classmethod
+    def from_env(cls) -> "PreprocessOptions":
+        defaults = cls()
+        return cls(
+            dpi=int(os.getenv("PREPROCESS_DPI", defaults.dpi)),
+            default_dpi=int(os.getenv("PREPROCESS_DEFAULT_DPI", defaults.default_dpi)),
+            min_dpi=int(os.getenv("PREPROCESS_MIN_DPI", defaults.min_dpi)),
+            max_dpi=int(os.getenv("PREPROCESS_MAX_DPI", defaults.max_dpi)),
+            target_text_height=int(os.getenv("PREPROCESS_TARGET_TEXT_HEIGHT", defaults.target_text_height)),
+            max_side=int(os.getenv("PREPROCESS_MAX_SIDE", defaults.max_side)),
+            min_side=int(os.getenv("PREPROCESS_MIN_SIDE", defaults.min_side)),
+            grayscale=os.getenv("PREPROCESS_GRAYSCALE", "true").lower() == "true",
+            crop_margins=os.getenv("PREPROCESS_CROP_MARGINS", "true").lower() == "true",
+        )
+
+    def override(self, **values) -> "PreprocessOptions":
+        """Copy with the given settings replaced, ignoring None values"""
+        return replace(self, **{k: v for k, v in values.items() if v is not None})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class PageTransform:
+    """Maps boxes on a preprocessed page back to output coordinates: (box + offset) * factor"""
+    offset_x: float = 0.0
+    offset_y: float = 0.0
+    factor: float = 1.0
+
+    def apply(self, box: List[List[float]]) -> List[List[float]]:
+        return [[(x + self.offset_x) * self.factor, (y + self.offset_y) * self.factor] for x, y in box]
+
+    def scaled(self, scale: float) -> "PageTransform":
+        """Transform for a copy of the page resized by `scale`"""
+        return PageTransform(self.offset_x * scale, self.offset_y * scale, self.factor / scale)
+
+    def cropped(self, left: int, top: int) -> "PageTransform":
+        """Transform for a crop of the page starting at (left, top)"""
+        return PageTransform(self.offset_x + left, self.offset_y + top, self.factor)
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return max(low, min(high, value))
+
+
+def pdf_text_line_height(page: pdfium.PdfPage) -> Optional[float]:
+    """Median text line height of the page's text layer in points, if it has one"""
+    textpage = page.get_textpage()
+    try:
+        heights = []
+        for index in range(textpage.count_rects()):
+            _, bottom, _, top = textpage.get_rect(index)
+            if top > bottom:
+                heights.append(top - bottom)
+        return float(np.median(heights)) if len(heights) >= 3 else None
+    finally:
+        textpage.close()
+
+
+def pdf_native_image_dpi(page: pdfium.PdfPage) -> Optional[float]:
+    """Resolution of the largest embedded image (e.g. the scan of a scanned page)"""
+    best_area, best_dpi = 0.0, None
+    for obj in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE]):
+        left, bottom, right, top = obj.get_pos()
+        width_pt, height_pt = right - left, top - bottom
+        if width_pt <= 0 or height_pt <= 0:
+            continue
+        try:
+            width_px, height_px = obj.get_size()
+        except Exception:
+            continue
+        if width_pt * height_pt > best_area:
+            best_area = width_pt * height_pt
+            best_dpi = max(width_px / width_pt, height_px / height_pt) * 72
+    return best_dpi
+
+
+def choose_pdf_dpi(page: pdfium.PdfPage, options: PreprocessOptions) -> Tuple[float, str]:
+    """
+    Pick the render DPI for a PDF page
+
+    Returns:
+        (dpi, basis) where basis is "fixed", "text_height", "native_image" or "default"
+    """
+    if options.dpi:
+        dpi, basis = float(options.dpi), "fixed"
+    else:
+        line_height = pdf_text_line_height(page)
+        native_dpi = pdf_native_image_dpi(page)
+        if line_height:
+            dpi, basis = options.target_text_height * 72 / line_height, "text_height"
+        elif native_dpi:
+            # Rendering above the scan's own resolution only interpolates pixels
+            dpi, basis = native_dpi, "native_image"
+        else:
+            dpi, basis = float(options.default_dpi), "default"
+        dpi = _clamp(dpi, options.min_dpi, options.max_dpi)
+
+    width_pt, height_pt = page.get_size()
+    max_dpi_for_side = options.max_side * 72 / max(width_pt, height_pt, 1)
+    return min(dpi, max_dpi_for_side), basis
+
+
+def render_pdf_page(page: pdfium.PdfPage, options: PreprocessOptions) -> Tuple[np.ndarray, PageTransform, Dict[str, Any]]:
+    """
+    Render one PDF page for OCR (must be called from the pdfium thread)
+
+    Returns:
+        (grayscale or BGR array, transform to BBOX_DPI pixels, page info)
+    """
+    dpi, basis = choose_pdf_dpi(page, options)
+    bitmap = page.render(scale=dpi / 72, grayscale=options.grayscale)
+    try:
+        # Copy out of the pdfium buffer so the bitmap can be freed now
+        image = bitmap.to_numpy().copy()
+    finally:
+        bitmap.close()
+
+    if image.ndim == 3 and image.shape[2] == 1:
+        image = image[:, :, 0]
+
+    info = {"dpi": round(dpi, 1), "dpi_basis": basis}
+    return image, PageTransform(factor=BBOX_DPI / dpi), info
+
+
+def load_image(source: Union[str, bytes], options: PreprocessOptions) -> Tuple[np.ndarray, PageTransform, Dict[str, Any]]:
+    """
+    Decode an uploaded image for OCR, honouring EXIF orientation
+
+    JPEGs are decoded directly at a reduced scale when they are larger than
+    max_side, which is much cheaper than decoding at full size and resizing.
+
+    Returns:
+        (grayscale or BGR array, transform to original pixels, page info)
+    """
+    img = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    original_size = img.size
+    mode = "L" if options.grayscale else "RGB"
+
+    longest = max(img.size)
+    if longest > options.max_side:
+        target = options.max_side / longest
+        img.draft(mode, (int(img.size[0] * target), int(img.size[1] * target)))
+
+    img = ImageOps.exif_transpose(img)
+    img = img.convert(mode)
+
+    # EXIF rotation may swap the axes; compare like with like
+    original_longest = max(original_size)
+    factor = original_longest / max(img.size)
+
+    longest = max(img.size)
+    if longest > options.max_side:
+        scale = options.max_side / longest
+        img = img.resize((round(img.size[0] * scale), round(img.size[1] * scale)), Image.LANCZOS)
+        factor /= scale
+
+    image = np.asarray(img)
+    if image.ndim == 3:
+        image = np.ascontiguousarray(image[:, :, ::-1])  # RGB -> BGR
+
+    info = {"original_size": list(original_size)}
+    return image, PageTransform(factor=factor), info
+
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 2:
+        return image
+    # BGR luma weights
+    return (image[:, :, 0] * 0.114 + image[:, :, 1] * 0.587 + image[:, :, 2] * 0.299).astype(np.uint8)
+
+
+def estimate_text_height(gray: np.ndarray) -> Optional[float]:
+    """
+    Estimate the typical text line height of a page image in pixels
+
+    Uses the horizontal projection profile: runs of rows containing ink are
+    text lines. Multi-column or skewed pages merge lines, which can only
+    overestimate the height, so callers bound how far they shrink the page.
+    """
+    height, width = gray.shape[:2]
+    if height < 50 or width < 50:
+        return None
+
+    # Skip columns to keep this cheap; full rows are needed for run lengths
+    sample = gray[:, ::4]
+    threshold = min(INK_THRESHOLD, float(np.median(sample)) * 0.75)
+    ink_rows = (sample < threshold).mean(axis=1) > 0.002
+
+    runs = []
+    run = 0
+    for has_ink in ink_rows:
+        if has_ink:
+            run += 1
+        elif run:
+            runs.append(run)
+            run = 0
+    if run:
+        runs.append(run)
+
+    runs = [r for r in runs if r >= 4]  # Specks and rules
+    if len(runs) < 5:
+        return None
+    return float(np.median(runs))
+
+
+def fit_text_height(image: np.ndarray, transform: PageTransform,
+                    options: PreprocessOptions) -> Tuple[np.ndarray, PageTransform, Optional[float]]:
+    """Downscale a page whose text is larger than the target height"""
+    text_height = estimate_text_height(to_gray(image))
+    if not text_height or text_height <= options.target_text_height:
+        return image, transform, text_height
+
+    height, width = image.shape[:2]
+    scale = max(options.target_text_height / text_height, options.min_side / max(height, width))
+    if scale >= 0.95:
+        return image, transform, text_height
+
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    resized = np.asarray(Image.fromarray(image[:, :, ::-1] if image.ndim == 3 else image).resize(size, Image.LANCZOS))
+    if resized.ndim == 3:
+        resized = np.ascontiguousarray(resized[:, :, ::-1])
+    return resized, transform.scaled(size[0] / width), text_height
+
+
+def _expand(start: int, end: int, size: int, minimum: int) -> Tuple[int, int]:
+    """Grow [start, end) to at least `minimum` long, staying inside [0, size)"""
+    missing = minimum - (end - start)
+    if missing <= 0:
+        return start, end
+    start = max(0, start - missing // 2)
+    end = min(size, start + minimum)
+    return max(0, end - minimum), end
+
+
+def crop_margins(image: np.ndarray, transform: PageTransform) -> Tuple[Optional[np.ndarray], PageTransform]:
+    """
+    Crop blank borders around the page content
+
+    Returns:
+        (cropped image, transform), or (None, transform) if the page is blank
+    """
+    gray = to_gray(image)
+    ink = gray < INK_THRESHOLD
+    rows = np.flatnonzero(ink.any(axis=1))
+    if rows.size == 0:
+        return None, transform
+    cols = np.flatnonzero(ink.any(axis=0))
+
+    height, width = gray.shape
+    top = max(0, rows[0] - CROP_PADDING)
+    bottom = min(height, rows[-1] + 1 + CROP_PADDING)
+    left = max(0, cols[0] - CROP_PADDING)
+    right = min(width, cols[-1] + 1 + CROP_PADDING)
+    top, bottom = _expand(int(top), int(bottom), height, MIN_CROP_SIDE)
+    left, right = _expand(int(left), int(right), width, MIN_CROP_SIDE)
+
+    if top == 0 and left == 0 and bottom == height and right == width:
+        return image, transform
+    return np.ascontiguousarray(image[top:bottom, left:right]), transform.cropped(int(left), int(top))
+
+
+def prepare_page(image: np.ndarray, transform: PageTransform, options: PreprocessOptions,
+                 fit_text: bool = True) -> Tuple[Optional[np.ndarray], PageTransform, Dict[str, Any]]:
+    """
+    Final preprocessing of a decoded/rendered page before OCR
+
+    Args:
+        fit_text: Downscale from the estimated text height (skipped when the
+            resolution was already chosen from the PDF text layer)
+
+    Returns:
+        (image, transform, info); image is None for blank pages
+    """
+    info: Dict[str, Any] = {}
+    if fit_text and not options.dpi:
+        image, transform, text_height = fit_text_height(image, transform, options)
+        if text_height:
+            info["estimated_text_height"] = round(text_height, 1)
+
+    if options.grayscale:
+        image = to_gray(image)
+
+    if options.crop_margins:
+        image, transform = crop_margins(image, transform)
+
+    if image is not None:
+        info["size"] = [int(image.shape[1]), int(image.shape[0])]
+    return image, transform, info